@@ -0,0 +1,293 @@
+"""Per-client admission control in estimated LLM tokens.
+
+Each client (its ``X-API-Key`` if listed in ``ADMISSION_API_KEYS``, else its
+IP address) has a token bucket of ``ADMISSION_BURST_TOKENS`` that refills at
+``ADMISSION_TOKENS_PER_MINUTE``.
+A request reserves the tokens its run is expected to cost: a learned average
+per depth tier, or a static estimate from the LLM routes' prompt sizes and
+token budgets until runs of the tier have been measured. Runs therefore
+weigh what they cost the backend: a deep analysis takes several times the
+budget of a quick one.
+
+A request the bucket cannot cover yet waits in its client's queue, behind
+that client's earlier requests only, if its turn comes within
+``ADMISSION_MAX_QUEUE_SECONDS``. It is told its queue position and expected
+wait. Otherwise it is rejected (429 with ``Retry-After``). Once the run
+is done, the reservation is settled against the tokens its LLM calls
+actually used (responses served from the LLM cache cost nothing), so the
+bucket tracks real consumption. Other clients are never held up by one
+client's backlog.
+"""
+
+import math
+import time
+import asyncio
+import hashlib
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Optional
+
+from app.config import (
+    ADMISSION_CONTROL,
+    ADMISSION_TOKENS_PER_MINUTE,
+    ADMISSION_BURST_TOKENS,
+    ADMISSION_MAX_QUEUE_SECONDS,
+    ADMISSION_API_KEYS,
+    DEPTH_TIERS,
+    LLM_ROUTES,
+)
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+# Rough prompt size per call of each route, for the static estimate
+_PROMPT_TOKENS = {"planner": 600, "dimension": 3000, "persona": 2500, "analysis": 6000, "report": 8000}
+# Output budget assumed for routes without max_tokens
+_DEFAULT_OUTPUT_TOKENS = 4000
+# Weight of the latest run in the learned cost per tier
+_COST_ALPHA = 0.2
+# Idle, full buckets are dropped once there are more clients than this
+_MAX_CLIENTS = 10000
+
+_run_tokens: ContextVar[Optional[List[int]]] = ContextVar("admission_run_tokens", default=None)
+_learned: Dict[str, float] = {}
+
+
+class AdmissionDenied(Exception):
+    """A client's budget cannot cover the request within the queue limit."""
+
+    def __init__(self, client: str, cost: int, retry_after: float, position: int) -> None:
+        self.client = client
+        self.cost = cost
+        self.retry_after = retry_after
+        self.position = position
+        super().__init__(
+            f"Token budget of {client} exhausted: the request needs ~{cost} tokens, "
+            f"available in {retry_after:.0f}s"
+        )
+
+
+@dataclass
+class _Bucket:
+    level: float
+    updated: float
+    queue: List["Ticket"] = field(default_factory=list)
+    consumed: int = 0
+    admitted: int = 0
+    rejected: int = 0
+
+    def refill(self, now: float) -> None:
+        rate = ADMISSION_TOKENS_PER_MINUTE / 60.0
+        self.level = min(ADMISSION_BURST_TOKENS, self.level + (now - self.updated) * rate)
+        self.updated = now
+
+
+_buckets: Dict[str, _Bucket] = {}
+
+
+@dataclass
+class Ticket:
+    """A request's reservation; ``wait()`` until admitted, ``track()`` the run."""
+
+    client: str
+    cost: int
+    position: int = 0
+    eta: float = 0.0
+    admitted: bool = False
+    _turn: asyncio.Event = field(default_factory=asyncio.Event, repr=False)
+
+    async def wait(self) -> None:
+        """Wait for the request's turn (no-op once admitted)."""
+        if self.admitted:
+            return
+        started = time.monotonic()
+        try:
+            await _drain(self)
+        finally:
+            if not self.admitted:
+                # Cancelled while queued (client gone, deadline passed)
+                bucket = _buckets.get(self.client)
+                if bucket is not None and self in bucket.queue:
+                    bucket.queue.remove(self)
+                    _wake_next(bucket)
+        metrics.observe("admission_wait_seconds", time.monotonic() - started)
+
+    @contextmanager
+    def track(self, depth: Optional[str] = None, runs: int = 1) -> Iterator[None]:
+        """Count the LLM tokens of the ``runs`` runs made inside and settle the reservation on exit."""
+        used: List[int] = [0, 0]  # tokens, calls measured
+        token = _run_tokens.set(used)
+        try:
+            yield
+        finally:
+            _run_tokens.reset(token)
+            _settle(self, used[0] if used[1] else None, depth, runs)
+
+
+def client_id(api_key: Optional[str], host: Optional[str]) -> str:
+    """Bucket key: a hash of the API key if it is a configured one, else the client's IP.
+
+    Unknown keys are ignored: otherwise a new key per request would get a
+    fresh budget every time.
+    """
+    if api_key and api_key in ADMISSION_API_KEYS:
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:12]
+    return f"ip:{host or 'unknown'}"
+
+
+def _label(client: str) -> str:
+    """Metric label of a client: configured keys by name, every IP client as "ip"."""
+    return client if client.startswith("key:") else "ip"
+
+
+def _static_cost(depth: str) -> int:
+    from app.agents.financial_reporter_agent import DIMENSIONS
+
+    tier = DEPTH_TIERS[depth]
+    dimensions = len(tier["dimensions"]) if tier["dimensions"] is not None else len(DIMENSIONS)
+    budgets = {
+        "analysis": tier["analysis_max_tokens"],
+        "report": tier["report_max_tokens"],
+    }
+    calls = {"planner": 1, "dimension": dimensions, "persona": 1, "analysis": tier["personas"], "report": 1}
+    total = 0
+    for route, count in calls.items():
+        output = budgets.get(route) or LLM_ROUTES[route]["max_tokens"] or _DEFAULT_OUTPUT_TOKENS
+        total += count * (_PROMPT_TOKENS[route] + output)
+    return total
+
+
+def estimate(depth: str, runs: int = 1) -> int:
+    """Expected LLM tokens of ``runs`` runs of depth tier ``depth``."""
+    per_run = _learned.get(depth) or _static_cost(depth)
+    return int(math.ceil(per_run * runs))
+
+
+def record_tokens(tokens: int) -> None:
+    """Add an LLM call's tokens to the current run's count (called by the LLM client)."""
+    used = _run_tokens.get()
+    if used is not None:
+        used[0] += tokens
+        used[1] += 1
+
+
+def _bucket(client: str) -> _Bucket:
+    bucket = _buckets.get(client)
+    if bucket is None:
+        if len(_buckets) >= _MAX_CLIENTS:
+            now = time.monotonic()
+            for key, other in list(_buckets.items()):
+                other.refill(now)
+                if not other.queue and other.level >= ADMISSION_BURST_TOKENS:
+                    del _buckets[key]
+        bucket = _buckets[client] = _Bucket(level=ADMISSION_BURST_TOKENS, updated=time.monotonic())
+    return bucket
+
+
+def reserve(client: str, cost: int) -> Ticket:
+    """Reserve ``cost`` tokens of ``client``'s budget.
+
+    The returned ticket is admitted right away if the budget covers it and
+    no earlier request of the client is waiting; otherwise it is queued with
+    its position and ETA. Raises ``AdmissionDenied`` when the wait would
+    exceed ``ADMISSION_MAX_QUEUE_SECONDS``.
+    """
+    # A run costlier than the whole burst must still be admissible eventually
+    cost = min(cost, ADMISSION_BURST_TOKENS)
+    ticket = Ticket(client=client, cost=cost)
+    if not ADMISSION_CONTROL:
+        ticket.admitted = True
+        return ticket
+    bucket = _bucket(client)
+    bucket.refill(time.monotonic())
+    needed = sum(t.cost for t in bucket.queue) + cost
+    wait = max(0.0, (needed - bucket.level) * 60.0 / ADMISSION_TOKENS_PER_MINUTE)
+    if not bucket.queue and wait == 0:
+        bucket.level -= cost
+        bucket.admitted += 1
+        ticket.admitted = True
+        metrics.inc("admission_requests_total", client=_label(client), outcome="admitted")
+        return ticket
+    position = len(bucket.queue) + 1
+    if wait > ADMISSION_MAX_QUEUE_SECONDS:
+        bucket.rejected += 1
+        metrics.inc("admission_requests_total", client=_label(client), outcome="rejected")
+        logger.warning("Rejecting request of %s: needs %d tokens, %.0f available, %d queued",
+                       client, cost, bucket.level, position - 1)
+        raise AdmissionDenied(client, cost, wait, position)
+    ticket.position = position
+    ticket.eta = wait
+    bucket.queue.append(ticket)
+    metrics.inc("admission_requests_total", client=_label(client), outcome="queued")
+    logger.info("Queued request of %s at position %d (~%.0fs)", client, position, wait)
+    return ticket
+
+
+async def _drain(ticket: Ticket) -> None:
+    """Admit ``ticket`` once it heads its client's queue and the bucket covers it."""
+    bucket = _bucket(ticket.client)
+    while True:
+        bucket.refill(time.monotonic())
+        if bucket.queue and bucket.queue[0] is ticket and bucket.level >= ticket.cost:
+            bucket.queue.pop(0)
+            bucket.level -= ticket.cost
+            bucket.admitted += 1
+            ticket.admitted = True
+            metrics.inc("admission_requests_total", client=_label(ticket.client), outcome="admitted")
+            _wake_next(bucket)
+            return
+        if bucket.queue and bucket.queue[0] is ticket:
+            shortfall = ticket.cost - bucket.level
+            await asyncio.sleep(shortfall * 60.0 / ADMISSION_TOKENS_PER_MINUTE)
+        else:
+            ticket._turn.clear()
+            await ticket._turn.wait()
+
+
+def _wake_next(bucket: _Bucket) -> None:
+    if bucket.queue:
+        bucket.queue[0]._turn.set()
+
+
+def _settle(ticket: Ticket, used: Optional[int], depth: Optional[str], runs: int) -> None:
+    """Charge the difference between the run's measured tokens and its reservation."""
+    if not ticket.admitted:
+        return
+    bucket = _buckets.get(ticket.client)
+    if used is None:
+        # No LLM call measured (cache hits count as 0-token calls): keep the estimate
+        actual = ticket.cost
+    else:
+        actual = used
+        if depth in DEPTH_TIERS and used and runs:
+            per_run = used / runs
+            previous = _learned.get(depth)
+            _learned[depth] = per_run if previous is None else (1 - _COST_ALPHA) * previous + _COST_ALPHA * per_run
+    if bucket is not None:
+        bucket.level -= actual - ticket.cost
+        bucket.consumed += actual
+    metrics.inc("admission_tokens_total", actual, client=_label(ticket.client))
+    metrics.observe("admission_estimate_error", (actual - ticket.cost) / ticket.cost if ticket.cost else 0.0)
+
+
+def stats() -> dict:
+    """Budget, queue and consumption per client plus the cost estimates, for ``/metrics``."""
+    now = time.monotonic()
+    clients = {}
+    for client, bucket in _buckets.items():
+        bucket.refill(now)
+        clients[client] = {
+            "available_tokens": int(bucket.level),
+            "queued": len(bucket.queue),
+            "consumed_tokens": bucket.consumed,
+            "admitted": bucket.admitted,
+            "rejected": bucket.rejected,
+        }
+    return {
+        "tokens_per_minute": ADMISSION_TOKENS_PER_MINUTE,
+        "burst_tokens": ADMISSION_BURST_TOKENS,
+        "estimated_tokens_per_run": {depth: estimate(depth) for depth in DEPTH_TIERS},
+        "clients": clients,
+    }
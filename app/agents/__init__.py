@@ -1,17 +1,32 @@
-from .llm import create_llm
-from .planner import planner_node
-from .stock_info_agent import stock_info_node
-from .persona_agent import persona_generator_node
-from .analysis_agent import analysis_node
-from .report_agent import report_node
-from .graph import decision_graph
+"""Agent nodes and the compiled decision graph.
 
-__all__ = [
-    "create_llm",
-    "planner_node",
-    "stock_info_node",
-    "persona_generator_node",
-    "analysis_node",
-    "report_node",
-    "decision_graph",
-]
+Exports are resolved lazily on first access so importing ``app.agents`` (or a
+single submodule such as the CLI) does not pull in langchain, langgraph and
+yfinance up front.
+"""
+
+import importlib
+
+_EXPORTS = {
+    "create_llm": ".llm",
+    "planner_node": ".planner",
+    "stock_info_node": ".stock_info_agent",
+    "persona_generator_node": ".persona_agent",
+    "analysis_node": ".analysis_agent",
+    "report_node": ".report_agent",
+    "comparison_node": ".comparison_agent",
+    "comparison_report_node": ".comparison_agent",
+    "decision_graph": ".graph",
+    "get_decision_graph": ".graph",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name, __name__), name)
+    globals()[name] = value
+    return value
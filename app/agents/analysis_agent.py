@@ -1,28 +1,39 @@
 import logging
 import json
-import yaml
-import asyncio
-from pathlib import Path
-from typing import List
+from typing import List, Optional
 
 from langchain_core.messages import SystemMessage, HumanMessage
 
 from app.schema import AgentState, Persona, PersonaAnalysis, CompanyProfile
 from app.agents.llm import create_llm
+from app.agents.prompt_loader import get_template
+from app.agents.stock_info_agent import SEARCH_QUERIES, YF_INCOME, YF_BALANCE, YF_CASHFLOW
 from app.events import emit_status, strip_tool_calls, strip_citation_markers
+from app.config import SEARCH_FOCUS_ANALYSIS_RESULTS
+from app import run_store, blobs, depth, snippets
 
 logger = logging.getLogger(__name__)
 
-PROMPT_PATH = Path(__file__).resolve().parent.parent / "prompts" / "persona_analysis_prompt.yaml"
+PROMPT_FILE = "persona_analysis_prompt.yaml"
+
+# Sections a persona analysis is grounded in for incremental reuse. The
+# fast-moving ones (latest quarter, outlook, quote) are left to the report.
+ANALYSIS_INPUTS = [YF_INCOME, YF_BALANCE, YF_CASHFLOW] + [
+    q for i, q in enumerate(SEARCH_QUERIES) if i not in (1, 3)
+]
+
+# What persona analyses look for in the search results (BM25, see app.snippets)
+ANALYSIS_FOCUS = " ".join(
+    ["profit outlook risks valuation"] + [q.replace("{ticker}", "") for q in SEARCH_QUERIES]
+)
 
 
 def _load_prompt(ticker: str, financial_info: str, company_profile: CompanyProfile) -> str:
     """Load the persona analysis prompt from YAML and substitute placeholders."""
-    with open(PROMPT_PATH, "r") as f:
-        data = yaml.safe_load(f)
-    prompt_template = data["persona_analysis_prompt"]
+    prompt_template = get_template(PROMPT_FILE, "persona_analysis_prompt")
     company_profile_json = json.dumps(company_profile.model_dump(), indent=2)
-    return prompt_template.replace("{ticker}", ticker).replace("{financial_info}", financial_info).replace("{company_profile}", company_profile_json)
+    return (prompt_template.replace("{ticker}", ticker).replace("{financial_info}", financial_info)
+            .replace("{company_profile}", company_profile_json))
 
 def _build_persona_system_prompt(persona: Persona) -> str:
     """Build a system prompt that fully embodies the persona's role and background."""
@@ -47,11 +58,12 @@ async def _run_single_persona_analysis(
     ticker: str,
     financial_info: str,
     company_profile: CompanyProfile,
+    max_tokens: Optional[int] = None,
 ) -> PersonaAnalysis:
     """Run a single persona's analysis using a direct LLM call (no tools)."""
     logger.info("--- Analysis for persona: %s ---", persona.name)
 
-    llm = create_llm(max_tokens=10000)
+    llm = create_llm("analysis", max_tokens=max_tokens)
     structured_llm = llm.with_structured_output(PersonaAnalysis)
 
     system_prompt = _build_persona_system_prompt(persona)
@@ -80,7 +92,9 @@ async def analysis_node(state: AgentState) -> AgentState:
     logger.info("=== ANALYSIS NODE START ===")
     personas = state["personas"]
     ticker = state["ticker"]
-    financial_info = state["financial_info"]
+    financial_info = snippets.focus(
+        blobs.get(state["financial_info_ref"]), ANALYSIS_FOCUS, SEARCH_FOCUS_ANALYSIS_RESULTS,
+    )
     company_profile = state["company_profile"]
     logger.info("Ticker: %s, %d personas, financial_info: %d chars, company_profile available",
                  ticker, len(personas), len(financial_info))
@@ -92,25 +106,56 @@ async def analysis_node(state: AgentState) -> AgentState:
         "message": f"Running {len(personas)} persona analyses simultaneously…",
     })
 
-    # Create analysis tasks for all personas
+    # Incremental mode: reuse analyses of unchanged personas when neither the
+    # company profile nor the underlying sections changed. Analyses do not see
+    # the price technicals (they move every trading day); only the report does.
+    reused: dict[int, PersonaAnalysis] = {}
+    previous = run_store.previous_run(state)
+    if (previous and previous.get("company_profile") == company_profile.model_dump()
+            and not run_store.inputs_changed(state["changed_sections"], ANALYSIS_INPUTS, ticker)):
+        previous_by_persona = {
+            json.dumps(p, sort_keys=True): a
+            for p, a in zip(previous.get("personas", []), previous.get("persona_analyses", []))
+        }
+        for i, persona in enumerate(personas):
+            prior = previous_by_persona.get(json.dumps(persona.model_dump(), sort_keys=True))
+            if prior is not None:
+                reused[i] = PersonaAnalysis.model_validate(prior)
+        logger.info("Reusing %d/%d persona analyses from previous run", len(reused), len(personas))
+
+    # Create analysis tasks for the remaining personas
+    pending = [i for i in range(len(personas)) if i not in reused]
+    max_tokens = depth.tier(state)["analysis_max_tokens"]
     analysis_tasks = [
-        _run_single_persona_analysis(persona, ticker, financial_info, company_profile)
-        for persona in personas
+        _run_single_persona_analysis(
+            personas[i], ticker, financial_info, company_profile, max_tokens,
+        )
+        for i in pending
     ]
 
     logger.info("Starting %d parallel persona analysis tasks", len(analysis_tasks))
 
-    # Run all persona analyses in parallel
-    analyses = await asyncio.gather(*analysis_tasks)
+    # Run all persona analyses in parallel; past the stage deadline, the ones
+    # still running are dropped as long as at least one analysis is available
+    results = await depth.gather_optional(
+        analysis_tasks, depth.deadline(state, "analysis"), min_done=0 if reused else 1,
+    )
+    generated = {i: r for i, r in zip(pending, results) if r is not None}
+    kept = [i for i in range(len(personas)) if i in reused or i in generated]
+    analyses = [reused[i] if i in reused else generated[i] for i in kept]
 
     # Emit completion status for each persona
-    for i, analysis in enumerate(analyses):
+    for i, analysis in zip(kept, analyses):
         await emit_status({
             "type": "status",
             "node": "analysis",
-            "label": f"Completed: {analysis.persona_name}",
+            "label": f"{'Reused' if i in reused else 'Completed'}: {analysis.persona_name}",
             "message": f"Persona {i + 1}/{len(personas)} analysis done",
         })
 
     logger.info("=== ANALYSIS NODE END — %d analyses completed ===", len(analyses))
-    return {"persona_analyses": analyses}
+    update: AgentState = {"persona_analyses": analyses}
+    dropped = [personas[i].name for i, r in zip(pending, results) if r is None]
+    if dropped:
+        update["trimmed"] = depth.record_trim(state, "analysis", dropped)
+    return update
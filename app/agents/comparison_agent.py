@@ -0,0 +1,168 @@
+import logging
+import asyncio
+from functools import lru_cache
+from typing import Dict
+
+from langchain_core.messages import SystemMessage, HumanMessage
+from langgraph.graph import StateGraph, END
+
+from app.schema import AgentState, CompanyProfile
+from app.agents.llm import create_llm
+from app.agents.stock_info_agent import stock_info_node, YF_INFO
+from app.agents.financial_reporter_agent import financial_reporter_node
+from app.agents.report_agent import _format_company_profile
+from app.agents.price_agent import load_technicals
+from app.events import emit_status, strip_tool_calls, strip_citation_markers
+from app import run_store, blobs, depth, prices, archive
+from app.tracing import instrument
+
+logger = logging.getLogger(__name__)
+
+
+COMPARISON_REPORT_SYSTEM_PROMPT = """You are a senior investment report writer. Your job is to compare several companies side by side from their company profiles, key financial data and price technicals, in a single well-structured investment report under 400 words.
+
+You MUST output the report in valid Markdown format. Use proper Markdown headings, bold text, bullet lists, tables and horizontal rules for structure and readability.
+
+The report MUST follow this exact Markdown structure:
+
+# Comparison Report: [TICKER A] vs [TICKER B] (vs …)
+
+## 1. Recommendation
+State which company is the more attractive investment in bold, with a clear stance for each ticker (e.g. **Buy**, **Hold**, **Sell**, or **Avoid**), followed by a one-paragraph rationale.
+
+## 2. Side-by-Side Comparison
+A Markdown table comparing the companies on business model, revenue quality, cost structure, capital intensity, growth drivers, competitive edge and recent price performance.
+
+## 3. Key Differences
+Bullet points on where the companies differ most in upside and downside.
+
+Write in a professional, analytical tone. Be precise and reference specific data points. The entire output must be well-formatted Markdown ready to be saved as a .md file."""
+
+
+@lru_cache(maxsize=None)
+def get_profile_subgraph():
+    """Per-ticker sub-graph: stock_info -> financial_reporter (compiled once, on first use)."""
+    workflow = StateGraph(AgentState)
+    workflow.add_node("stock_info", instrument("stock_info", stock_info_node))
+    workflow.add_node("financial_reporter", instrument("financial_reporter", financial_reporter_node))
+    workflow.set_entry_point("stock_info")
+    workflow.add_edge("stock_info", "financial_reporter")
+    workflow.add_edge("financial_reporter", END)
+    return workflow.compile()
+
+
+
+async def _profile_ticker(ticker: str, state: AgentState) -> AgentState:
+    """Gather data and build the company profile for one ticker.
+
+    Always runs incrementally so profile dimensions stored by earlier runs of
+    this ticker are reused when their inputs have not changed. Runs at the
+    comparison's depth tier and on its run clock.
+    """
+    result = await get_profile_subgraph().ainvoke({
+        "ticker": ticker,
+        "incremental": True,
+        "depth": depth.tier_name(state),
+        "started_at": state.get("started_at"),
+    })
+    if not depth.is_complete(result):
+        logger.info("Not storing %s profile for %s (reduced coverage)", depth.tier_name(state), ticker)
+        return result
+    try:
+        await asyncio.to_thread(
+            run_store.update_profile,
+            ticker,
+            result["financial_sections"],
+            result["company_profile"].model_dump(),
+        )
+    except OSError as exc:
+        logger.warning("Could not store profile for %s: %s", ticker, exc)
+    return result
+
+
+async def comparison_node(state: AgentState) -> AgentState:
+    """LangGraph node: profile every ticker of a comparison concurrently.
+
+    The technical indicators of all tickers are computed alongside, from one
+    bulk price history request.
+    """
+    logger.info("=== COMPARISON NODE START ===")
+    tickers = state["tickers"]
+    logger.info("Tickers: %s", tickers)
+
+    await emit_status({
+        "type": "status",
+        "node": "compare",
+        "label": f"Profiling {len(tickers)} companies",
+        "message": f"Gathering data for {', '.join(tickers)} in parallel…",
+    })
+
+    *results, technicals = await asyncio.gather(
+        *[_profile_ticker(t, state) for t in tickers], load_technicals(tickers),
+    )
+
+    profiles: Dict[str, CompanyProfile] = {}
+    refs: Dict[str, str] = {}
+    trimmed = list(state.get("trimmed", []))
+    for ticker, result in zip(tickers, results):
+        profiles[ticker] = result["company_profile"]
+        refs[ticker] = result["financial_info_ref"]
+        trimmed += [f"{ticker} {item}" for item in result.get("trimmed", [])]
+        logger.info("Profiled %s: financial_info blob %s", ticker, refs[ticker])
+
+    logger.info("=== COMPARISON NODE END ===")
+    update: AgentState = {"comparison_profiles": profiles, "comparison_info_refs": refs, "technicals": technicals}
+    if trimmed:
+        update["trimmed"] = trimmed
+    return update
+
+
+async def comparison_report_node(state: AgentState) -> AgentState:
+    """LangGraph node: write one comparative report across all tickers."""
+    logger.info("=== COMPARISON REPORT NODE START ===")
+    tickers = state["tickers"]
+    profiles = state["comparison_profiles"]
+    refs = state["comparison_info_refs"]
+
+    blocks = []
+    for ticker in tickers:
+        key_data = blobs.get_section(refs[ticker], YF_INFO)
+        blocks.append(
+            f"### {ticker}\n"
+            f"{_format_company_profile(profiles[ticker])}\n\n"
+            f"**Key Financial Data:**\n{key_data}"
+        )
+    formatted = "\n\n---\n\n".join(blocks)
+
+    user_content = f"""Generate a comparative investment report for {" vs ".join(tickers)}.
+
+IMPORTANT: The entire report must be under 400 words.
+
+--- COMPANY PROFILES ---
+{formatted}
+--- END COMPANY PROFILES ---
+
+--- PRICE TECHNICALS ---
+{prices.format_table(state.get("technicals", {}))}
+--- END PRICE TECHNICALS ---
+"""
+    messages = [
+        SystemMessage(content=COMPARISON_REPORT_SYSTEM_PROMPT),
+        HumanMessage(content=user_content),
+    ]
+
+    await emit_status({
+        "type": "status",
+        "node": "generate_comparison_report",
+        "label": "Writing comparison report",
+        "message": f"Comparing {', '.join(tickers)}…",
+    })
+
+    llm = create_llm("report", max_tokens=depth.tier(state)["report_max_tokens"])
+    result = await llm.ainvoke(messages)
+
+    report_content = strip_citation_markers(strip_tool_calls(result.content or ""))
+    logger.info("Comparison report generated: %d chars", len(report_content))
+    depth.finish(state)
+    logger.info("=== COMPARISON REPORT NODE END ===")
+    return {"report": report_content, **await archive.record(state, report_content, kind="comparison")}
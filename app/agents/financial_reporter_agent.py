@@ -1,8 +1,6 @@
 import logging
-import yaml
 import asyncio
-from pathlib import Path
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
 
 from langchain_core.messages import SystemMessage, HumanMessage
 
@@ -19,14 +17,17 @@ from app.schema import (
     CompetitiveEdgeOutput,
 )
 from app.agents.llm import create_llm
+from app.agents.prompt_loader import get_template
+from app.agents.stock_info_agent import SEARCH_QUERIES, YF_INCOME, YF_BALANCE, YF_CASHFLOW
 from app.events import emit_status
+from app.config import SEARCH_FOCUS_RESULTS
+from app import run_store, blobs, depth, snippets
 
 logger = logging.getLogger(__name__)
 
-PROMPTS_DIR = Path(__file__).resolve().parent.parent / "prompts"
-
-
-# Mapping of dimension names to their prompt files and output models
+# Mapping of dimension names to their prompt files and output models.
+# ``inputs`` lists the financial_info sections a dimension is grounded in; in
+# incremental mode a dimension is only regenerated when one of them changed.
 DIMENSIONS: Dict[str, Dict] = {
     "business_model": {
         "prompt_file": "dimension_business_model.yaml",
@@ -35,6 +36,7 @@ DIMENSIONS: Dict[str, Dict] = {
         "output_field": "business_model",
         "max_tokens": 500,
         "label": "Business Model",
+        "inputs": [run_store.COMPANY_IDENTITY_SECTION, SEARCH_QUERIES[0], SEARCH_QUERIES[5]],
     },
     "what_they_sell": {
         "prompt_file": "dimension_what_they_sell.yaml",
@@ -43,6 +45,7 @@ DIMENSIONS: Dict[str, Dict] = {
         "output_field": "what_they_sell_and_who_buys",
         "max_tokens": 600,
         "label": "Products & Customers",
+        "inputs": [run_store.COMPANY_IDENTITY_SECTION, SEARCH_QUERIES[0], SEARCH_QUERIES[5]],
     },
     "how_they_make_money": {
         "prompt_file": "dimension_how_they_make_money.yaml",
@@ -51,6 +54,7 @@ DIMENSIONS: Dict[str, Dict] = {
         "output_field": "how_they_make_money",
         "max_tokens": 600,
         "label": "Revenue Model",
+        "inputs": [YF_INCOME, SEARCH_QUERIES[0], SEARCH_QUERIES[5]],
     },
     "revenue_quality": {
         "prompt_file": "dimension_revenue_quality.yaml",
@@ -59,6 +63,7 @@ DIMENSIONS: Dict[str, Dict] = {
         "output_field": "revenue_quality",
         "max_tokens": 600,
         "label": "Revenue Quality",
+        "inputs": [YF_INCOME, SEARCH_QUERIES[5], SEARCH_QUERIES[6]],
     },
     "cost_structure": {
         "prompt_file": "dimension_cost_structure.yaml",
@@ -67,6 +72,7 @@ DIMENSIONS: Dict[str, Dict] = {
         "output_field": "cost_structure",
         "max_tokens": 600,
         "label": "Cost Structure",
+        "inputs": [YF_INCOME, SEARCH_QUERIES[4], SEARCH_QUERIES[7], SEARCH_QUERIES[10]],
     },
     "capital_intensity": {
         "prompt_file": "dimension_capital_intensity.yaml",
@@ -75,6 +81,7 @@ DIMENSIONS: Dict[str, Dict] = {
         "output_field": "capital_intensity",
         "max_tokens": 600,
         "label": "Capital Intensity",
+        "inputs": [YF_BALANCE, YF_CASHFLOW, SEARCH_QUERIES[4], SEARCH_QUERIES[8], SEARCH_QUERIES[11]],
     },
     "growth_drivers": {
         "prompt_file": "dimension_growth_drivers.yaml",
@@ -83,6 +90,7 @@ DIMENSIONS: Dict[str, Dict] = {
         "output_field": "growth_drivers",
         "max_tokens": 600,
         "label": "Growth Drivers",
+        "inputs": [YF_INCOME, SEARCH_QUERIES[3], SEARCH_QUERIES[12]],
     },
     "competitive_edge": {
         "prompt_file": "dimension_competitive_edge.yaml",
@@ -91,16 +99,20 @@ DIMENSIONS: Dict[str, Dict] = {
         "output_field": "competitive_edge",
         "max_tokens": 600,
         "label": "Competitive Edge",
+        "inputs": [SEARCH_QUERIES[2], SEARCH_QUERIES[12]],
     },
 }
 
 
+def focus_query(dim_config: Dict) -> str:
+    """What a dimension looks for in the search results: its label and its search inputs."""
+    searches = [key.replace("{ticker}", "") for key in dim_config["inputs"] if "{ticker}" in key]
+    return " ".join([dim_config["label"], *searches])
+
+
 def _load_prompt(prompt_file: str, prompt_key: str, ticker: str, financial_info: str) -> str:
     """Load a dimension-specific prompt from YAML and substitute placeholders."""
-    prompt_path = PROMPTS_DIR / prompt_file
-    with open(prompt_path, "r") as f:
-        data = yaml.safe_load(f)
-    prompt_template = data[prompt_key]
+    prompt_template = get_template(prompt_file, prompt_key)
     return prompt_template.replace("{ticker}", ticker).replace("{financial_info}", financial_info)
 
 
@@ -130,7 +142,7 @@ async def _generate_dimension(
         dim_config["prompt_file"],
         dim_config["prompt_key"],
         ticker,
-        financial_info,
+        snippets.focus(financial_info, focus_query(dim_config), SEARCH_FOCUS_RESULTS),
     )
 
     await emit_status({
@@ -140,7 +152,7 @@ async def _generate_dimension(
         "message": f"Processing {dim_config['label']} dimension…",
     })
 
-    llm = create_llm(max_tokens=dim_config["max_tokens"])
+    llm = create_llm("dimension", max_tokens=dim_config["max_tokens"])
     structured_llm = llm.with_structured_output(dim_config["output_model"])
 
     result = await structured_llm.ainvoke([
@@ -162,48 +174,73 @@ async def _generate_dimension(
     return dim_key, value
 
 
+def tier_dimensions(tier: dict) -> List[str]:
+    """The profile dimensions a depth tier generates."""
+    return list(tier["dimensions"]) if tier["dimensions"] is not None else list(DIMENSIONS)
+
+
 async def financial_reporter_node(state: AgentState) -> AgentState:
     """LangGraph node: generate the company profile from financial info.
 
-    Splits the profile generation into 8 parallel dimension calls to avoid
-    context window overflow when financial_info is large.
+    Splits the profile generation into parallel dimension calls (8 unless the
+    depth tier selects fewer) to avoid context window overflow when
+    financial_info is large. Dimensions a tier skips, or that are dropped to
+    meet its latency target, are left empty.
     """
     logger.info("=== FINANCIAL REPORTER NODE START ===")
     ticker = state["ticker"]
-    financial_info = state["financial_info"]
+    financial_info = blobs.get(state["financial_info_ref"])
+    selected = tier_dimensions(depth.tier(state))
     logger.info("Ticker: %s, financial_info: %d chars", ticker, len(financial_info))
 
     await emit_status({
         "type": "status",
         "node": "financial_reporter",
         "label": "Starting company profile",
-        "message": f"Analyzing {ticker} across {len(DIMENSIONS)} dimensions in parallel…",
+        "message": f"Analyzing {ticker} across {len(selected)} dimensions in parallel…",
     })
 
-    # Generate all dimensions in parallel
-    dimension_tasks = [_generate_dimension(dim_key, ticker, financial_info)
-                       for dim_key in DIMENSIONS.keys()]
-
-    logger.info("Starting %d parallel dimension generation tasks", len(dimension_tasks))
-    results = await asyncio.gather(*dimension_tasks)
+    # Incremental mode: reuse dimensions whose inputs did not change
+    dimension_results: Dict[str, str] = {}
+    previous = run_store.previous_run(state)
+    previous_profile = (previous or {}).get("company_profile") or {}
+    if previous_profile:
+        changed = state["changed_sections"]
+        for dim_key in selected:
+            dim_config = DIMENSIONS[dim_key]
+            value = previous_profile.get(dim_config["output_field"])
+            if value and not run_store.inputs_changed(changed, dim_config["inputs"], ticker):
+                dimension_results[dim_key] = value
+        logger.info("Reusing %d/%d dimensions from previous run: %s",
+                    len(dimension_results), len(selected), list(dimension_results))
+        if dimension_results:
+            await emit_status({
+                "type": "status",
+                "node": "financial_reporter",
+                "label": f"Reused {len(dimension_results)} dimensions",
+                "message": "Inputs unchanged since the last run: "
+                           + ", ".join(DIMENSIONS[k]["label"] for k in dimension_results),
+            })
+
+    # Generate the remaining dimensions in parallel, up to the stage deadline
+    pending = [dim_key for dim_key in selected if dim_key not in dimension_results]
+    logger.info("Starting %d parallel dimension generation tasks", len(pending))
+    results = await depth.gather_optional(
+        [_generate_dimension(dim_key, ticker, financial_info) for dim_key in pending],
+        depth.deadline(state, "profile"),
+        min_done=0 if dimension_results else 1,
+    )
 
     # Combine all dimension results
-    dimension_results = dict(results)
+    dimension_results.update(r for r in results if r is not None)
 
     for dim_key, value in dimension_results.items():
         logger.info("Generated dimension %s: %d chars", dim_key, len(value))
 
     # Build CompanyProfile from all dimensions
-    company_profile = CompanyProfile(
-        business_model=dimension_results["business_model"],
-        what_they_sell_and_who_buys=dimension_results["what_they_sell"],
-        how_they_make_money=dimension_results["how_they_make_money"],
-        revenue_quality=dimension_results["revenue_quality"],
-        cost_structure=dimension_results["cost_structure"],
-        capital_intensity=dimension_results["capital_intensity"],
-        growth_drivers=dimension_results["growth_drivers"],
-        competitive_edge=dimension_results["competitive_edge"],
-    )
+    company_profile = CompanyProfile(**{
+        DIMENSIONS[dim_key]["output_field"]: dimension_results.get(dim_key, "") for dim_key in DIMENSIONS
+    })
 
     logger.info("Company profile generated: business_model=%d chars, competitive_edge=%d chars",
                  len(company_profile.business_model), len(company_profile.competitive_edge))
@@ -212,8 +249,12 @@ async def financial_reporter_node(state: AgentState) -> AgentState:
         "type": "status",
         "node": "financial_reporter",
         "label": "Company profile complete",
-        "message": f"All {len(DIMENSIONS)} dimensions completed successfully",
+        "message": f"{len(dimension_results)}/{len(selected)} dimensions completed",
     })
 
+    update: AgentState = {"company_profile": company_profile}
+    dropped = [DIMENSIONS[k]["label"] for k, r in zip(pending, results) if r is None]
+    if dropped:
+        update["trimmed"] = depth.record_trim(state, "dimension", dropped)
     logger.info("=== FINANCIAL REPORTER NODE END ===")
-    return {"company_profile": company_profile}
+    return update
@@ -1,12 +1,28 @@
+import threading
+from typing import List
+
 from langgraph.graph import StateGraph, END
 
 from app.schema import AgentState
+from app.tracing import instrument
 from app.agents.planner import planner_node
 from app.agents.stock_info_agent import stock_info_node
 from app.agents.financial_reporter_agent import financial_reporter_node
+from app.agents.price_agent import price_history_node
 from app.agents.persona_agent import persona_generator_node
 from app.agents.analysis_agent import analysis_node
 from app.agents.report_agent import report_node
+from app.agents.comparison_agent import comparison_node, comparison_report_node
+
+
+def route_after_planner(state: AgentState) -> List[str]:
+    """Send multi-ticker comparisons to the comparison branch.
+
+    Single-ticker runs load price history alongside the fundamentals.
+    """
+    if state.get("intent") == "comparison" and len(state.get("tickers", [])) > 1:
+        return ["compare"]
+    return ["stock_info", "price_history"]
 
 
 def build_graph() -> StateGraph:
@@ -14,25 +30,51 @@ def build_graph() -> StateGraph:
 
     Flow:
         START -> planner -> stock_info -> financial_reporter -> generate_personas -> analysis -> report -> END
+        (planner -> price_history -> generate_personas runs alongside stock_info -> financial_reporter)
+        START -> planner -> compare -> generate_comparison_report -> END   (multi-ticker comparison)
     """
     workflow = StateGraph(AgentState)
 
-    workflow.add_node("planner", planner_node)
-    workflow.add_node("stock_info", stock_info_node)
-    workflow.add_node("financial_reporter", financial_reporter_node)
-    workflow.add_node("generate_personas", persona_generator_node)
-    workflow.add_node("analysis", analysis_node)
-    workflow.add_node("generate_report", report_node)
+    workflow.add_node("planner", instrument("planner", planner_node))
+    workflow.add_node("stock_info", instrument("stock_info", stock_info_node))
+    workflow.add_node("financial_reporter", instrument("financial_reporter", financial_reporter_node))
+    workflow.add_node("price_history", instrument("price_history", price_history_node))
+    workflow.add_node("generate_personas", instrument("generate_personas", persona_generator_node))
+    workflow.add_node("analysis", instrument("analysis", analysis_node))
+    workflow.add_node("generate_report", instrument("generate_report", report_node))
+    workflow.add_node("compare", instrument("compare", comparison_node))
+    workflow.add_node("generate_comparison_report", instrument("generate_comparison_report", comparison_report_node))
 
     workflow.set_entry_point("planner")
-    workflow.add_edge("planner", "stock_info")
+    workflow.add_conditional_edges("planner", route_after_planner, ["stock_info", "price_history", "compare"])
     workflow.add_edge("stock_info", "financial_reporter")
-    workflow.add_edge("financial_reporter", "generate_personas")
+    # Personas start once both the profile and the price history are ready
+    workflow.add_edge(["financial_reporter", "price_history"], "generate_personas")
     workflow.add_edge("generate_personas", "analysis")
     workflow.add_edge("analysis", "generate_report")
     workflow.add_edge("generate_report", END)
+    workflow.add_edge("compare", "generate_comparison_report")
+    workflow.add_edge("generate_comparison_report", END)
 
     return workflow.compile()
 
 
-decision_graph = build_graph()
+_compiled = None
+_compile_lock = threading.Lock()
+
+
+def get_decision_graph():
+    """Return the compiled workflow, compiling it on first use."""
+    global _compiled
+    if _compiled is None:
+        with _compile_lock:
+            if _compiled is None:
+                _compiled = build_graph()
+    return _compiled
+
+
+def __getattr__(name: str):
+    # ``decision_graph`` stays importable but is only compiled when first used
+    if name == "decision_graph":
+        return get_decision_graph()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
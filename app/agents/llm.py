@@ -1,35 +1,328 @@
 import os
+import time
+import random
+import asyncio
 import logging
-from typing import Optional
+import threading
+from typing import Any, Dict, Optional, Tuple
+from uuid import UUID
 
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import ChatResult, LLMResult
+import httpx
+import openai
 from langchain_openai import ChatOpenAI
+from pydantic import BaseModel
 
-from app.config import LLM_TIMEOUT, LLM_MAX_RETRIES
+from app.config import LLM_CACHE, LLM_MAX_RETRIES, LLM_ROUTES
+from app import metrics, latency, cassette, llm_cache, deadline, admission
+from app.breaker import CircuitBreaker, get_breaker, llm_backend
+from app.agents.structured import structured_output
 
 logger = logging.getLogger(__name__)
 
+# Clients are shared across nodes and concurrent runs so they reuse one
+# HTTP connection pool per configuration instead of building a new one per call.
+_clients: Dict[Tuple, "GuardedChatOpenAI"] = {}
+_clients_lock = threading.Lock()
 
-def create_llm(temperature: float = 0.0, max_tokens: Optional[int] = None, timeout: Optional[int] = None) -> ChatOpenAI:
+
+class RouteMetricsHandler(BaseCallbackHandler):
+    """Record latency, token usage and errors of every call made on a route."""
+
+    def __init__(self, route: str, model: str) -> None:
+        self.route = route
+        self.model = model
+        self._started: Dict[UUID, float] = {}
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        labels = {"route": self.route, "model": self.model}
+        if started is not None:
+            metrics.observe("llm_latency_seconds", time.perf_counter() - started, **labels)
+        input_tokens = output_tokens = 0
+        for generations in response.generations:
+            for gen in generations:
+                usage = getattr(getattr(gen, "message", None), "usage_metadata", None) or {}
+                input_tokens += usage.get("input_tokens", 0)
+                output_tokens += usage.get("output_tokens", 0)
+        metrics.inc("llm_calls_total", **labels)
+        metrics.inc("llm_input_tokens_total", input_tokens, **labels)
+        metrics.inc("llm_output_tokens_total", output_tokens, **labels)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started.pop(run_id, None)
+        metrics.inc("llm_errors_total", route=self.route, model=self.model, error=type(error).__name__)
+
+
+def is_backend_failure(error: BaseException) -> bool:
+    """Whether an LLM error means the backend is unhealthy.
+
+    Connection errors, timeouts, 5xx and 429 count. Other 4xx (bad request,
+    context too long, ...) are the caller's fault, and any other exception
+    (parsing, validation, ...) is a local bug: neither is retried nor
+    counted by the breaker.
+    """
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500 or error.status_code == 429
+    if isinstance(error, deadline.DeadlineExceeded):
+        return False
+    return isinstance(error, (openai.APIConnectionError, httpx.TransportError, TimeoutError))
+
+
+def _prompt_chars(messages: Any) -> int:
+    return sum(len(str(getattr(m, "content", m))) for m in messages)
+
+
+def _used_tokens(result: ChatResult) -> int:
+    """Input + output tokens the backend reported for a call."""
+    total = 0
+    for gen in result.generations:
+        usage = getattr(gen.message, "usage_metadata", None) or {}
+        total += usage.get("input_tokens", 0) + usage.get("output_tokens", 0)
+    return total
+
+
+def _backoff(attempt: int) -> float:
+    """Exponential backoff with jitter, as the OpenAI client does (0.5s .. 8s)."""
+    return min(0.5 * 2 ** attempt, 8.0) * (1 - 0.25 * random.random())
+
+
+class GuardedChatOpenAI(ChatOpenAI):
+    """ChatOpenAI with circuit breaking and latency-derived timeouts.
+
+    Each attempt goes through the model's circuit breaker: while it is open a
+    call raises ``CircuitOpenError`` before any request (or retry) is sent,
+    and every outcome is fed back to the breaker. The timeout and number of
+    retries of each call come from ``app.latency.plan`` for the route, model
+    and prompt size; retries are done here, not by the OpenAI client. Both
+    are clamped to what is left of the run's deadline (``app.deadline``); an
+    attempt cut short by it raises ``DeadlineExceeded`` and is not held
+    against the backend.
+    """
+
+    route: str = "default"
+    breaker_backend: str = ""
+
+    def _breaker(self) -> CircuitBreaker:
+        return get_breaker(self.breaker_backend or llm_backend(self.model_name))
+
+    def _record(self, breaker: CircuitBreaker, probe: bool, error: Optional[BaseException] = None) -> None:
+        if error is None:
+            breaker.record(True, probe)
+        elif isinstance(error, asyncio.CancelledError):
+            breaker.release(probe)
+        else:
+            breaker.record(not is_backend_failure(error), probe, error)
+
+    def _plan(self, messages: Any) -> Tuple[int, dict]:
+        bucket = latency.prompt_bucket(_prompt_chars(messages))
+        ceiling = float(self.request_timeout or LLM_ROUTES[self.route]["timeout"])
+        return bucket, {**latency.plan(self.route, self.model_name, bucket, ceiling), "ceiling": ceiling}
+
+    def _cut_by_deadline(self, exc: BaseException, breaker: CircuitBreaker, probe: bool) -> Optional[BaseException]:
+        """The error to raise if ``exc`` is the run running out of time (None otherwise)."""
+        if isinstance(exc, asyncio.CancelledError) or not deadline.expired():
+            return None
+        # The timeout was clamped to the deadline: says nothing about the backend
+        breaker.release(probe)
+        return deadline.exceeded("llm")
+
+    def _failed_attempt(self, exc: BaseException, attempt: int, bucket: int, plan: dict, started: float) -> Optional[float]:
+        """Book-keep a failed attempt and prepare ``plan`` for the next one.
+
+        Returns the delay before retrying, or None to give up. A timed-out
+        retry gets twice the timeout, and adaptive plans stop retrying when
+        the next attempt would no longer fit into the route timeout or the
+        time left before the run's deadline.
+        """
+        if isinstance(exc, openai.APITimeoutError):
+            # A timed-out attempt took at least the timeout; counting it lets
+            # the timeout grow again when the backend has become slower
+            latency.observe(self.route, self.model_name, bucket, plan["timeout"])
+            metrics.inc("llm_timeouts_total", route=self.route, model=self.model_name)
+        if isinstance(exc, asyncio.CancelledError) or not is_backend_failure(exc):
+            return None
+        if attempt >= plan["max_retries"]:
+            return None
+        delay = _backoff(attempt)
+        if isinstance(exc, openai.APITimeoutError):
+            plan["timeout"] = min(plan["ceiling"], plan["timeout"] * 2)
+        elapsed = time.perf_counter() - started
+        if plan["source"] != "static" and elapsed + delay + plan["timeout"] > plan["ceiling"]:
+            return None
+        left = deadline.remaining()
+        if left is not None and (delay >= left or plan["source"] != "static" and delay + plan["timeout"] > left):
+            return None
+        logger.warning(
+            "LLM %s/%s attempt %d/%d failed (%s) — retrying in %.1fs with timeout %.1fs (%s)",
+            self.route, self.model_name, attempt + 1, plan["max_retries"] + 1,
+            type(exc).__name__, delay, plan["timeout"], plan["source"],
+        )
+        return delay
+
+    def _generate(self, messages: Any, *args: Any, **kwargs: Any):
+        bucket, plan = self._plan(messages)
+        breaker = self._breaker()
+        call_started = time.perf_counter()
+        attempt = 0
+        while True:
+            deadline.check("llm")
+            probe = breaker.before_call()
+            started = time.perf_counter()
+            try:
+                with llm_cache.watch_hits() as cache:
+                    result = super()._generate(messages, *args, timeout=deadline.clamp(plan["timeout"]), **kwargs)
+            except BaseException as exc:
+                cut = self._cut_by_deadline(exc, breaker, probe)
+                if cut is not None:
+                    raise cut from exc
+                self._record(breaker, probe, exc)
+                delay = self._failed_attempt(exc, attempt, bucket, plan, call_started)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                attempt += 1
+                continue
+            if cache["hit"]:
+                # Served locally: says nothing about the backend's health or speed
+                breaker.release(probe)
+                admission.record_tokens(0)
+            else:
+                self._record(breaker, probe)
+                latency.observe(self.route, self.model_name, bucket, time.perf_counter() - started)
+                admission.record_tokens(_used_tokens(result))
+            return result
+
+    async def _agenerate(self, messages: Any, *args: Any, **kwargs: Any):
+        bucket, plan = self._plan(messages)
+        breaker = self._breaker()
+        call_started = time.perf_counter()
+        attempt = 0
+        while True:
+            deadline.check("llm")
+            probe = breaker.before_call()
+            started = time.perf_counter()
+            try:
+                with llm_cache.watch_hits() as cache:
+                    result = await super()._agenerate(messages, *args, timeout=deadline.clamp(plan["timeout"]), **kwargs)
+            except BaseException as exc:
+                cut = self._cut_by_deadline(exc, breaker, probe)
+                if cut is not None:
+                    raise cut from exc
+                self._record(breaker, probe, exc)
+                delay = self._failed_attempt(exc, attempt, bucket, plan, call_started)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                attempt += 1
+                continue
+            if cache["hit"]:
+                # Served locally: says nothing about the backend's health or speed
+                breaker.release(probe)
+                admission.record_tokens(0)
+            else:
+                self._record(breaker, probe)
+                latency.observe(self.route, self.model_name, bucket, time.perf_counter() - started)
+                admission.record_tokens(_used_tokens(result))
+            return result
+
+    def with_structured_output(self, schema: Any = None, **kwargs: Any):
+        """Pydantic schemas get ``app.agents.structured`` (local repair before any
+        re-generation); anything else goes to ChatOpenAI's implementation."""
+        if kwargs or not (isinstance(schema, type) and issubclass(schema, BaseModel)):
+            return super().with_structured_output(schema, **kwargs)
+        return structured_output(self, schema)
+
+    # Streams are not retried (chunks may already have been consumed)
+
+    def _stream(self, messages: Any, *args: Any, **kwargs: Any):
+        _, plan = self._plan(messages)
+        breaker = self._breaker()
+        deadline.check("llm")
+        probe = breaker.before_call()
+        try:
+            yield from super()._stream(messages, *args, timeout=deadline.clamp(plan["timeout"]), **kwargs)
+        except BaseException as exc:
+            cut = self._cut_by_deadline(exc, breaker, probe)
+            if cut is not None:
+                raise cut from exc
+            self._record(breaker, probe, exc)
+            raise
+        self._record(breaker, probe)
+
+    async def _astream(self, messages: Any, *args: Any, **kwargs: Any):
+        _, plan = self._plan(messages)
+        breaker = self._breaker()
+        deadline.check("llm")
+        probe = breaker.before_call()
+        try:
+            async for chunk in super()._astream(messages, *args, timeout=deadline.clamp(plan["timeout"]), **kwargs):
+                yield chunk
+        except BaseException as exc:
+            cut = self._cut_by_deadline(exc, breaker, probe)
+            if cut is not None:
+                raise cut from exc
+            self._record(breaker, probe, exc)
+            raise
+        self._record(breaker, probe)
+
+
+def _transport(route: str) -> Optional[Any]:
+    """httpx transport stack for a route's client (None = the OpenAI client's default)."""
+    transport = cassette.CassetteTransport() if cassette.enabled() else None
+    if LLM_CACHE and LLM_ROUTES[route]["cache"]:
+        transport = llm_cache.CachingTransport(route, inner_async=transport, inner_sync=transport)
+    return transport
+
+
+def create_llm(
+    route: str = "default",
+    temperature: float = 0.0,
+    max_tokens: Optional[int] = None,
+    timeout: Optional[int] = None,
+) -> GuardedChatOpenAI:
     """Create a LangChain ChatOpenAI client with custom endpoint.
 
-    Timeout and retry behaviour are controlled by the env vars
-    ``LLM_TIMEOUT_SECONDS`` (default 60) and ``LLM_MAX_RETRIES`` (default 5).
+    The model, timeout and max_tokens come from the per-node route in
+    ``app.config.LLM_ROUTES`` (small fast model for extraction-style nodes,
+    the big model for analyses and the report). The route timeout is the
+    ceiling: once enough calls have been observed, each call's timeout and
+    retries (at most ``LLM_MAX_RETRIES``) follow the recent p99 latency of
+    the route, model and prompt size (``app.latency``), never running past the
+    run's deadline (``app.deadline``). Calls fail fast with
+    ``app.breaker.CircuitOpenError`` while the model's circuit breaker is open.
 
     Args:
+        route: Routing key, e.g. "planner", "dimension", "report" (default "default")
         temperature: Sampling temperature (default 0.0)
-        max_tokens: Maximum tokens to generate (default None)
-        timeout: Override timeout in seconds (default uses LLM_TIMEOUT from env)
+        max_tokens: Override the route's max tokens to generate
+        timeout: Override the route's timeout (ceiling) in seconds
     """
+    if route not in LLM_ROUTES:
+        logger.warning("Unknown LLM route %r, using 'default'", route)
+        route = "default"
+    route_config = LLM_ROUTES[route]
+
     base_url = os.getenv("OPENAI_BASE_URL")
     api_key = os.getenv("OPENAI_API_KEY")
-    model_name = os.getenv("OPENAI_MODEL_NAME", "sonar")
-    actual_timeout = timeout if timeout is not None else LLM_TIMEOUT
+    model_name = route_config["model"]
+    actual_timeout = timeout if timeout is not None else route_config["timeout"]
+    actual_max_tokens = max_tokens if max_tokens is not None else route_config["max_tokens"]
+
+    cache_key = (route, base_url, api_key, model_name, temperature, actual_max_tokens, actual_timeout)
+    with _clients_lock:
+        client = _clients.get(cache_key)
+    if client is not None:
+        return client
 
     logger.info(
-        "Env vars loaded: OPENAI_BASE_URL=%s, OPENAI_API_KEY=%s, OPENAI_MODEL_NAME=%s",
+        "Env vars loaded: OPENAI_BASE_URL=%s, OPENAI_API_KEY=%s",
         base_url,
         "***" if api_key else None,
-        model_name,
     )
 
     if not base_url:
@@ -38,8 +331,8 @@ def create_llm(temperature: float = 0.0, max_tokens: Optional[int] = None, timeo
         raise ValueError("OPENAI_API_KEY environment variable is required")
 
     logger.info(
-        "Creating LLM: model=%s, base_url=%s, temperature=%s, timeout=%ds, max_retries=%d, max_tokens=%s",
-        model_name, base_url, temperature, actual_timeout, LLM_MAX_RETRIES, max_tokens,
+        "Creating LLM: route=%s, model=%s, base_url=%s, temperature=%s, timeout=%ds, max_retries=%d, max_tokens=%s",
+        route, model_name, base_url, temperature, actual_timeout, LLM_MAX_RETRIES, actual_max_tokens,
     )
 
     kwargs = dict(
@@ -48,9 +341,19 @@ def create_llm(temperature: float = 0.0, max_tokens: Optional[int] = None, timeo
         model=model_name,
         temperature=temperature,
         timeout=actual_timeout,
-        max_retries=LLM_MAX_RETRIES,
+        # Retries are made by GuardedChatOpenAI, with an adaptive budget
+        max_retries=0,
+        callbacks=[RouteMetricsHandler(route, model_name)],
+        route=route,
+        breaker_backend=llm_backend(model_name),
     )
-    if max_tokens is not None:
-        kwargs["max_tokens"] = max_tokens
+    if actual_max_tokens is not None:
+        kwargs["max_tokens"] = actual_max_tokens
+    transport = _transport(route)
+    if transport is not None:
+        kwargs["http_async_client"] = httpx.AsyncClient(transport=transport)
+        kwargs["http_client"] = httpx.Client(transport=transport)
 
-    return ChatOpenAI(**kwargs)
+    client = GuardedChatOpenAI(**kwargs)
+    with _clients_lock:
+        return _clients.setdefault(cache_key, client)
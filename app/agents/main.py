@@ -10,57 +10,66 @@ from dotenv import load_dotenv
 env_path = Path(__file__).resolve().parent.parent.parent / ".env"
 load_dotenv(dotenv_path=env_path)
 
-from app.agents.graph import decision_graph
-
 logger = logging.getLogger(__name__)
 
 
 def setup_logging(verbose: bool) -> None:
-    """Configure logging based on verbosity flag."""
-    level = logging.DEBUG if verbose else logging.INFO
-    logging.basicConfig(
-        level=level,
-        format="%(asctime)s [%(levelname)s] %(name)s: %(message)s",
-        datefmt="%H:%M:%S",
-        stream=sys.stderr,
-    )
-    # Quiet down noisy libraries unless in debug mode
-    if not verbose:
-        logging.getLogger("httpx").setLevel(logging.WARNING)
-        logging.getLogger("httpcore").setLevel(logging.WARNING)
-        logging.getLogger("openai").setLevel(logging.WARNING)
-        logging.getLogger("langchain").setLevel(logging.WARNING)
+    """Configure logging based on verbosity flag (same pipeline as the API, see app/logs.py)."""
+    from app import logs
+
+    logs.setup("DEBUG" if verbose else "INFO", default_format="text", sampling=False)
 
 
 def dump_state(state: dict) -> None:
-    """Log the full final state for debugging."""
+    """Log a summary of the final state (item values only at DEBUG)."""
+    if not logger.isEnabledFor(logging.INFO):
+        return
+    debug = logger.isEnabledFor(logging.DEBUG)
     logger.info("========== FINAL STATE DUMP ==========")
     for key, value in state.items():
         if isinstance(value, str):
             logger.info("  state[%r]: str, %d chars", key, len(value))
-            logger.debug("  state[%r] preview: %s...", key, value[:300])
+            if debug:
+                logger.debug("  state[%r] preview: %s...", key, value[:300])
         elif isinstance(value, list):
             logger.info("  state[%r]: list, %d items", key, len(value))
-            for i, item in enumerate(value):
-                if hasattr(item, "model_dump"):
-                    logger.debug("  state[%r][%d]: %s", key, i, item.model_dump())
-                else:
-                    logger.debug("  state[%r][%d]: %s", key, i, str(item)[:200])
+            if debug:
+                for i, item in enumerate(value):
+                    logger.debug("  state[%r][%d]: %s", key, i,
+                                 item.model_dump() if hasattr(item, "model_dump") else str(item)[:200])
         else:
-            logger.info("  state[%r]: %s = %s", key, type(value).__name__, str(value)[:200])
+            logger.info("  state[%r]: %s", key, type(value).__name__)
+            if debug:
+                logger.debug("  state[%r] = %s", key, str(value)[:200])
     logger.info("========== END STATE DUMP ==========")
 
 
-async def run(ticker: str, output: str | None, verbose: bool) -> None:
-    setup_logging(verbose)
+class EmptyReportError(RuntimeError):
+    """The pipeline finished without a report."""
+
+
+async def run(tickers: list[str], output: str | None, incremental: bool = False, depth: str | None = None) -> None:
+    # Imported here so `--help` and argument errors don't pay for langchain/langgraph
+    from app.agents.graph import get_decision_graph
 
-    logger.info("Starting pipeline for ticker: %s", ticker)
+    decision_graph = get_decision_graph()
+    logger.info("Starting pipeline for tickers: %s (incremental=%s, depth=%s)", tickers, incremental, depth or "default")
+
+    if len(tickers) > 1:
+        user_message = f"Compare {' and '.join(tickers)}"
+    else:
+        user_message = f"Analyze {tickers[0]} stock"
 
     result = await decision_graph.ainvoke({
-        "user_message": f"Analyze {ticker} stock",
+        "user_message": user_message,
+        "tickers": tickers,
+        "incremental": incremental,
+        **({"depth": depth} if depth else {}),
     })
 
     dump_state(result)
+    if result.get("trimmed"):
+        logger.warning("Dropped to meet the latency target: %s", result["trimmed"])
 
     report = result.get("report", "")
     if not report:
@@ -69,24 +78,94 @@ async def run(ticker: str, output: str | None, verbose: bool) -> None:
         for key, value in result.items():
             if isinstance(value, str):
                 logger.error("  %s (%d chars): %s...", key, len(value), value[:200])
-        sys.exit(1)
+        raise EmptyReportError(f"Pipeline produced an empty report for {', '.join(tickers)}")
 
     if output is None:
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        output = f"{ticker}_{timestamp}_report.md"
+        output = f"{'_vs_'.join(tickers)}_{timestamp}_report.md"
 
     Path(output).write_text(report, encoding="utf-8")
     logger.info("Report saved to %s (%d chars)", output, len(report))
 
 
+async def run_batch(tickers: list[str], incremental: bool = False, depth: str | None = None) -> list[str]:
+    """Analyse each ticker in its own run, ``SCREEN_ANALYZE_CONCURRENCY`` at a time; returns the failed ones.
+
+    All runs share one event loop: the LLM clients are cached process-wide
+    and their connection pools belong to the loop they were first used on.
+    """
+    from app.config import SCREEN_ANALYZE_CONCURRENCY
+
+    semaphore = asyncio.Semaphore(SCREEN_ANALYZE_CONCURRENCY)
+
+    async def analyze_one(ticker: str) -> str | None:
+        async with semaphore:
+            try:
+                await run([ticker], None, incremental, depth)
+            except Exception as e:
+                logger.error("Analysis of %s failed: %s", ticker, e)
+                return ticker
+        return None
+
+    return [t for t in await asyncio.gather(*[analyze_one(t) for t in tickers]) if t]
+
+
+def screen(expression: str, rank_by: str | None, ascending: bool, top: int) -> list[str]:
+    """Print the screen's top tickers (from the fundamentals store) and return them."""
+    from app import screening
+
+    try:
+        result = screening.screen(expression, rank_by, ascending, top)
+    except screening.ScreenError as e:
+        sys.exit(f"Invalid screen: {e}")
+    print(f"{result['matched']} of {result['universe']} tickers match ({result['elapsed_ms']}ms)")
+    for row in result["rows"]:
+        score = f"  score={row['score']:.4g}" if row.get("score") is not None else ""
+        print(f"  {row['ticker']:<8} {row['shortName'] or '':<32} {row['sector'] or '':<24}{score}")
+    return screening.tickers(result)
+
+
 def main():
+    from app.config import DEPTH_TIERS, DEFAULT_DEPTH
+
     parser = argparse.ArgumentParser(description="Run the stock analysis pipeline")
-    parser.add_argument("ticker", help="Stock ticker symbol (e.g. AAPL, MSFT, TSLA)")
-    parser.add_argument("-o", "--output", default=None, help="Output file path (default: <TICKER>_<timestamp>_report.md)")
+    parser.add_argument("tickers", nargs="*", metavar="ticker",
+                        help="Stock ticker symbol (e.g. AAPL, MSFT, TSLA); pass several to compare them")
+    parser.add_argument("-o", "--output", default=None, help="Output file path (default: <TICKER>[_vs_<TICKER>…]_<timestamp>_report.md)")
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable DEBUG-level logging for all agents")
+    parser.add_argument("-i", "--incremental", action="store_true",
+                        help="Reuse outputs of the last stored run whose input data did not change")
+    parser.add_argument("-d", "--depth", choices=list(DEPTH_TIERS), default=None,
+                        help=f"Analysis depth tier (default: DEFAULT_DEPTH, i.e. {DEFAULT_DEPTH})")
+    parser.add_argument("-s", "--screen", metavar="EXPR", default=None,
+                        help="Screen the fundamentals store instead of naming tickers and analyse each of the top "
+                             "ones, e.g. \"trailingPE < 20 and debtToEquity < 100\"")
+    parser.add_argument("--rank-by", metavar="EXPR", default=None,
+                        help="Rank screened tickers by this expression, highest first (e.g. fcfYield_sector_pct)")
+    parser.add_argument("--ascending", action="store_true", help="Rank screened tickers lowest first")
+    parser.add_argument("--top", type=int, default=5, help="Number of screened tickers to analyse (default: 5)")
+    parser.add_argument("--screen-only", action="store_true", help="Print the screen's result without analysing")
     args = parser.parse_args()
 
-    asyncio.run(run(args.ticker.upper(), args.output, args.verbose))
+    if args.screen is None:
+        if not args.tickers:
+            parser.error("pass at least one ticker, or --screen")
+        setup_logging(args.verbose)
+        try:
+            asyncio.run(run([t.upper() for t in args.tickers], args.output, args.incremental, args.depth))
+        except EmptyReportError:
+            sys.exit(1)
+        return
+    if args.tickers or args.output:
+        parser.error("--screen picks the tickers and names the reports itself")
+    tickers = screen(args.screen, args.rank_by, args.ascending, args.top)
+    if args.screen_only:
+        return
+    setup_logging(args.verbose)
+    # One separate analysis per screened ticker, all on one event loop
+    failed = asyncio.run(run_batch(tickers, args.incremental, args.depth))
+    if failed:
+        sys.exit(f"Analysis failed for {', '.join(failed)}")
 
 
 if __name__ == "__main__":
@@ -1,15 +1,20 @@
 import logging
+from functools import lru_cache
+from typing import List, Type
 
 from langchain_core.messages import SystemMessage, HumanMessage
+from pydantic import BaseModel, Field, create_model
 
-from app.schema import PersonaCollection, AgentState
+from app.schema import PersonaCollection, Persona, AgentState
 from app.agents.llm import create_llm
+from app.config import LLM_ROUTES
+from app import run_store, blobs, depth
 
 logger = logging.getLogger(__name__)
 
 
 PERSONA_SYSTEM_PROMPT = """You are an expert at creating diverse analytical personas for stock investment analysis.
-Your task is to generate exactly 4 distinct personas, each representing a unique perspective for analyzing a stock's future profit and risk.
+Your task is to generate exactly {count} distinct personas, each representing a unique perspective for analyzing a stock's future profit and risk.
 
 Each persona should have different characteristics across these axes:
 1. Risk appetite: low (risk-averse), high (risk-seeking), or moderate
@@ -18,7 +23,7 @@ Each persona should have different characteristics across these axes:
 4. Value orientation: Primary values from efficiency, fairness, innovation, security, stability (can have multiple)
 5. Logical reasoning style: Describe the reasoning methodology and approach
 
-Create exactly 4 personas that represent diverse investment viewpoints such as:
+Create exactly {count} personas that represent diverse investment viewpoints such as:
 - Conservative value investor focused on downside protection
 - Growth-oriented analyst focused on upside potential
 - Macro/sector strategist focused on industry dynamics
@@ -27,31 +32,66 @@ Create exactly 4 personas that represent diverse investment viewpoints such as:
 Ensure each persona has a clear name, description, perspective axes, and analysis approach."""
 
 
+@lru_cache(maxsize=None)
+def _collection_model(count: int) -> Type[BaseModel]:
+    """``PersonaCollection`` for ``count`` personas (the schema the LLM is asked for)."""
+    if count == 4:
+        return PersonaCollection
+    return create_model(
+        "PersonaCollection",
+        __doc__=f"Collection of {count} personas for multi-perspective analysis",
+        personas=(List[Persona], Field(
+            min_length=count,
+            max_length=count,
+            description=f"List of exactly {count} personas, each with distinct perspectives",
+        )),
+    )
+
+
+def _max_tokens(count: int):
+    """The persona route's token budget is sized for 4 personas; scale it with the count."""
+    budget = LLM_ROUTES["persona"]["max_tokens"]
+    return budget if budget is None or count <= 4 else budget * count // 4
+
+
 async def persona_generator_node(state: AgentState) -> AgentState:
-    """LangGraph node that generates 4 personas tailored to the stock being analyzed."""
+    """LangGraph node that generates personas (4 unless the depth tier says otherwise) tailored to the stock."""
     logger.info("=== PERSONA GENERATOR NODE START ===")
     ticker = state["ticker"]
-    financial_info = state.get("financial_info", "")
-    logger.info("Ticker: %s, financial_info length: %d chars", ticker, len(financial_info))
+    ref = state.get("financial_info_ref")
+    # Only the head of financial_info (the yfinance company info) is needed here
+    financial_info_head = blobs.get_slice(ref, 0, 1000) if ref else ""
+    logger.info("Ticker: %s, financial_info head: %d chars", ticker, len(financial_info_head))
+
+    count = depth.tier(state)["personas"]
+
+    # Incremental mode: personas only depend on what the company is
+    previous = run_store.previous_run(state)
+    if (previous and len(previous.get("personas") or []) == count
+            and run_store.COMPANY_IDENTITY_SECTION not in state["changed_sections"]):
+        personas = [Persona.model_validate(p) for p in previous["personas"]]
+        logger.info("Reusing %d personas from previous run", len(personas))
+        logger.info("=== PERSONA GENERATOR NODE END ===")
+        return {"personas": personas}
 
-    llm = create_llm()
-    structured_llm = llm.with_structured_output(PersonaCollection)
+    llm = create_llm("persona", max_tokens=_max_tokens(count))
+    structured_llm = llm.with_structured_output(_collection_model(count))
 
-    user_content = f"""Generate exactly 4 diverse analytical personas to analyze the stock {ticker}.
+    user_content = f"""Generate exactly {count} diverse analytical personas to analyze the stock {ticker}.
 
 Here is a brief summary of the company's financial profile for context:
-{financial_info[:1000]}
+{financial_info_head}
 
-Create 4 personas that will each analyze this stock's future profit potential and risk from very different angles.
+Create {count} personas that will each analyze this stock's future profit potential and risk from very different angles.
 Each persona should have distinct characteristics across risk appetite, accountability, time horizon, value orientation, and reasoning style."""
 
     messages = [
-        SystemMessage(content=PERSONA_SYSTEM_PROMPT),
+        SystemMessage(content=PERSONA_SYSTEM_PROMPT.format(count=count)),
         HumanMessage(content=user_content),
     ]
 
-    logger.debug("Sending messages to LLM for structured output (PersonaCollection)")
-    result: PersonaCollection = await structured_llm.ainvoke(messages)
+    logger.debug("Sending messages to LLM for structured output (PersonaCollection of %d)", count)
+    result = await structured_llm.ainvoke(messages)
 
     logger.info("Generated %d personas:", len(result.personas))
     for i, p in enumerate(result.personas):
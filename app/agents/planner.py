@@ -1,35 +1,81 @@
+import re
+import time
+import asyncio
 import logging
+from typing import Optional
 
 from langchain_core.messages import SystemMessage, HumanMessage
 
 from app.schema import AgentState, PlannerOutput
 from app.agents.llm import create_llm
+from app.agents.stock_info_agent import gather_financial_info
+from app.config import SPECULATIVE_FETCH
+from app import metrics, blobs, depth
 
 logger = logging.getLogger(__name__)
 
+# Uppercase tokens that look like tickers (optionally $-prefixed, with a class suffix like BRK.B)
+_TICKER_RE = re.compile(r"(?<![\w$])\$?([A-Z]{1,5}(?:\.[A-Z]{1,2})?)\b")
+_NOT_TICKERS = {
+    "I", "A", "AN", "AND", "OR", "THE", "VS", "ME", "MY", "IS", "IT", "TO", "OF", "IN", "ON",
+    "US", "USA", "AI", "CEO", "CFO", "ETF", "IPO", "EPS", "PE", "GDP", "FY", "YOY", "ESG",
+    "OK", "NYSE", "SEC", "API", "USD", "EUR", "Q", "TTM", "EBIT", "EBITDA", "ROE", "FCF",
+}
+
+
+def guess_ticker(user_message: str) -> Optional[str]:
+    """Cheap local guess of the ticker in ``user_message``.
+
+    Returns a guess only when exactly one plausible ticker-like token is
+    present, so ambiguous messages and comparisons never speculate.
+    """
+    candidates = {m for m in _TICKER_RE.findall(user_message) if m not in _NOT_TICKERS}
+    return candidates.pop() if len(candidates) == 1 else None
+
 
 PLANNER_SYSTEM_PROMPT = """You are a planning agent for a stock analysis system.
 
 Given a user message, your job is to:
 1. Identify the user's intent (e.g. "stock_analysis", "comparison", "general_question")
-2. Extract the stock ticker symbol mentioned in the message
+2. Extract every stock ticker symbol mentioned in the message
 
 Examples:
-- "Tell me about Apple stock" → intent: "stock_analysis", ticker: "AAPL"
-- "Should I invest in Tesla?" → intent: "stock_analysis", ticker: "TSLA"
-- "Analyze MSFT for me" → intent: "stock_analysis", ticker: "MSFT"
-- "Compare GOOG and AMZN" → intent: "comparison", ticker: "GOOG" (pick the primary one)
+- "Tell me about Apple stock" → intent: "stock_analysis", ticker: "AAPL", tickers: ["AAPL"]
+- "Should I invest in Tesla?" → intent: "stock_analysis", ticker: "TSLA", tickers: ["TSLA"]
+- "Analyze MSFT for me" → intent: "stock_analysis", ticker: "MSFT", tickers: ["MSFT"]
+- "Compare GOOG and AMZN" → intent: "comparison", ticker: "GOOG", tickers: ["GOOG", "AMZN"]
 
-Always return a valid uppercase ticker symbol. If the user mentions a company name, convert it to the ticker."""
+`ticker` is the primary (first mentioned) ticker; `tickers` lists all of them in the order mentioned.
+Always return valid uppercase ticker symbols. If the user mentions a company name, convert it to the ticker."""
 
 
 async def planner_node(state: AgentState) -> AgentState:
-    """Extract intent and stock ticker from the user message."""
+    """Extract intent and stock ticker from the user message.
+
+    Runs that start with ``tickers`` (screened names, CLI arguments) skip the
+    LLM: their plan follows from the tickers.
+    """
     logger.info("=== PLANNER NODE START ===")
     logger.info("Input state keys: %s", list(state.keys()))
     logger.info("user_message: %s", state["user_message"])
-
-    llm = create_llm()
+    # The run clock for the depth tier's latency target starts here
+    started_at = state.get("started_at") or time.time()
+
+    if state.get("tickers"):
+        tickers = list(dict.fromkeys(t.strip().upper() for t in state["tickers"] if t.strip()))
+        metrics.inc("planner_calls_skipped_total")
+        logger.info("Tickers given by the caller: %s, no planning call", tickers)
+        logger.info("=== PLANNER NODE END ===")
+        return {
+            "intent": "comparison" if len(tickers) > 1 else "stock_analysis",
+            "ticker": tickers[0],
+            "tickers": tickers,
+            "reasoning": "Tickers given by the caller",
+            "depth": depth.tier_name(state),
+            "started_at": started_at,
+        }
+
+    llm = create_llm("planner")
     structured_llm = llm.with_structured_output(PlannerOutput)
 
     user_message = state["user_message"]
@@ -39,14 +85,53 @@ async def planner_node(state: AgentState) -> AgentState:
         HumanMessage(content=f"Extract the intent and stock ticker from this message:\n\n{user_message}"),
     ]
 
-    logger.debug("Sending %d messages to LLM for structured output (PlannerOutput)", len(messages))
-    result: PlannerOutput = await structured_llm.ainvoke(messages)
+    # Speculatively start the data stage for an obvious ticker while the LLM plans
+    guess = guess_ticker(user_message) if SPECULATIVE_FETCH else None
+    speculative: Optional[asyncio.Task] = None
+    if guess:
+        logger.info("Speculatively prefetching data for guessed ticker %s", guess)
+        speculative = asyncio.create_task(gather_financial_info(
+            guess, announce=False, tier=depth.tier(state),
+            deadline=depth.deadline({**state, "started_at": started_at}, "data"),
+        ))
 
-    logger.info("Planner result: intent=%s, ticker=%s, reasoning=%s", result.intent, result.ticker, result.reasoning)
-    logger.info("=== PLANNER NODE END ===")
-
-    return {
+    logger.debug("Sending %d messages to LLM for structured output (PlannerOutput)", len(messages))
+    try:
+        result: PlannerOutput = await structured_llm.ainvoke(messages)
+    except BaseException:
+        if speculative is not None:
+            speculative.cancel()
+        raise
+
+    ticker = result.ticker.strip().upper()
+    tickers = list(dict.fromkeys(t.strip().upper() for t in [ticker, *result.tickers] if t.strip()))
+
+    logger.info("Planner result: intent=%s, ticker=%s, tickers=%s, reasoning=%s",
+                result.intent, ticker, tickers, result.reasoning)
+    update = {
         "intent": result.intent,
-        "ticker": result.ticker,
+        "ticker": ticker,
+        "tickers": tickers,
         "reasoning": result.reasoning,
+        "depth": depth.tier_name(state),
+        "started_at": started_at,
     }
+
+    if speculative is not None:
+        if tickers == [guess]:
+            # Planner agrees: commit the prefetched data
+            metrics.inc("speculative_fetch_total", outcome="hit")
+            try:
+                update["financial_info_ref"] = blobs.put(await speculative)
+            except Exception:
+                logger.exception("Speculative prefetch for %s failed, stock_info will refetch", guess)
+        else:
+            metrics.inc("speculative_fetch_total", outcome="miss")
+            speculative.cancel()
+            logger.info("Speculation missed: guessed %s, planner chose %s — prefetch cancelled", guess, tickers)
+        hits = metrics.counter_value("speculative_fetch_total", outcome="hit")
+        misses = metrics.counter_value("speculative_fetch_total", outcome="miss")
+        logger.info("Speculation hit rate: %.0f%% (%d/%d)", 100 * hits / (hits + misses), hits, hits + misses)
+
+    logger.info("=== PLANNER NODE END ===")
+    return update
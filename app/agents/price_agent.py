@@ -0,0 +1,51 @@
+import logging
+from typing import Dict, List, Optional
+
+from app.schema import AgentState
+from app.agents.stock_info_agent import run_blocking
+from app.config import PRICES_ENABLED, PRICES_BENCHMARK
+from app.deadline import DeadlineExceeded
+from app.events import emit_status
+from app import prices, cassette
+
+logger = logging.getLogger(__name__)
+
+
+async def load_technicals(tickers: List[str]) -> Dict[str, Dict[str, Optional[float]]]:
+    """Technical indicators of ``tickers`` and the benchmark (``app.prices``).
+
+    Price action is supplementary: without it (stage disabled, cassettes on,
+    Yahoo unavailable) the analysis goes ahead on the fundamentals alone, so
+    failures other than the run's deadline yield an empty table.
+    """
+    if not PRICES_ENABLED or cassette.enabled():
+        return {}
+    try:
+        histories = await run_blocking(prices.history, [*tickers, PRICES_BENCHMARK])
+    except DeadlineExceeded:
+        raise
+    except Exception as exc:
+        logger.warning("Price history of %s unavailable: %s", tickers, exc)
+        return {}
+    return prices.indicators(histories, PRICES_BENCHMARK)
+
+
+async def price_history_node(state: AgentState) -> AgentState:
+    """LangGraph node: load daily price history and compute technical indicators.
+
+    Runs alongside stock_info -> financial_reporter; the personas and the
+    report get the indicators as a compact table.
+    """
+    logger.info("=== PRICE HISTORY NODE START ===")
+    ticker = state["ticker"]
+
+    await emit_status({
+        "type": "status",
+        "node": "price_history",
+        "label": "Loading price history",
+        "message": f"Computing technical indicators for {ticker} vs {PRICES_BENCHMARK}…",
+    })
+    technicals = await load_technicals([ticker])
+    logger.info("Technicals for %s: %s", ticker, technicals.get(ticker))
+    logger.info("=== PRICE HISTORY NODE END ===")
+    return {"technicals": technicals}
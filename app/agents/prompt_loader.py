@@ -0,0 +1,45 @@
+"""Cached loading of the YAML prompt templates in ``app/prompts``.
+
+Each file is read and parsed once per process (at warm-up, or on first use)
+instead of on every LLM call.
+"""
+
+import logging
+import threading
+from pathlib import Path
+from typing import Dict
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+PROMPTS_DIR = Path(__file__).resolve().parent.parent / "prompts"
+
+_lock = threading.Lock()
+_files: Dict[str, dict] = {}
+
+
+def _load_file(prompt_file: str) -> dict:
+    data = _files.get(prompt_file)
+    if data is None:
+        with _lock:
+            data = _files.get(prompt_file)
+            if data is None:
+                with open(PROMPTS_DIR / prompt_file, "r") as f:
+                    data = yaml.safe_load(f)
+                _files[prompt_file] = data
+    return data
+
+
+def get_template(prompt_file: str, prompt_key: str) -> str:
+    """Return the raw template ``prompt_key`` from ``prompt_file``."""
+    return _load_file(prompt_file)[prompt_key]
+
+
+def preload_all() -> int:
+    """Parse every prompt file up front; returns the number of files loaded."""
+    files = sorted(p.name for p in PROMPTS_DIR.glob("*.yaml"))
+    for name in files:
+        _load_file(name)
+    logger.info("Preloaded %d prompt templates", len(files))
+    return len(files)
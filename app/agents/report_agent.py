@@ -1,11 +1,12 @@
 import logging
-import json
+import asyncio
 
 from langchain_core.messages import SystemMessage, HumanMessage
 
 from app.schema import AgentState, PersonaAnalysis, CompanyProfile
 from app.agents.llm import create_llm
 from app.events import emit_status, strip_tool_calls, strip_citation_markers
+from app import run_store, blobs, depth, prices, archive
 
 logger = logging.getLogger(__name__)
 
@@ -28,22 +29,21 @@ Write in a professional, analytical tone. Be precise and reference specific data
 
 
 def _format_company_profile(company_profile: CompanyProfile) -> str:
-    """Format the company profile into a readable block for the LLM."""
-    return f"""**Business Model:** {company_profile.business_model}
-
-**Products & Customers:** {company_profile.what_they_sell_and_who_buys}
-
-**Revenue Model:** {company_profile.how_they_make_money}
-
-**Revenue Quality:** {company_profile.revenue_quality}
-
-**Cost Structure:** {company_profile.cost_structure}
-
-**Capital Intensity:** {company_profile.capital_intensity}
-
-**Growth Drivers:** {company_profile.growth_drivers}
-
-**Competitive Edge:** {company_profile.competitive_edge}"""
+    """Format the company profile into a readable block for the LLM.
+
+    Dimensions left empty (skipped by the depth tier) are omitted.
+    """
+    fields = [
+        ("Business Model", company_profile.business_model),
+        ("Products & Customers", company_profile.what_they_sell_and_who_buys),
+        ("Revenue Model", company_profile.how_they_make_money),
+        ("Revenue Quality", company_profile.revenue_quality),
+        ("Cost Structure", company_profile.cost_structure),
+        ("Capital Intensity", company_profile.capital_intensity),
+        ("Growth Drivers", company_profile.growth_drivers),
+        ("Competitive Edge", company_profile.competitive_edge),
+    ]
+    return "\n\n".join(f"**{label}:** {value}" for label, value in fields if value)
 
 
 def _format_persona_analyses(analyses: list[PersonaAnalysis]) -> str:
@@ -63,25 +63,38 @@ async def report_node(state: AgentState) -> AgentState:
     """LangGraph node: generate the final investment report."""
     logger.info("=== REPORT NODE START ===")
     ticker = state["ticker"]
-    financial_info = state["financial_info"]
+    financial_info = blobs.get(state["financial_info_ref"])
     company_profile = state["company_profile"]
     persona_analyses = state["persona_analyses"]
+    technicals = state.get("technicals", {})
 
-    logger.info("Ticker: %s, financial_info: %d chars, company_profile: %d chars, %d persona analyses",
-                 ticker, len(financial_info), len(json.dumps(company_profile.model_dump())), len(persona_analyses))
+    logger.info("Ticker: %s, financial_info: %d chars, %d persona analyses",
+                 ticker, len(financial_info), len(persona_analyses))
 
     for i, a in enumerate(persona_analyses):
         logger.info("  Analysis %d: %s — profit=%d chars, risk=%d chars, view=%d chars",
                      i + 1, a.persona_name, len(a.executive_summary.profit_outlook),
                      len(a.executive_summary.risk_assessment), len(a.executive_summary.overall_view))
 
+    # Incremental mode: nothing changed at all (technicals within day-to-day
+    # noise of the report's), so the previous report still stands
+    previous = run_store.previous_run(state)
+    if (previous and previous.get("report") and not state["changed_sections"]
+            and previous.get("company_profile") == company_profile.model_dump()
+            and prices.similar(previous.get("technicals", {}), technicals)
+            and previous.get("persona_analyses") == [a.model_dump() for a in persona_analyses]):
+        logger.info("No inputs changed since %s, reusing previous report", previous.get("saved_at"))
+        depth.finish(state)
+        logger.info("=== REPORT NODE END ===")
+        return {"report": previous["report"], **await archive.record(state, previous["report"])}
+
     formatted_company_profile = _format_company_profile(company_profile)
     formatted_analyses = _format_persona_analyses(persona_analyses)
     logger.debug("Formatted company profile: %d chars, formatted analyses: %d chars",
                  len(formatted_company_profile), len(formatted_analyses))
 
-    # Use higher timeout for report generation since prompt is larger (company profile + personas)
-    llm = create_llm(timeout=1800)
+    # The report route carries a higher timeout since the prompt is larger (company profile + personas)
+    llm = create_llm("report", max_tokens=depth.tier(state)["report_max_tokens"])
 
     user_content = f"""Generate a comprehensive investment report for {ticker}.
 
@@ -95,6 +108,10 @@ IMPORTANT: The entire report must be under 300 words.
 {formatted_analyses}
 --- END PERSONA ANALYSES ---
 
+--- PRICE TECHNICALS ---
+{prices.format_table(technicals)}
+--- END PRICE TECHNICALS ---
+
 --- ORIGINAL FINANCIAL INFORMATION ---
 {financial_info}
 --- END ORIGINAL FINANCIAL INFORMATION ---
@@ -122,6 +139,24 @@ Follow the required report structure exactly:
     report_content = strip_citation_markers(strip_tool_calls(result.content or ""))
     logger.info("Report generated: %d chars", len(report_content))
     logger.debug("Report preview: %s...", (report_content or "")[:500])
+
+    # Only full analyses are stored: a trimmed or reduced-depth run would
+    # otherwise be reused as if it covered everything
+    if not depth.is_complete(state):
+        logger.info("Not storing %s run for %s (reduced coverage)", depth.tier_name(state), ticker)
+    else:
+        try:
+            await asyncio.to_thread(run_store.save_run, ticker, {
+                "sections": state["financial_sections"],
+                "company_profile": company_profile.model_dump(),
+                "technicals": technicals,
+                "personas": [p.model_dump() for p in state.get("personas", [])],
+                "persona_analyses": [a.model_dump() for a in persona_analyses],
+                "report": report_content,
+            })
+        except OSError as exc:
+            logger.warning("Could not store run for %s: %s", ticker, exc)
+    depth.finish(state)
     logger.info("=== REPORT NODE END ===")
 
-    return {"report": report_content, "financial_info": financial_info, "company_profile": company_profile, "persona_analyses": persona_analyses}
+    return {"report": report_content, **await archive.record(state, report_content)}
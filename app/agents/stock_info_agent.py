@@ -1,23 +1,58 @@
 import os
+import re
 import json
 import time
 import random
 import logging
 import asyncio
-from typing import List
-
-import yfinance as yf
-from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
-from langchain_core.messages import SystemMessage, HumanMessage
+import threading
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
 
 from app.schema import AgentState
 from app.agents.llm import create_llm
-from app.config import API_MAX_RETRIES
+from app.config import (
+    API_MAX_RETRIES, DATA_POOL_WORKERS, SEARCH_DEDUP,
+    DATA_PROVIDERS_STATEMENTS, DATA_PROVIDERS_SEARCH, DATA_FIXTURES_DIR,
+)
 from app.events import emit_status
+from app import run_store, blobs, tracing, cassette, depth, fundamentals, search_planner, snippets, providers
+from app import deadline as run_deadline
+from app.breaker import CircuitOpenError, get_breaker
 
 logger = logging.getLogger(__name__)
 
-_ddg = DuckDuckGoSearchAPIWrapper()
+_ddg: Dict[str, object] = {}
+_ddg_lock = threading.Lock()
+
+
+def get_ddg(backend: str = "auto"):
+    """DuckDuckGo wrapper for a ddgs search backend, created on first use (imports langchain_community)."""
+    if backend not in _ddg:
+        with _ddg_lock:
+            if backend not in _ddg:
+                from langchain_community.utilities import DuckDuckGoSearchAPIWrapper
+
+                _ddg[backend] = DuckDuckGoSearchAPIWrapper(backend=backend)
+    return _ddg[backend]
+
+# Bounded pool shared by every blocking data fetch in the process
+_data_pool = ThreadPoolExecutor(max_workers=DATA_POOL_WORKERS, thread_name_prefix="data")
+
+
+async def run_blocking(func, *args):
+    """Run a blocking data fetch on the shared data pool (context-preserving, like ``asyncio.to_thread``)."""
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    return await loop.run_in_executor(_data_pool, functools.partial(ctx.run, _tagged, func, *args))
+
+
+def _tagged(func, *args):
+    # Lets profilers attribute the worker thread to the run and node it works for
+    with tracing.tag_thread():
+        return func(*args)
 
 
 def _serialize_yf(data: dict) -> str:
@@ -38,57 +73,189 @@ _YF_INFO_KEYS = [
 ]
 
 
+# Section headings of the yfinance blocks in ``financial_info``
+YF_INFO = "yfinance Company Info"
+YF_INCOME = "yfinance Income Statement"
+YF_BALANCE = "yfinance Balance Sheet"
+YF_CASHFLOW = "yfinance Cash Flow"
+YF_QUARTERLY = "yfinance Quarterly Income Statement"
+
+# Circuit breakers of the data backends (see app.breaker)
+YFINANCE_BACKEND = "yfinance"
+DDG_BACKEND = "duckduckgo"
+
+
+# Statement blocks of ``financial_info``: heading -> yfinance Ticker attribute
+YF_STATEMENTS = {
+    YF_INCOME: "financials",
+    YF_BALANCE: "balance_sheet",
+    YF_CASHFLOW: "cashflow",
+    YF_QUARTERLY: "quarterly_income_stmt",
+}
+
+
+def _stored_yfinance(ticker: str) -> Optional[str]:
+    """yfinance blocks of ``ticker`` from the fundamentals store (None unless stored and fresh)."""
+    stored = fundamentals.get(ticker)
+    if stored is None:
+        return None
+    logger.info("Using stored fundamentals for %s", ticker)
+    return format_yfinance(stored)
+
+
+async def _load_yfinance(ticker: str) -> str:
+    """yfinance data for ``ticker``: from the fundamentals store while fresh, else from the statement providers."""
+    stored = await run_blocking(_stored_yfinance, ticker)
+    if stored is not None:
+        return stored
+    return await providers.race("statements", _STATEMENT_PROVIDERS, (ticker,), run_blocking)
+
+
+@cassette.boundary("yfinance")
 def _fetch_yfinance(ticker: str) -> str:
     """Fetch structured financial data from yfinance."""
+    return format_yfinance(fetch_yfinance_data(ticker))
+
+
+def fetch_yfinance_data(ticker: str) -> dict:
+    """Fetch the info fields and statements of ``ticker`` from yfinance.
+
+    Raises ``CircuitOpenError`` without calling Yahoo while its breaker is
+    open, and ``DeadlineExceeded`` once the run is out of time.
+    """
+    run_deadline.check("yfinance")
+    breaker = get_breaker(YFINANCE_BACKEND)
+    probe = breaker.before_call()
+    try:
+        data = _fetch_yfinance_unguarded(ticker)
+    except Exception as exc:
+        breaker.record(False, probe, exc)
+        raise
+    breaker.record(True, probe)
+    return data
+
+
+def _fetch_yfinance_unguarded(ticker: str) -> dict:
+    import yfinance as yf  # heavy (pandas); imported on first fetch
+
     logger.info("Fetching yfinance data for %s", ticker)
     t = yf.Ticker(ticker)
 
     info = t.info or {}
-    filtered_info = {k: v for k, v in info.items() if k in _YF_INFO_KEYS}
-
-    financials = t.financials.to_dict() if t.financials is not None else {}
-    balance_sheet = t.balance_sheet.to_dict() if t.balance_sheet is not None else {}
-    cashflow = t.cashflow.to_dict() if t.cashflow is not None else {}
-    quarterly_income = t.quarterly_income_stmt.to_dict() if t.quarterly_income_stmt is not None else {}
-
-    return (
-        f"### yfinance Company Info\n{json.dumps(filtered_info, indent=2, default=str)}\n\n"
-        f"### yfinance Income Statement\n{_serialize_yf(financials)}\n\n"
-        f"### yfinance Balance Sheet\n{_serialize_yf(balance_sheet)}\n\n"
-        f"### yfinance Cash Flow\n{_serialize_yf(cashflow)}\n\n"
-        f"### yfinance Quarterly Income Statement\n{_serialize_yf(quarterly_income)}"
-    )
+    data = {YF_INFO: {k: v for k, v in info.items() if k in _YF_INFO_KEYS}}
+    for heading, attr in YF_STATEMENTS.items():
+        frame = getattr(t, attr)
+        data[heading] = frame.to_dict() if frame is not None else {}
+    return data
+
 
+def format_yfinance(data: dict) -> str:
+    """The yfinance blocks of ``financial_info`` for ``{heading: data}``."""
+    blocks = [f"### {YF_INFO}\n{json.dumps(data[YF_INFO], indent=2, default=str)}"]
+    blocks += [f"### {heading}\n{_serialize_yf(data[heading])}" for heading in YF_STATEMENTS]
+    return "\n\n".join(blocks)
 
-def _search_ddg(query: str, max_results: int = 5) -> str:
-    """Run a DuckDuckGo search with retry logic, returning formatted text."""
-    logger.info(">>> DDG SEARCH: query=%r", query)
+
+def _search_recordable(text: str) -> bool:
+    """Whether a search result may go into a cassette (not a failure placeholder)."""
+    return not text.startswith(("Search failed", "Search unavailable"))
+
+
+@cassette.boundary("duckduckgo", record_if=_search_recordable)
+def _search_ddg(query: str, max_results: int = 5, backend: str = "auto") -> str:
+    """Run a DuckDuckGo search with retry logic, returning formatted text.
+
+    ``backend`` is the ddgs search engine ("auto" being DuckDuckGo's own
+    choice); each engine has its own circuit breaker. Degrades to a "Search
+    unavailable" placeholder instead of retrying while the breaker is open,
+    and gives up without retrying when a retry would not finish before the
+    run's deadline. Raises ``DeadlineExceeded`` once the deadline has passed,
+    so no other provider is tried either.
+    """
+    logger.info(">>> DDG SEARCH: query=%r backend=%s", query, backend)
+    breaker = get_breaker(DDG_BACKEND if backend == "auto" else f"ddgs-{backend}")
     for attempt in range(API_MAX_RETRIES):
+        run_deadline.check("duckduckgo")
         try:
-            results = _ddg.results(query, max_results=max_results)
-            parts = []
-            for r in results:
-                title = r.get("title", "")
-                link = r.get("link", "")
-                snippet = r.get("snippet", "")
-                parts.append(f"**{title}**\n{link}\n{snippet}")
-            output = "\n\n---\n\n".join(parts) if parts else "No results found."
-            logger.info(">>> DDG RESULT: %d results, %d chars", len(parts), len(output))
-            return output
+            probe = breaker.before_call()
+        except CircuitOpenError as exc:
+            logger.warning("DDG search skipped: %s", exc)
+            return f"Search unavailable: {exc}"
+        try:
+            results = get_ddg(backend).results(query, max_results=max_results)
         except Exception as exc:
+            breaker.record(False, probe, exc)
             if attempt >= API_MAX_RETRIES - 1:
                 logger.error("DDG search failed after %d attempts: %s", API_MAX_RETRIES, exc)
                 return f"Search failed: {exc}"
             delay = (2 ** attempt) + random.uniform(0, 1)
+            left = run_deadline.remaining()
+            if left is not None and delay >= left:
+                logger.error("DDG search failed, no time left to retry: %s", exc)
+                return f"Search failed: {exc}"
             logger.warning("DDG search error: %s — retrying in %.1fs (%d/%d)",
                            exc, delay, attempt + 1, API_MAX_RETRIES)
             time.sleep(delay)
+            continue
+        breaker.record(True, probe)
+        parts = []
+        for r in results:
+            title = r.get("title", "")
+            link = r.get("link", "")
+            snippet = r.get("snippet", "")
+            parts.append(f"**{title}**\n{link}\n{snippet}")
+        output = "\n\n---\n\n".join(parts) if parts else "No results found."
+        logger.info(">>> DDG RESULT: %d results, %d chars", len(parts), len(output))
+        return output
+
+
+def fixture_name(query: str) -> str:
+    """File name of a search's fixture: the query in lowercase, non-alphanumerics as dashes."""
+    return re.sub(r"[^a-z0-9]+", "-", query.lower()).strip("-") + ".txt"
+
+
+def _read_fixture(*parts: str) -> str:
+    with open(os.path.join(DATA_FIXTURES_DIR, *parts), encoding="utf-8") as f:
+        return f.read()
+
+
+def _fixture_statements(ticker: str) -> str:
+    """yfinance blocks from ``DATA_FIXTURES_DIR/statements/<TICKER>.json`` ({heading: data})."""
+    return format_yfinance(json.loads(_read_fixture("statements", f"{ticker.upper()}.json")))
+
+
+def _fixture_search(query: str, max_results: int = 5) -> str:
+    """Search results (``_search_ddg`` format) from ``DATA_FIXTURES_DIR/search/<fixture_name>``."""
+    return _read_fixture("search", fixture_name(query))
+
+
+def _has_results(text: str) -> bool:
+    return bool(snippets.parse_results(text))
+
+
+# Data providers per kind (app.providers); DATA_PROVIDERS_* pick and order them
+providers.register("statements", "yfinance", _fetch_yfinance)
+providers.register("statements", "fixtures", _fixture_statements)
+providers.register("search", "duckduckgo", _search_ddg)
+providers.register("search", "fixtures", _fixture_search)
+for _name in DATA_PROVIDERS_SEARCH:
+    if _name.startswith("ddgs:"):
+        providers.register("search", _name, functools.partial(_search_ddg, backend=_name[len("ddgs:"):]))
+
+_STATEMENT_PROVIDERS = providers.chain("statements", DATA_PROVIDERS_STATEMENTS)
+_SEARCH_PROVIDERS = providers.chain("search", DATA_PROVIDERS_SEARCH)
 
 
 async def _search_ddg_async(query: str, max_results: int = 5) -> tuple[str, str]:
-    """Run a DuckDuckGo search asynchronously by wrapping the sync function."""
-    # Run the blocking DDG search in a thread pool
-    result = await asyncio.to_thread(_search_ddg, query, max_results)
+    """Run a search on the search providers, hedged (see ``app.providers``)."""
+    try:
+        result = await providers.race(
+            "search", _SEARCH_PROVIDERS, (query, max_results), run_blocking, good=_has_results,
+        )
+    except run_deadline.DeadlineExceeded:
+        # The analysis goes on without this search
+        logger.warning("DDG search skipped: run is out of time")
+        result = "Search skipped: run is out of time"
     return query, result
 
 
@@ -109,55 +276,109 @@ SEARCH_QUERIES = [
 ]
 
 
-async def stock_info_node(state: AgentState) -> AgentState:
-    """LangGraph node: gather financial info via yfinance + DuckDuckGo, then
-    pass the combined data downstream for LLM synthesis.
+# Searches for facts the yfinance blocks already hold: template -> blocks
+# that all have to carry data for the search to be skipped
+STRUCTURED_COVERAGE = {
+    SEARCH_QUERIES[4]: (YF_INCOME, YF_BALANCE, YF_CASHFLOW),
+    SEARCH_QUERIES[9]: (YF_INFO, YF_BALANCE),
+    SEARCH_QUERIES[10]: (YF_INCOME, YF_QUARTERLY),
+}
+
+
+def tier_templates(tier: dict) -> List[str]:
+    """The ``SEARCH_QUERIES`` templates a depth tier runs."""
+    indices = tier["searches"] if tier["searches"] is not None else range(len(SEARCH_QUERIES))
+    return [SEARCH_QUERIES[i] for i in indices]
+
+
+def tier_queries(tier: dict, ticker: str) -> List[str]:
+    """The searches a depth tier runs for ``ticker``."""
+    return [template.format(ticker=ticker) for template in tier_templates(tier)]
+
+
+def _covered_searches(yf_data: str) -> Dict[str, str]:
+    """Templates of ``STRUCTURED_COVERAGE`` whose yfinance blocks all carry data."""
+    present = {name for name, body in run_store.split_sections(yf_data).items() if body not in ("", "{}")}
+    return {
+        template: ", ".join(blocks)
+        for template, blocks in STRUCTURED_COVERAGE.items()
+        if present.issuperset(blocks)
+    }
+
+
+async def gather_financial_info(
+    ticker: str,
+    announce: bool = True,
+    tier: Optional[dict] = None,
+    deadline: Optional[float] = None,
+) -> str:
+    """Fetch yfinance data and run the DuckDuckGo searches for ``ticker``.
 
     1. Fetch structured data from yfinance (income statement, balance sheet, etc.)
-    2. Run predefined DuckDuckGo searches for qualitative context (in parallel)
-    3. Combine both into ``financial_info``
+    2. Run the depth tier's DuckDuckGo searches for qualitative context (in
+       parallel), less those the search plan skips (``app.search_planner``)
+    3. Drop results repeated across searches (``app.snippets``) and combine
+       both into one ``financial_info`` string; a skipped search's section
+       only states why it was skipped
+
+    Args:
+        ticker: Ticker symbol to gather data for
+        announce: Emit SSE status events (off for speculative prefetches)
+        tier: Depth tier settings (default: the DEFAULT_DEPTH tier)
+        deadline: Searches still running at this time are dropped (yfinance is always awaited)
     """
-    logger.info("=== STOCK INFO NODE START ===")
-    ticker = state["ticker"]
-    logger.info("Ticker: %s", ticker)
+    tier = tier or depth.tier({})
+    templates = tier_templates(tier)
+
+    async def status(event: dict) -> None:
+        if announce:
+            await emit_status(event)
 
     # Step 1: yfinance structured data
-    await emit_status({
+    await status({
         "type": "status",
         "node": "stock_info",
         "label": "Fetching yfinance data",
         "message": f"Loading financial statements for {ticker}",
     })
-    yf_data = _fetch_yfinance(ticker)
+    yf_data = await _load_yfinance(ticker)
 
     # Step 2: DuckDuckGo searches for qualitative context (in parallel)
-    await emit_status({
+    skipped = search_planner.plan(templates, _covered_searches(yf_data))
+    planned = [t for t in templates if t not in skipped]
+    await status({
         "type": "status",
         "node": "stock_info",
-        "label": f"Searching ({len(SEARCH_QUERIES)} queries)",
-        "message": f"Running {len(SEARCH_QUERIES)} parallel web searches…",
+        "label": f"Searching ({len(planned)} queries)",
+        "message": f"Running {len(planned)} parallel web searches"
+                   + (f" ({len(skipped)} skipped as redundant)…" if skipped else "…"),
     })
 
-    # Create all search tasks
-    search_tasks = []
-    for idx, query_template in enumerate(SEARCH_QUERIES, 1):
-        query = query_template.format(ticker=ticker)
-        task = _search_ddg_async(query)
-        search_tasks.append((idx, task))
-
-    # Run all searches in parallel
-    results = await asyncio.gather(*[task for _, task in search_tasks])
+    # Run all searches in parallel, up to the deadline
+    results = await depth.gather_optional(
+        [_search_ddg_async(t.format(ticker=ticker), tier["search_results"]) for t in planned], deadline,
+    )
+    texts = {t: result[1] for t, result in zip(planned, results) if result is not None}
+    await asyncio.to_thread(search_planner.record, list(texts.items()))
+    if SEARCH_DEDUP:
+        texts = snippets.dedupe(texts)
 
     # Format results
     all_search_results = []
-    for (idx, _), (query, result) in zip(search_tasks, results):
-        await emit_status({
+    for idx, template in enumerate(templates, 1):
+        query = template.format(ticker=ticker)
+        if template in skipped:
+            all_search_results.append(f"### Search: {query}\nSkipped: {skipped[template]}")
+            continue
+        if template not in texts:
+            continue
+        await status({
             "type": "status",
             "node": "stock_info",
-            "label": f"Search complete ({idx}/{len(SEARCH_QUERIES)})",
+            "label": f"Search complete ({idx}/{len(templates)})",
             "message": query[:80],
         })
-        all_search_results.append(f"### Search: {query}\n{result}")
+        all_search_results.append(f"### Search: {query}\n{texts[template]}")
 
     ddg_data = "\n\n".join(all_search_results)
 
@@ -165,7 +386,61 @@ async def stock_info_node(state: AgentState) -> AgentState:
         f"## Part A: yfinance Structured Data\n{yf_data}\n\n"
         f"## Part B: DuckDuckGo Search Results\n{ddg_data}"
     )
-    logger.info("Gathered data: %d chars (yfinance + %d DDG queries)",
-                len(combined_data), len(SEARCH_QUERIES))
+    logger.info("Gathered data: %d chars (yfinance + %d/%d DDG queries, %d skipped)",
+                len(combined_data), len(texts), len(templates), len(skipped))
+    return combined_data
+
+
+async def stock_info_node(state: AgentState) -> AgentState:
+    """LangGraph node: gather financial info via yfinance + DuckDuckGo, then
+    pass the combined data downstream for LLM synthesis.
+
+    If the planner already prefetched ``financial_info`` speculatively for
+    the same ticker, that data is used as-is. The text is kept in the blob
+    store; the state only carries its handle and section fingerprints.
+    """
+    logger.info("=== STOCK INFO NODE START ===")
+    ticker = state["ticker"]
+    logger.info("Ticker: %s", ticker)
+
+    ref = state.get("financial_info_ref")
+    if ref:
+        logger.info("Using speculatively prefetched data: blob %s", ref)
+        await emit_status({
+            "type": "status",
+            "node": "stock_info",
+            "label": "Data already prefetched",
+            "message": f"Financial data for {ticker} was fetched while planning",
+        })
+        combined_data = blobs.get(ref)
+    else:
+        combined_data = await gather_financial_info(
+            ticker, tier=depth.tier(state), deadline=depth.deadline(state, "data"),
+        )
+        ref = blobs.put(combined_data)
+
+    fingerprints = run_store.section_fingerprints(combined_data)
+    update = {"ticker": ticker, "financial_info_ref": ref, "financial_sections": fingerprints}
+
+    dropped = [q for q in tier_queries(depth.tier(state), ticker) if f"Search: {q}" not in fingerprints]
+    if dropped:
+        update["trimmed"] = depth.record_trim(state, "search", dropped)
+
+    # Incremental mode: diff against the last stored run section by section
+    if state.get("incremental"):
+        previous = await asyncio.to_thread(run_store.load_run, ticker)
+        if previous is None:
+            logger.info("Incremental mode: no stored run for %s, running full analysis", ticker)
+        else:
+            changed = run_store.diff_sections(previous.get("sections", {}), fingerprints)
+            logger.info("Incremental mode: %d changed sections since %s: %s",
+                        len(changed), previous.get("saved_at"), changed)
+            await emit_status({
+                "type": "status",
+                "node": "stock_info",
+                "label": "Compared with previous run",
+                "message": f"{len(changed)} data sections changed since the last run",
+            })
+            update["changed_sections"] = changed
 
-    return {**state, "ticker": ticker, "financial_info": combined_data}
+    return update
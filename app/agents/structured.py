@@ -0,0 +1,348 @@
+"""Structured (Pydantic) output with local repair before re-generation.
+
+``structured_output`` is what ``GuardedChatOpenAI.with_structured_output``
+returns. The request still carries the schema as a strict ``json_schema``
+response format, so backends with guided decoding produce valid JSON
+directly; if a backend rejects that, the model falls back to ``json_object``
+mode and then to a plain schema instruction (remembered per model). The reply
+is parsed here rather than by the OpenAI client so a near miss can be fixed
+locally:
+
+- **JSON repair** — markdown fences and surrounding prose are dropped,
+  trailing commas removed and truncated JSON (e.g. cut off at ``max_tokens``)
+  closed at the last complete value.
+- **Coercion** — ``Literal`` values are matched ignoring case, spaces and
+  punctuation ("Short term" → "short-term"), a single value is wrapped for a
+  list field and unknown values are dropped from lists.
+
+Only when the repaired reply still fails validation is the model asked again
+(at most ``STRUCTURED_OUTPUT_RETRIES`` times), with the validation error
+appended. Repairs, retries and failures are counted per route and schema.
+"""
+
+import re
+import json
+import logging
+import threading
+import typing
+from typing import Any, List, Optional, Tuple, Type
+
+import openai
+from pydantic import BaseModel, ValidationError
+from openai.lib._parsing._completions import type_to_response_format_param
+from langchain_core.messages import BaseMessage, HumanMessage, SystemMessage
+from langchain_core.runnables import Runnable, RunnableConfig, RunnableLambda
+
+from app.config import STRUCTURED_OUTPUT_RETRIES
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+# How the schema is passed to the backend, in order of preference
+JSON_SCHEMA = "json_schema"
+JSON_OBJECT = "json_object"
+PROMPT = "prompt"
+_MODES = (JSON_SCHEMA, JSON_OBJECT, PROMPT)
+
+# Models whose backend rejected a mode -> first mode still to try
+_mode_index: dict = {}
+_mode_lock = threading.Lock()
+
+_FENCE_RE = re.compile(r"^```[a-zA-Z]*\s*\n?(.*?)\n?```", re.DOTALL)
+
+
+class StructuredOutputError(ValueError):
+    """The reply could not be parsed into the schema, even after repair."""
+
+    def __init__(self, message: str, raw: str) -> None:
+        super().__init__(message)
+        self.raw = raw
+
+
+# ── JSON repair ──────────────────────────────────────────────────────────────
+
+def _strip_trailing_commas(text: str) -> str:
+    out: List[str] = []
+    in_str = escaped = False
+    for i, ch in enumerate(text):
+        if in_str:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_str = False
+        elif ch == '"':
+            in_str = True
+        elif ch == ",":
+            rest = text[i + 1:].lstrip()
+            if rest[:1] in ("}", "]"):
+                continue
+        out.append(ch)
+    return "".join(out)
+
+
+def repair_json(text: str) -> str:
+    """Best-effort fix of a model's JSON reply; returns the text to parse.
+
+    Raises ``ValueError`` if no JSON object or array can be recovered.
+    """
+    text = text.strip()
+    fenced = _FENCE_RE.match(text)
+    if fenced:
+        text = fenced.group(1).strip()
+    starts = [i for i in (text.find("{"), text.find("[")) if i >= 0]
+    if not starts:
+        raise ValueError("no JSON object in reply")
+    text = text[min(starts):]
+
+    # Scan once, remembering where the text could be cut and closed again:
+    # after an opening bracket, before a comma, and after a complete value
+    closers: List[str] = []
+    cuts: List[Tuple[int, str]] = []
+    in_str = escaped = False
+    for i, ch in enumerate(text):
+        if in_str:
+            if escaped:
+                escaped = False
+            elif ch == "\\":
+                escaped = True
+            elif ch == '"':
+                in_str = False
+            continue
+        if ch == '"':
+            in_str = True
+        elif ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+            cuts.append((i + 1, "".join(reversed(closers))))
+        elif ch in "}]":
+            if closers:
+                closers.pop()
+            if not closers:
+                # Complete top-level value; anything after it is prose
+                return _strip_trailing_commas(text[:i + 1])
+            cuts.append((i + 1, "".join(reversed(closers))))
+        elif ch == ",":
+            cuts.append((i, "".join(reversed(closers))))
+
+    # Truncated: first try closing the value in progress, then back off to
+    # the last point where everything before it was complete
+    tail = text[:-1] if escaped else text
+    candidates = [tail + ('"' if in_str else "") + "".join(reversed(closers))]
+    candidates += [text[:pos] + suffix for pos, suffix in reversed(cuts)]
+    for candidate in candidates:
+        candidate = _strip_trailing_commas(candidate.rstrip().rstrip(":"))
+        try:
+            json.loads(candidate)
+        except ValueError:
+            continue
+        return candidate
+    raise ValueError("could not close truncated JSON")
+
+
+# ── Coercion against the schema ──────────────────────────────────────────────
+
+def _norm(value: str) -> str:
+    return re.sub(r"[^a-z0-9]", "", value.lower())
+
+
+def _unwrap_optional(annotation: Any) -> Any:
+    if typing.get_origin(annotation) is typing.Union:
+        args = [a for a in typing.get_args(annotation) if a is not type(None)]
+        if len(args) == 1:
+            return args[0]
+    return annotation
+
+
+def _coerce_value(value: Any, annotation: Any, fixes: List[str]) -> Any:
+    annotation = _unwrap_optional(annotation)
+    origin = typing.get_origin(annotation)
+    if origin is typing.Literal:
+        allowed = typing.get_args(annotation)
+        if value in allowed or not isinstance(value, str):
+            return value
+        for option in allowed:
+            if isinstance(option, str) and _norm(option) == _norm(value):
+                fixes.append("enum")
+                return option
+        return value
+    if origin in (list, List):
+        (item_type,) = typing.get_args(annotation) or (Any,)
+        if not isinstance(value, list):
+            fixes.append("list")
+            value = [value]
+        items = [_coerce_value(v, item_type, fixes) for v in value]
+        if typing.get_origin(_unwrap_optional(item_type)) is typing.Literal:
+            allowed = typing.get_args(_unwrap_optional(item_type))
+            kept = [v for v in items if v in allowed]
+            if kept and len(kept) < len(items):
+                fixes.append("enum")
+                items = kept
+        return items
+    if isinstance(annotation, type) and issubclass(annotation, BaseModel) and isinstance(value, dict):
+        return coerce(value, annotation, fixes)
+    return value
+
+
+def coerce(data: dict, schema: Type[BaseModel], fixes: Optional[List[str]] = None) -> dict:
+    """Normalise ``data`` towards ``schema``; appends the kinds of fixes made to ``fixes``."""
+    fixes = fixes if fixes is not None else []
+    out = dict(data)
+    for name, field in schema.model_fields.items():
+        key = field.alias or name
+        if key in out:
+            out[key] = _coerce_value(out[key], field.annotation, fixes)
+    return out
+
+
+def parse(text: str, schema: Type[BaseModel]) -> Tuple[BaseModel, List[str]]:
+    """Parse a reply into ``schema``, repairing it if needed.
+
+    Returns the model and the kinds of repairs made ("json", "enum", "list");
+    raises ``StructuredOutputError`` if the reply cannot be salvaged.
+    """
+    try:
+        return schema.model_validate_json(text), []
+    except ValidationError:
+        pass
+    fixes: List[str] = []
+    try:
+        repaired = repair_json(text)
+        if repaired != text.strip():
+            fixes.append("json")
+        data = json.loads(repaired)
+        if isinstance(data, dict):
+            data = coerce(data, schema, fixes)
+        return schema.model_validate(data), fixes
+    except ValueError as exc:  # includes pydantic's ValidationError
+        raise StructuredOutputError(str(exc)[:2000], text) from None
+
+
+# ── Runnable ─────────────────────────────────────────────────────────────────
+
+def _mode_for(model: str) -> str:
+    with _mode_lock:
+        return _MODES[_mode_index.get(model, 0)]
+
+
+def _downgrade(model: str, mode: str, exc: BaseException) -> bool:
+    """Stop using ``mode`` for ``model`` after the backend rejected it."""
+    index = _MODES.index(mode)
+    if index + 1 >= len(_MODES):
+        return False
+    with _mode_lock:
+        _mode_index[model] = max(_mode_index.get(model, 0), index + 1)
+    logger.warning(
+        "Backend rejected %s structured output for %s (%s) — falling back to %s",
+        mode, model, exc, _MODES[index + 1],
+    )
+    metrics.inc("structured_output_fallbacks_total", model=model, mode=_MODES[index + 1])
+    return True
+
+
+def _is_unsupported_format(exc: BaseException) -> bool:
+    return isinstance(exc, openai.BadRequestError) and "response_format" in str(exc)
+
+
+def _schema_instruction(schema: Type[BaseModel]) -> SystemMessage:
+    return SystemMessage(content=(
+        "Reply with a single JSON object, and nothing else, that conforms to this JSON schema:\n"
+        + json.dumps(schema.model_json_schema())
+    ))
+
+
+def _request(llm: Any, schema: Type[BaseModel], mode: str, messages: List[BaseMessage]) -> Tuple[Runnable, List[BaseMessage]]:
+    if mode == JSON_SCHEMA:
+        # Passed as a dict so the OpenAI client leaves the parsing to us
+        return llm.bind(response_format=type_to_response_format_param(schema)), messages
+    messages = [*messages, _schema_instruction(schema)]
+    if mode == JSON_OBJECT:
+        return llm.bind(response_format={"type": "json_object"}), messages
+    return llm, messages
+
+
+def _reply_text(message: BaseMessage) -> str:
+    refusal = message.additional_kwargs.get("refusal")
+    if refusal:
+        raise StructuredOutputError(f"model refused: {refusal}", "")
+    return message.content if isinstance(message.content, str) else message.text
+
+
+def _retry_messages(messages: List[BaseMessage], error: StructuredOutputError) -> List[BaseMessage]:
+    return [
+        *messages,
+        HumanMessage(content=(
+            "Your previous reply could not be parsed against the required schema:\n"
+            f"{error}\n\nReply again with the complete, valid JSON object only."
+        )),
+    ]
+
+
+def structured_output(llm: Any, schema: Type[BaseModel]) -> Runnable:
+    """Runnable calling ``llm`` (a ``GuardedChatOpenAI``) and returning a ``schema`` instance."""
+    labels = {"route": llm.route, "schema": schema.__name__}
+
+    def _prepare(value: Any) -> List[BaseMessage]:
+        return llm._convert_input(value).to_messages()
+
+    def _handle(reply: BaseMessage, attempt: int) -> Tuple[Optional[BaseModel], Optional[StructuredOutputError]]:
+        try:
+            result, fixes = parse(_reply_text(reply), schema)
+        except StructuredOutputError as exc:
+            metrics.inc("structured_output_invalid_total", **labels)
+            logger.warning(
+                "Invalid %s reply on route %s (attempt %d/%d): %s",
+                schema.__name__, llm.route, attempt + 1, STRUCTURED_OUTPUT_RETRIES + 1, str(exc)[:300],
+            )
+            return None, exc
+        for kind in sorted(set(fixes)):
+            metrics.inc("structured_output_repairs_total", kind=kind, **labels)
+        if fixes:
+            logger.info("Repaired %s reply on route %s locally (%s)", schema.__name__, llm.route, ", ".join(sorted(set(fixes))))
+        return result, None
+
+    def _failed(error: StructuredOutputError) -> StructuredOutputError:
+        metrics.inc("structured_output_failures_total", **labels)
+        return error
+
+    async def ainvoke(value: Any, config: RunnableConfig) -> BaseModel:
+        messages = _prepare(value)
+        for attempt in range(STRUCTURED_OUTPUT_RETRIES + 1):
+            while True:
+                mode = _mode_for(llm.model_name)
+                runnable, request = _request(llm, schema, mode, messages)
+                try:
+                    reply = await runnable.ainvoke(request, config)
+                    break
+                except openai.BadRequestError as exc:
+                    if not (_is_unsupported_format(exc) and _downgrade(llm.model_name, mode, exc)):
+                        raise
+            result, error = _handle(reply, attempt)
+            if result is not None:
+                return result
+            if attempt < STRUCTURED_OUTPUT_RETRIES:
+                metrics.inc("structured_output_retries_total", **labels)
+                messages = _retry_messages(messages, error)
+        raise _failed(error)
+
+    def invoke(value: Any, config: RunnableConfig) -> BaseModel:
+        messages = _prepare(value)
+        for attempt in range(STRUCTURED_OUTPUT_RETRIES + 1):
+            while True:
+                mode = _mode_for(llm.model_name)
+                runnable, request = _request(llm, schema, mode, messages)
+                try:
+                    reply = runnable.invoke(request, config)
+                    break
+                except openai.BadRequestError as exc:
+                    if not (_is_unsupported_format(exc) and _downgrade(llm.model_name, mode, exc)):
+                        raise
+            result, error = _handle(reply, attempt)
+            if result is not None:
+                return result
+            if attempt < STRUCTURED_OUTPUT_RETRIES:
+                metrics.inc("structured_output_retries_total", **labels)
+                messages = _retry_messages(messages, error)
+        raise _failed(error)
+
+    return RunnableLambda(invoke, afunc=ainvoke, name=f"structured_output[{schema.__name__}]")
@@ -1,48 +1,249 @@
 import os
+import gzip
 import json
+import math
 import asyncio
 import logging
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Union
 
-from fastapi import APIRouter, HTTPException
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import APIRouter, Header, HTTPException, Query, Request, Response
+from fastapi.responses import FileResponse, JSONResponse, PlainTextResponse, StreamingResponse
 
-from app.schema import DecisionRequest
-from app.agents.graph import decision_graph
-from app.config import RECURSION_LIMIT
+from app.schema import DecisionRequest, ScreenRequest
+from app.config import (
+    RECURSION_LIMIT, LLM_ROUTES, PROFILING_ENABLED, PROFILE_MAX_SECONDS, DEFAULT_DEPTH, REQUEST_DEADLINE,
+    SCREEN_ANALYZE_MAX, SCREEN_ANALYZE_CONCURRENCY, REPORT_ARCHIVE, ADMISSION_CONTROL,
+)
 from app.events import status_queue_var
+from app.breaker import CircuitOpenError
+from app import metrics, blobs, lifecycle, breaker, latency, profiler, tracing, deadline, archive, sse, admission, providers
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# How often a non-streaming run checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = 1.0
+
 NODE_LABELS = {
     "planner": "Understanding your request",
     "stock_info": "Gathering financial data",
     "financial_reporter": "Building company profile",
+    "price_history": "Loading price history",
     "generate_personas": "Creating analyst personas",
     "analysis": "Running multi-perspective analysis",
     "generate_report": "Writing final report",
+    "compare": "Profiling companies in parallel",
+    "generate_comparison_report": "Writing comparison report",
 }
 
 
+def _unavailable_response(exc: CircuitOpenError) -> JSONResponse:
+    return JSONResponse(
+        {"detail": str(exc), "backend": exc.backend},
+        status_code=503,
+        headers={"Retry-After": str(int(exc.retry_after + 0.5))},
+    )
+
+
+def _shed_load() -> Optional[JSONResponse]:
+    """Reject a new run up front while a backend every run needs is down.
+
+    Every run calls the planner model and yfinance; when either breaker is
+    open the request would only fail later, after holding resources.
+    """
+    from app.agents.stock_info_agent import YFINANCE_BACKEND
+
+    exc = breaker.unavailable(breaker.llm_backend(LLM_ROUTES["planner"]["model"]), YFINANCE_BACKEND)
+    if exc is None:
+        return None
+    metrics.inc("requests_shed_total", backend=exc.backend)
+    logger.warning("Shedding request: %s", exc)
+    return _unavailable_response(exc)
+
+
+def _reserve(http_request: Request, x_api_key: Optional[str], depth: str, runs: int = 1) -> admission.Ticket:
+    """Reserve the client's token budget for ``runs`` runs of ``depth`` (raises ``AdmissionDenied``)."""
+    host = http_request.client.host if http_request.client else None
+    return admission.reserve(admission.client_id(x_api_key, host), admission.estimate(depth, runs))
+
+
+def _budget_exhausted_response(exc: admission.AdmissionDenied) -> JSONResponse:
+    retry_after = max(1, math.ceil(exc.retry_after))
+    return JSONResponse(
+        {
+            "detail": str(exc),
+            "client": exc.client,
+            "estimated_tokens": exc.cost,
+            "queue_position": exc.position,
+            "retry_after": retry_after,
+        },
+        status_code=429,
+        headers={"Retry-After": str(retry_after)},
+    )
+
+
+def _graph_input(request: DecisionRequest) -> dict:
+    return {
+        "user_message": request.user_message,
+        "incremental": request.incremental,
+        "depth": request.depth or DEFAULT_DEPTH,
+    }
+
+
+def _new_deadline(request: DecisionRequest | ScreenRequest) -> deadline.Deadline:
+    return deadline.Deadline(min(request.deadline_seconds or REQUEST_DEADLINE, REQUEST_DEADLINE))
+
+
+def _graph_config(run_deadline: deadline.Deadline) -> dict:
+    return {"recursion_limit": RECURSION_LIMIT, "configurable": {deadline.CONFIG_KEY: run_deadline}}
+
+
+async def _supervised(aw: Awaitable, run_deadline: deadline.Deadline, http_request: Request) -> Any:
+    """Await ``aw``, cancelling it when the deadline passes or the client disconnects.
+
+    Raises ``DeadlineExceeded`` in both cases.
+    """
+    task = asyncio.ensure_future(aw)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=min(DISCONNECT_POLL_SECONDS, run_deadline.remaining()))
+            if done:
+                return task.result()
+            if run_deadline.expired():
+                run_deadline.cancel("deadline")
+                break
+            if await http_request.is_disconnected():
+                run_deadline.cancel("disconnect")
+                break
+    finally:
+        if not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+    metrics.inc("deadline_exceeded_total", where="api")
+    raise deadline.DeadlineExceeded(run_deadline, "api")
+
+
+def _wants_profile(profile: bool, x_profile: Optional[str]) -> bool:
+    """Profiling is requested with ``?profile=1`` or an ``X-Profile: 1`` header."""
+    header = (x_profile or "").strip().lower() in ("1", "true", "yes", "on")
+    return PROFILING_ENABLED and (profile or header)
+
+
+@asynccontextmanager
+async def _run_scope(run_id: str, profile: bool, run_deadline: deadline.Deadline) -> AsyncIterator[None]:
+    """Tag everything the run does with its ID and deadline and, if requested, profile it."""
+    token = tracing.current_run.set(run_id)
+    if profile:
+        profiler.start_run(run_id)
+    try:
+        with deadline.scope(run_deadline):
+            yield
+    finally:
+        if profile:
+            await asyncio.to_thread(profiler.stop_run, run_id)
+        tracing.current_run.reset(token)
+
+
 @router.post("/api/analyze")
-async def analyze(request: DecisionRequest):
-    """Run the full stock analysis LangGraph pipeline and return the final report."""
+async def analyze(
+    request: DecisionRequest,
+    response: Response,
+    http_request: Request,
+    profile: bool = Query(False, description="Record a sampling profile of this run"),
+    x_profile: Optional[str] = Header(None),
+    x_api_key: Optional[str] = Header(None),
+):
+    """Run the full stock analysis LangGraph pipeline and return the final report.
+
+    The raw ``financial_info`` is not inlined: the response carries a short
+    preview plus a URL to fetch the full text from the blob store. Answers
+    503 with ``Retry-After`` while a required backend's circuit is open, 429
+    with ``Retry-After`` when the client's token budget cannot cover the run
+    soon enough (``app.admission``), and 504 when the run's deadline passes
+    first; a run whose client disconnects is cancelled. The run ID comes back
+    in ``X-Run-ID``; profiled runs also link their profile
+    (``/api/profiles/{run_id}``).
+    """
+    from app.agents.graph import get_decision_graph
+
+    shed = _shed_load()
+    if shed is not None:
+        return shed
+    depth_name = request.depth or DEFAULT_DEPTH
     try:
-        result = await decision_graph.ainvoke(
-            {"user_message": request.user_message},
-            config={"recursion_limit": RECURSION_LIMIT},
-        )
-    except Exception as e:
-        logger.exception("Pipeline failed for message: %s", request.user_message)
-        raise HTTPException(status_code=500, detail=f"Analysis pipeline failed: {e}")
+        ticket = _reserve(http_request, x_api_key, depth_name)
+    except admission.AdmissionDenied as e:
+        return _budget_exhausted_response(e)
+
+    run_id = tracing.new_run_id()
+    profiled = _wants_profile(profile, x_profile)
+    response.headers["X-Run-ID"] = run_id
+    if not ticket.admitted:
+        response.headers["X-Queue-Position"] = str(ticket.position)
+        response.headers["X-Queue-Wait-Seconds"] = f"{ticket.eta:.0f}"
+    run_deadline = _new_deadline(request)
 
+    async with _run_scope(run_id, profiled, run_deadline):
+        with blobs.track_run(), ticket.track(depth_name):
+            try:
+                await _supervised(ticket.wait(), run_deadline, http_request)
+                result = await _supervised(
+                    get_decision_graph().ainvoke(_graph_input(request), config=_graph_config(run_deadline)),
+                    run_deadline,
+                    http_request,
+                )
+            except CircuitOpenError as e:
+                logger.warning("Pipeline aborted, backend unavailable: %s", e)
+                return _unavailable_response(e)
+            except deadline.DeadlineExceeded as e:
+                logger.warning("Pipeline cancelled: %s", e)
+                raise HTTPException(status_code=504, detail=f"Analysis did not finish in time: {e}")
+            except Exception as e:
+                logger.exception("Pipeline failed for message: %s", request.user_message)
+                raise HTTPException(status_code=500, detail=f"Analysis pipeline failed: {e}")
+
+            body = {
+                "run_id": run_id,
+                "ticker": result.get("ticker", ""),
+                "tickers": result.get("tickers", []),
+                "report": result.get("report", ""),
+                "report_id": result.get("report_id"),
+                "depth": result.get("depth", depth_name),
+                "trimmed": result.get("trimmed", []),
+                **_financial_info_summary(result.get("financial_info_ref")),
+                "persona_analyses": result.get("persona_analyses", []),
+                "company_profile": result.get("company_profile", ""),
+                "technicals": result.get("technicals", {}),
+            }
+            if result.get("comparison_profiles"):
+                body.update(_comparison_summary(result["comparison_profiles"], result.get("comparison_info_refs", {})))
+    if profiled:
+        body["profile_url"] = f"/api/profiles/{run_id}"
+    return body
+
+
+def _financial_info_summary(ref: Optional[str]) -> dict:
+    """Preview (the yfinance company info block) and lazy-fetch link for a financial_info blob."""
+    from app.agents.stock_info_agent import YF_INFO
+
+    if not ref:
+        return {}
     return {
-        "ticker": result.get("ticker", ""),
-        "report": result.get("report", ""),
-        "financial_info": result.get("financial_info", ""),
-        "persona_analyses": result.get("persona_analyses", []),
-        "company_profile": result.get("company_profile", ""),
+        "financial_info_ref": ref,
+        "financial_info_url": f"/api/blobs/{ref}",
+        "financial_info_chars": blobs.length(ref),
+        "financial_info_preview": f"### {YF_INFO}\n{blobs.get_section(ref, YF_INFO)}",
+    }
+
+
+def _comparison_summary(profiles: dict, refs: dict) -> dict:
+    """Per-ticker company profiles and financial_info blob links for a comparison run."""
+    return {
+        "company_profiles": {t: cp.model_dump() for t, cp in profiles.items()},
+        "financial_info": {t: _financial_info_summary(ref) for t, ref in refs.items()},
     }
 
 
@@ -57,16 +258,22 @@ def _serialize_update(node_name: str, update: dict) -> dict:
     if node_name == "planner":
         event["message"] = f"Identified ticker: {update.get('ticker', 'N/A')}"
         event["ticker"] = update.get("ticker", "")
+        event["tickers"] = update.get("tickers", [])
         event["intent"] = update.get("intent", "")
     elif node_name == "stock_info":
-        fi = update.get("financial_info", "")
-        event["message"] = f"Collected {len(fi)} chars of financial data"
-        event["financial_info"] = fi
+        summary = _financial_info_summary(update.get("financial_info_ref"))
+        event["message"] = f"Collected {summary.get('financial_info_chars', 0)} chars of financial data"
+        event.update(summary)
     elif node_name == "financial_reporter":
         cp = update.get("company_profile")
         event["message"] = "Company profile generated"
         if cp is not None:
             event["company_profile"] = cp.model_dump() if hasattr(cp, "model_dump") else cp
+    elif node_name == "price_history":
+        technicals = update.get("technicals", {})
+        event["message"] = (f"Computed technical indicators for {', '.join(technicals)}" if technicals
+                            else "Price history unavailable")
+        event["technicals"] = technicals
     elif node_name == "generate_personas":
         personas = update.get("personas", [])
         event["message"] = f"Generated {len(personas)} analyst personas"
@@ -78,13 +285,61 @@ def _serialize_update(node_name: str, update: dict) -> dict:
     elif node_name == "generate_report":
         event["message"] = "Report generated successfully"
         event["report"] = update.get("report", "")
+        event["report_id"] = update.get("report_id")
+    elif node_name == "compare":
+        profiles = update.get("comparison_profiles", {})
+        event["message"] = f"Profiled {len(profiles)} companies: {', '.join(profiles)}"
+        event.update(_comparison_summary(profiles, update.get("comparison_info_refs", {})))
+        if update.get("technicals"):
+            event["technicals"] = update["technicals"]
+    elif node_name == "generate_comparison_report":
+        event["message"] = "Comparison report generated successfully"
+        event["report"] = update.get("report", "")
+        event["report_id"] = update.get("report_id")
 
+    if update.get("trimmed"):
+        # Optional work dropped to meet the depth tier's latency target (cumulative)
+        event["trimmed"] = update["trimmed"]
     return event
 
 
 @router.post("/api/analyze/stream")
-async def analyze_stream(request: DecisionRequest):
-    """SSE endpoint that streams node-completion AND per-persona status events."""
+async def analyze_stream(
+    request: DecisionRequest,
+    http_request: Request,
+    profile: bool = Query(False, description="Record a sampling profile of this run"),
+    compact: bool = Query(False, description="Leave out unchanged fields and send repeated values by reference"),
+    x_profile: Optional[str] = Header(None),
+    x_api_key: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None),
+):
+    """SSE endpoint that streams node-completion AND per-persona status events.
+
+    The ``start`` event carries the run ID; for profiled runs the
+    ``complete`` event links the profile. The run is cancelled, after an
+    ``error`` event, when its deadline passes or it stalls, and without one
+    when the client disconnects. A run that has to wait for the client's
+    token budget sends a ``queued`` event with its position and ETA first;
+    one that would wait too long is refused with 429. Events are encoded by
+    ``app.sse``: compact on request, and compressed when the client accepts
+    br or gzip.
+    """
+    from app.agents.graph import get_decision_graph
+
+    shed = _shed_load()
+    if shed is not None:
+        return shed
+    depth_name = request.depth or DEFAULT_DEPTH
+    try:
+        ticket = _reserve(http_request, x_api_key, depth_name)
+    except admission.AdmissionDenied as e:
+        return _budget_exhausted_response(e)
+    decision_graph = get_decision_graph()
+    run_id = tracing.new_run_id()
+    profiled = _wants_profile(profile, x_profile)
+    run_deadline = _new_deadline(request)
+    encoding = sse.negotiate(accept_encoding)
+    encoder = sse.StreamEncoder(compact=compact, encoding=encoding)
 
     async def event_generator():
         queue: asyncio.Queue = asyncio.Queue()
@@ -92,44 +347,270 @@ async def analyze_stream(request: DecisionRequest):
 
         async def run_graph():
             try:
-                async for chunk in decision_graph.astream(
-                    {"user_message": request.user_message},
-                    stream_mode="updates",
-                    config={"recursion_limit": RECURSION_LIMIT},
-                ):
-                    for node_name, update in chunk.items():
-                        payload = _serialize_update(node_name, update)
-                        await queue.put(payload)
-                await queue.put({"type": "complete"})
+                async with _run_scope(run_id, profiled, run_deadline):
+                    with blobs.track_run(), ticket.track(depth_name):
+                        if not ticket.admitted:
+                            await queue.put({
+                                "type": "queued",
+                                "message": f"Waiting for token budget: position {ticket.position}, "
+                                           f"~{ticket.eta:.0f}s",
+                                "position": ticket.position,
+                                "eta_seconds": round(ticket.eta, 1),
+                            })
+                            await ticket.wait()
+                        async for chunk in decision_graph.astream(
+                            _graph_input(request),
+                            stream_mode="updates",
+                            config=_graph_config(run_deadline),
+                        ):
+                            for node_name, update in chunk.items():
+                                payload = _serialize_update(node_name, update)
+                                await queue.put(payload)
+                complete = {"type": "complete"}
+                if profiled:
+                    complete["profile_url"] = f"/api/profiles/{run_id}"
+                await queue.put(complete)
+            except CircuitOpenError as e:
+                logger.warning("Streaming pipeline aborted, backend unavailable: %s", e)
+                await queue.put({
+                    "type": "error",
+                    "message": str(e),
+                    "backend": e.backend,
+                    "retry_after": round(e.retry_after),
+                })
+            except deadline.DeadlineExceeded as e:
+                logger.warning("Streaming pipeline cancelled: %s", e)
+                await queue.put({"type": "error", "message": f"Analysis did not finish in time: {e}"})
             except Exception as e:
                 logger.exception("Streaming pipeline failed")
                 await queue.put({"type": "error", "message": str(e)})
 
         task = asyncio.create_task(run_graph())
 
-        yield f"data: {json.dumps({'type': 'start', 'message': 'Starting analysis pipeline...'})}\n\n"
+        start = {'type': 'start', 'message': 'Starting analysis pipeline...', 'run_id': run_id,
+                 'depth': depth_name}
+        yield encoder.encode(start)
 
-        while True:
-            try:
-                event = await asyncio.wait_for(queue.get(), timeout=900)
-            except asyncio.TimeoutError:
-                yield f"data: {json.dumps({'type': 'error', 'message': 'Pipeline timeout (15 min)'})}\n\n"
-                break
+        # Left as is if the generator is closed early: the client went away
+        reason = "disconnect"
+        try:
+            while True:
+                # No event for longer than the slowest LLM call may currently take: a hang
+                idle_timeout = latency.stream_idle_timeout()
+                try:
+                    event = await asyncio.wait_for(
+                        queue.get(), timeout=min(idle_timeout, run_deadline.remaining()),
+                    )
+                except asyncio.TimeoutError:
+                    if run_deadline.expired():
+                        reason = "deadline"
+                        metrics.inc("deadline_exceeded_total", where="stream")
+                        message = f"Analysis did not finish in time: {run_deadline.describe()}"
+                    else:
+                        reason = "idle"
+                        metrics.inc("stream_idle_timeouts_total")
+                        message = f"Pipeline timeout (no progress for {idle_timeout:.0f}s)"
+                    yield encoder.encode({'type': 'error', 'message': message})
+                    break
 
-            yield f"data: {json.dumps(event)}\n\n"
+                yield encoder.encode(event)
 
-            if event.get("type") in ("complete", "error"):
-                break
+                if event.get("type") in ("complete", "error"):
+                    break
 
-        status_queue_var.reset(token)
-        if not task.done():
-            task.cancel()
+            yield encoder.close()
+            metrics.observe("request_response_bytes", encoder.sent_bytes)
+            status_queue_var.reset(token)
+        finally:
+            if not task.done():
+                # Expire the deadline too, so worker threads of the run stop retrying
+                run_deadline.cancel(reason)
+                task.cancel()
+
+    headers = {
+        "Cache-Control": "no-cache",
+        "Connection": "keep-alive",
+        "X-Accel-Buffering": "no",
+        "X-Run-ID": run_id,
+        "Vary": "Accept-Encoding",
+    }
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return StreamingResponse(event_generator(), media_type="text/event-stream", headers=headers)
+
+
+@router.post("/api/screen")
+async def screen(request: ScreenRequest, http_request: Request, x_api_key: Optional[str] = Header(None)):
+    """Screen the fundamentals store, ranking the tickers that pass the filter.
+
+    With ``"analyze": true`` the returned tickers (at most
+    ``SCREEN_ANALYZE_MAX``) are analysed right away, each in its own run, and
+    their reports come back under ``analyses``; the client's token budget is
+    charged for all of them. Answers 400 for an invalid expression, 429 when
+    the budget cannot cover the analyses and 504 when they miss the deadline.
+    """
+    from app import screening
+
+    try:
+        result = await asyncio.to_thread(
+            screening.screen, request.filter, request.rank_by, request.ascending, request.limit,
+        )
+    except screening.ScreenError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if not request.analyze:
+        return result
+
+    shed = _shed_load()
+    if shed is not None:
+        return shed
+    depth_name = request.depth or DEFAULT_DEPTH
+    tickers = screening.tickers(result)[:SCREEN_ANALYZE_MAX]
+    try:
+        ticket = _reserve(http_request, x_api_key, depth_name, runs=len(tickers))
+    except admission.AdmissionDenied as e:
+        return _budget_exhausted_response(e)
+    run_deadline = _new_deadline(request)
+    try:
+        with ticket.track(depth_name, runs=len(tickers)):
+            await _supervised(ticket.wait(), run_deadline, http_request)
+            result["analyses"] = await _supervised(
+                _analyze_batch(tickers, depth_name, run_deadline), run_deadline, http_request,
+            )
+    except deadline.DeadlineExceeded as e:
+        logger.warning("Screen analyses cancelled: %s", e)
+        raise HTTPException(status_code=504, detail=f"Analyses did not finish in time: {e}")
+    return result
+
+
+async def _analyze_batch(tickers: list, depth: str, run_deadline: deadline.Deadline) -> list:
+    """Analyse each ticker in its own run, ``SCREEN_ANALYZE_CONCURRENCY`` at a time."""
+    from app.agents.graph import get_decision_graph
+
+    semaphore = asyncio.Semaphore(SCREEN_ANALYZE_CONCURRENCY)
+
+    async def analyze_one(ticker: str) -> dict:
+        run_id = tracing.new_run_id()
+        async with semaphore, _run_scope(run_id, False, run_deadline):
+            with blobs.track_run():
+                try:
+                    result = await get_decision_graph().ainvoke(
+                        {"user_message": f"Analyze {ticker} stock", "tickers": [ticker],
+                         "incremental": False, "depth": depth},
+                        config=_graph_config(run_deadline),
+                    )
+                except Exception as e:
+                    logger.warning("Screened analysis of %s failed: %s", ticker, e)
+                    return {"ticker": ticker, "run_id": run_id, "error": str(e)}
+        return {
+            "ticker": ticker,
+            "run_id": run_id,
+            "report": result.get("report", ""),
+            "report_id": result.get("report_id"),
+            "trimmed": result.get("trimmed", []),
+        }
+
+    return await asyncio.gather(*[analyze_one(t) for t in tickers])
+
+
+def _accepts_gzip(request: Request) -> bool:
+    """Whether Accept-Encoding gives gzip (or, failing an explicit gzip entry, ``*``) a q-value above 0."""
+    qualities = {}
+    for coding in request.headers.get("accept-encoding", "").split(","):
+        name, *params = coding.split(";")
+        name = name.strip().lower()
+        if not name:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[name] = quality
+    return qualities.get("gzip", qualities.get("*", 0.0)) > 0
 
-    return StreamingResponse(
-        event_generator(),
-        media_type="text/event-stream",
-        headers={"Cache-Control": "no-cache", "Connection": "keep-alive", "X-Accel-Buffering": "no"},
+
+def _conditional_response(
+    request: Request,
+    data: Union[bytes, Callable[[], bytes]],
+    etag: str,
+    media_type: str = "application/json",
+    gzipped: bool = False,
+    cache_control: str = "no-cache",
+) -> Response:
+    """``data`` with an ETag; 304 when the client has it, gzipped when the client accepts it.
+
+    ``data`` may be a function producing it, only called when the client
+    does not have it yet. ``gzipped`` data is sent as stored to clients that
+    accept gzip. The ETag is weak, since the gzipped and plain bodies share it.
+    """
+    etag = f"W/{etag}"
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Vary": "Accept-Encoding"}
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        if "*" in tags or any(tag.removeprefix("W/") == etag[2:] for tag in tags):
+            metrics.inc("conditional_get_total", result="not_modified")
+            return Response(status_code=304, headers=headers)
+    metrics.inc("conditional_get_total", result="full")
+    if callable(data):
+        data = data()
+    if _accepts_gzip(request):
+        if not gzipped:
+            data = gzip.compress(data, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    elif gzipped:
+        data = gzip.decompress(data)
+    return Response(data, media_type=media_type, headers=headers)
+
+
+@router.get("/api/reports")
+async def list_reports(
+    request: Request,
+    ticker: Optional[str] = None,
+    depth: Optional[str] = None,
+    model: Optional[str] = None,
+    before: Optional[datetime] = Query(None, description="Only reports created before this time"),
+    limit: int = Query(20, ge=1, le=200),
+):
+    """Archived reports, newest first, optionally for one ticker / depth tier / report model."""
+    if not REPORT_ARCHIVE:
+        raise HTTPException(status_code=404, detail="Report archive is disabled")
+    if before is not None and before.tzinfo is None:
+        before = before.replace(tzinfo=timezone.utc)
+    reports = await asyncio.to_thread(
+        archive.list_reports, ticker, depth, model, before.timestamp() if before else None, limit,
     )
+    data = json.dumps({"reports": reports}).encode("utf-8")
+    return _conditional_response(request, data, archive.etag_of(data))
+
+
+@router.get("/api/reports/{report_id}")
+async def get_report(
+    request: Request,
+    report_id: str,
+    format: str = Query("json", pattern="^(json|markdown)$"),
+):
+    """An archived report with its profile(s), personas and analyses, or just its Markdown.
+
+    Archived reports never change, so they may be cached indefinitely.
+    """
+    found = await asyncio.to_thread(archive.get, report_id) if REPORT_ARCHIVE else None
+    if found is None:
+        raise HTTPException(status_code=404, detail="Report not found")
+    meta, body = found
+    immutable = "public, max-age=31536000, immutable"
+    if format == "markdown":
+        # Derived from the record's ETag, so a 304 needs no decompression
+        etag = archive.etag_of(f"{meta['etag']}/markdown".encode())
+        return _conditional_response(
+            request,
+            lambda: json.loads(gzip.decompress(body))["report"].encode("utf-8"),
+            etag, "text/markdown", cache_control=immutable,
+        )
+    return _conditional_response(request, body, meta["etag"], gzipped=True, cache_control=immutable)
 
 
 @router.get("/")
@@ -145,3 +626,78 @@ async def read_root():
 @router.get("/health")
 async def health():
     return {"status": "healthy"}
+
+
+@router.get("/ready")
+async def ready():
+    """Readiness: 200 once warm-up finished, 503 while cold or warming or when a warm-up step failed."""
+    state = lifecycle.readiness()
+    return JSONResponse(state, status_code=200 if state["ready"] else 503)
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """In-process metrics: LLM latency and token usage per route, etc."""
+    from app.config import LLM_CACHE, FUNDAMENTALS_UNIVERSE, SEARCH_PLANNING
+
+    snapshot = {**metrics.snapshot(), "blobs": blobs.stats(), "llm_timeouts": latency.snapshot()}
+    if LLM_CACHE:
+        from app import llm_cache
+
+        snapshot["llm_cache"] = await asyncio.to_thread(llm_cache.stats)
+    if FUNDAMENTALS_UNIVERSE:
+        from app import fundamentals
+
+        snapshot["fundamentals"] = await asyncio.to_thread(fundamentals.stats)
+    if SEARCH_PLANNING:
+        from app import search_planner  # pulls in numpy (snippets): not at startup
+
+        if search_planner.enabled():
+            snapshot["search_plan"] = search_planner.stats()
+    if REPORT_ARCHIVE:
+        snapshot["archive"] = await asyncio.to_thread(archive.stats)
+    if ADMISSION_CONTROL:
+        snapshot["admission"] = admission.stats()
+    snapshot["providers"] = providers.stats()
+    return snapshot
+
+
+@router.get("/breakers")
+async def get_breakers():
+    """Circuit breaker state per backend (LLM models, yfinance, DuckDuckGo)."""
+    return breaker.snapshot()
+
+
+@router.get("/api/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """A stored profile (run ID or process profile ID) as collapsed stacks."""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    text = await asyncio.to_thread(profiler.load, profile_id)
+    if text is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return PlainTextResponse(text)
+
+
+@router.post("/admin/profile")
+async def profile_process(seconds: float = Query(10.0, gt=0)):
+    """Sample the whole process for ``seconds`` (capped) and return the profile's ID and URL."""
+    if not PROFILING_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    seconds = min(seconds, PROFILE_MAX_SECONDS)
+    profile_id = await profiler.profile_process(seconds)
+    return {"profile_id": profile_id, "seconds": seconds, "url": f"/api/profiles/{profile_id}"}
+
+
+@router.get("/api/blobs/{ref}")
+async def get_blob(ref: str, section: Optional[str] = None):
+    """Lazily fetch a large state payload (e.g. the full financial_info) by handle."""
+    if not blobs.is_ref(ref):
+        raise HTTPException(status_code=400, detail="Invalid blob reference")
+    try:
+        text = blobs.get_section(ref, section, None) if section else blobs.get(ref)
+    except KeyError:
+        text = None
+    if text is None:
+        raise HTTPException(status_code=404, detail="Blob not found")
+    return PlainTextResponse(text)
@@ -10,28 +10,47 @@ load_dotenv(dotenv_path=env_path)
 
 # ── 2. Configure logging BEFORE importing app modules ───────────────────────
 from app.config import LOG_LEVEL  # noqa: E402 (must come after load_dotenv)
+from app import logs  # noqa: E402
 
-logging.basicConfig(
-    level=getattr(logging, LOG_LEVEL, logging.INFO),
-    format="%(asctime)s %(levelname)-8s [%(name)s] %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
-# Quiet noisy HTTP libraries unless in DEBUG mode
-if LOG_LEVEL != "DEBUG":
-    for lib in ("httpx", "httpcore", "openai", "urllib3"):
-        logging.getLogger(lib).setLevel(logging.WARNING)
+# Non-blocking: records are written by a background thread (noisy HTTP
+# libraries stay at WARNING unless in DEBUG mode)
+logs.setup(LOG_LEVEL)
 
 logger = logging.getLogger(__name__)
 logger.info("Logging configured: level=%s", LOG_LEVEL)
 
-# ── 3. Import app modules (agents, routes) ──────────────────────────────────
+# ── 3. Import app modules (routes; agents load lazily) ──────────────────────
+import asyncio  # noqa: E402
+from contextlib import asynccontextmanager  # noqa: E402
+
 from fastapi import FastAPI  # noqa: E402
 from fastapi.staticfiles import StaticFiles  # noqa: E402
 from fastapi.middleware.cors import CORSMiddleware  # noqa: E402
 from app.api import router  # noqa: E402
+from app.config import WARMUP_ON_STARTUP, LOOP_MONITOR, FUNDAMENTALS_UNIVERSE  # noqa: E402
+from app import lifecycle, loop_monitor  # noqa: E402
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    background = []
+    if LOOP_MONITOR:
+        background.append(asyncio.create_task(loop_monitor.run()))
+    # Warm up in the background: /health answers immediately, /ready once warm
+    if WARMUP_ON_STARTUP:
+        background.append(asyncio.create_task(lifecycle.warm_up()))
+    if FUNDAMENTALS_UNIVERSE:
+        from app import fundamentals  # numpy; only needed with a universe
+
+        background.append(asyncio.create_task(fundamentals.run_refresher()))
+    yield
+    for task in background:
+        if not task.done():
+            task.cancel()
+
 
 # Create main app
-app = FastAPI(title="Agentic Decision Maker")
+app = FastAPI(title="Agentic Decision Maker", lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
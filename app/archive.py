@@ -0,0 +1,190 @@
+"""Archive of finished reports.
+
+Each report is stored once, under its run ID, with everything that went into
+it: the company profile (one per ticker for comparisons), personas, persona
+analyses, price technicals and dropped work. Records are immutable gzipped
+JSON in SQLite at ``REPORT_ARCHIVE_PATH``, indexed by ticker, creation time,
+report model and depth, so serving yesterday's report is a lookup instead of
+a pipeline run. The ETag of a record is a hash of its JSON, and the stored
+gzip bytes go out as they are to clients that accept gzip.
+"""
+
+import os
+import gzip
+import json
+import time
+import asyncio
+import hashlib
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import List, Optional, Tuple
+
+from app.config import REPORT_ARCHIVE, REPORT_ARCHIVE_PATH, LLM_ROUTES
+from app import metrics, tracing, depth
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS reports (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    ticker TEXT NOT NULL,
+    tickers TEXT NOT NULL,
+    depth TEXT NOT NULL,
+    model TEXT NOT NULL,
+    created REAL NOT NULL,
+    etag TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    body BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS reports_ticker_created ON reports (ticker, created DESC);
+CREATE INDEX IF NOT EXISTS reports_created ON reports (created DESC);
+"""
+
+_COLUMNS = "id, kind, ticker, tickers, depth, model, created, etag, size"
+
+
+def _db() -> sqlite3.Connection:
+    """Shared connection (called with the lock held)."""
+    global _conn
+    if _conn is None:
+        os.makedirs(os.path.dirname(REPORT_ARCHIVE_PATH) or ".", exist_ok=True)
+        _conn = sqlite3.connect(REPORT_ARCHIVE_PATH, check_same_thread=False, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.executescript(_SCHEMA)
+    return _conn
+
+
+def etag_of(data: bytes) -> str:
+    return '"' + hashlib.sha256(data).hexdigest()[:32] + '"'
+
+
+def _meta(row: tuple) -> dict:
+    report_id, kind, ticker, tickers, depth, model, created, etag, size = row
+    return {
+        "id": report_id,
+        "kind": kind,
+        "ticker": ticker,
+        "tickers": tickers.split(","),
+        "depth": depth,
+        "model": model,
+        "created_at": datetime.fromtimestamp(created, timezone.utc).isoformat(),
+        "etag": etag,
+        "size": size,
+    }
+
+
+def _plain(value):
+    """JSON-ready form of state values (pydantic models included)."""
+    if hasattr(value, "model_dump"):
+        return value.model_dump()
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_plain(v) for v in value]
+    return value
+
+
+def save(state: dict, report: str, kind: str = "analysis") -> str:
+    """Archive the report of a finished run; returns its ID (the run ID when there is one).
+
+    ``kind`` is "analysis" (``company_profile``, ``personas`` and
+    ``persona_analyses`` of ``state`` are kept) or "comparison"
+    (``comparison_profiles``).
+    """
+    report_id = tracing.current_run.get() or tracing.new_run_id()
+    tickers = state.get("tickers") or [state["ticker"]]
+    created = time.time()
+    keys = ("company_profile", "personas", "persona_analyses") if kind == "analysis" else ("comparison_profiles",)
+    record = {
+        "id": report_id,
+        "kind": kind,
+        "ticker": state.get("ticker") or tickers[0],
+        "tickers": tickers,
+        "depth": depth.tier_name(state),
+        "model": LLM_ROUTES["report"]["model"],
+        "created_at": datetime.fromtimestamp(created, timezone.utc).isoformat(),
+        "user_message": state.get("user_message", ""),
+        "report": report,
+        **{key: _plain(state.get(key)) for key in keys},
+        "technicals": state.get("technicals", {}),
+        "trimmed": state.get("trimmed", []),
+    }
+    data = json.dumps(record, default=str, separators=(",", ":")).encode("utf-8")
+    body = gzip.compress(data, compresslevel=6, mtime=0)
+    with _lock:
+        _db().execute(
+            f"INSERT OR REPLACE INTO reports ({_COLUMNS}, body) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (report_id, kind, record["ticker"], ",".join(tickers), record["depth"], record["model"],
+             created, etag_of(data), len(data), body),
+        )
+    metrics.inc("reports_archived_total", kind=kind)
+    logger.info("Archived %s report %s for %s (%d bytes, %d gzipped)",
+                kind, report_id, ",".join(tickers), len(data), len(body))
+    return report_id
+
+
+async def record(state: dict, report: str, kind: str = "analysis") -> dict:
+    """State update ``{"report_id": ...}`` once archived ({} if the archive is off or failed)."""
+    if not REPORT_ARCHIVE:
+        return {}
+    try:
+        return {"report_id": await asyncio.to_thread(save, state, report, kind)}
+    except (OSError, sqlite3.Error) as exc:
+        logger.warning("Could not archive report: %s", exc)
+        return {}
+
+
+def list_reports(
+    ticker: Optional[str] = None,
+    depth_tier: Optional[str] = None,
+    model: Optional[str] = None,
+    before: Optional[float] = None,
+    limit: int = 20,
+) -> List[dict]:
+    """Metadata of archived reports, newest first; ``ticker`` also matches comparisons that include it."""
+    where, params = [], []
+    if ticker:
+        where.append("(ticker = ? OR ',' || tickers || ',' LIKE ?)")
+        params += [ticker.upper(), f"%,{ticker.upper()},%"]
+    if depth_tier:
+        where.append("depth = ?")
+        params.append(depth_tier)
+    if model:
+        where.append("model = ?")
+        params.append(model)
+    if before is not None:
+        where.append("created < ?")
+        params.append(before)
+    sql = f"SELECT {_COLUMNS} FROM reports"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY created DESC LIMIT ?"
+    with _lock:
+        rows = _db().execute(sql, (*params, limit)).fetchall()
+    return [_meta(row) for row in rows]
+
+
+def get(report_id: str) -> Optional[Tuple[dict, bytes]]:
+    """Metadata and gzipped JSON body of a report (None if unknown)."""
+    with _lock:
+        row = _db().execute(f"SELECT {_COLUMNS}, body FROM reports WHERE id = ?", (report_id,)).fetchone()
+    if row is None:
+        return None
+    return _meta(row[:-1]), row[-1]
+
+
+def stats() -> dict:
+    """Reports and bytes archived, for ``/metrics``."""
+    with _lock:
+        if _conn is None and not os.path.exists(REPORT_ARCHIVE_PATH):
+            return {"reports": 0, "bytes": 0, "gzipped_bytes": 0}
+        reports, size, stored = _db().execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), COALESCE(SUM(LENGTH(body)), 0) FROM reports"
+        ).fetchone()
+    return {"reports": reports, "bytes": size, "gzipped_bytes": stored}
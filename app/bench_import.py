@@ -0,0 +1,79 @@
+"""Import-time / cold-start benchmark.
+
+Measures, in fresh interpreters, how long it takes to import the FastAPI app,
+to run the CLI's ``--help``, and to do a full warm-up. Also lists the
+slowest modules reported by ``python -X importtime``.
+
+Usage:
+    python -m app.bench_import [--repeat 5] [--top 15]
+"""
+
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+from pathlib import Path
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+TARGETS = {
+    "import app.app": [sys.executable, "-c", "import app.app"],
+    "cli --help": [sys.executable, "-m", "app.agents.main", "--help"],
+    "import app.app + warm_up()": [
+        sys.executable, "-c",
+        "import asyncio, app.app; from app import lifecycle; asyncio.run(lifecycle.warm_up())",
+    ],
+}
+
+
+def _time_once(cmd: list[str], env: dict) -> float:
+    started = time.perf_counter()
+    subprocess.run(cmd, cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=False)
+    return time.perf_counter() - started
+
+
+def _slowest_imports(module: str, top: int, env: dict) -> list[tuple[int, str]]:
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT, env=env, capture_output=True, text=True, check=False,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time:  self_us | cumulative_us | module"
+        _self_us, cumulative_us, name = (part.strip() for part in line.split(":", 1)[1].split("|"))
+        rows.append((int(cumulative_us), name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark cold-start / import time")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per target (default 5)")
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to list (default 15, 0 to skip)")
+    args = parser.parse_args()
+
+    # Warm-up must not depend on a reachable LLM backend for a fair timing
+    env = {
+        **os.environ,
+        "OPENAI_BASE_URL": os.getenv("OPENAI_BASE_URL", "http://127.0.0.1:9/v1"),
+        "OPENAI_API_KEY": os.getenv("OPENAI_API_KEY", "bench"),
+        "WARMUP_LLM_CONNECT_TIMEOUT_SECONDS": "1",
+        "LOG_LEVEL": "WARNING",
+    }
+
+    print(f"{'target':<32} {'median':>8} {'min':>8} {'max':>8}")
+    for name, cmd in TARGETS.items():
+        samples = [_time_once(cmd, env) for _ in range(args.repeat)]
+        print(f"{name:<32} {statistics.median(samples):>7.3f}s {min(samples):>7.3f}s {max(samples):>7.3f}s")
+
+    if args.top:
+        print("\nSlowest imports for `import app.app` (cumulative):")
+        for cumulative_us, module in _slowest_imports("app.app", args.top, env):
+            print(f"  {cumulative_us / 1000:>9.1f} ms  {module}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,190 @@
+"""Content-addressed store for large state payloads.
+
+Graph state carries a short handle instead of the full ``financial_info``
+text; nodes fetch the whole blob, a slice or a single section when they need
+it. Blobs live in a size-bounded in-memory LRU shared by all concurrent
+runs (identical payloads are stored once) and spill to disk on eviction.
+"""
+
+import os
+import re
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+
+from app.config import BLOB_DIR, BLOB_MEMORY_BYTES, BLOB_TTL_SECONDS
+from app import metrics
+from app.run_store import split_sections
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_memory: "OrderedDict[str, str]" = OrderedDict()
+_memory_bytes = 0
+_sections: "OrderedDict[str, Dict[str, str]]" = OrderedDict()
+_SECTION_CACHE_SIZE = 64
+_spills_since_prune = 0
+# ref -> length in characters of every blob stored since startup
+_lengths: Dict[str, int] = {}
+
+# Handles are the first 32 hex digits of the blob's SHA-256
+_REF_RE = re.compile(r"^[0-9a-f]{32}$")
+
+# Per-request accounting of blob bytes, set by the API layer for each run
+_run_usage: ContextVar[Optional[dict]] = ContextVar("blob_run_usage", default=None)
+
+
+def _size(text: str) -> int:
+    return len(text.encode("utf-8"))
+
+
+def is_ref(ref: str) -> bool:
+    """Whether ``ref`` has the form of a blob handle."""
+    return bool(_REF_RE.match(ref))
+
+
+def _path(ref: str) -> str:
+    return os.path.join(BLOB_DIR, ref)
+
+
+def account(key: str, nbytes: int) -> None:
+    """Add ``nbytes`` to the current request's ``key`` counter, if tracked."""
+    usage = _run_usage.get()
+    if usage is not None:
+        usage[key] = usage.get(key, 0) + nbytes
+
+
+def _spill(ref: str, text: str) -> None:
+    """Write an evicted blob to disk (called with the lock released)."""
+    global _spills_since_prune
+    try:
+        os.makedirs(BLOB_DIR, exist_ok=True)
+        path = _path(ref)
+        if not os.path.exists(path):
+            tmp = f"{path}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, path)
+        _spills_since_prune += 1
+        if _spills_since_prune >= 100:
+            _spills_since_prune = 0
+            _prune_disk()
+    except OSError as exc:
+        logger.warning("Could not spill blob %s to disk: %s", ref, exc)
+
+
+def _prune_disk() -> None:
+    cutoff = time.time() - BLOB_TTL_SECONDS
+    for name in os.listdir(BLOB_DIR):
+        path = os.path.join(BLOB_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                with _lock:
+                    if name not in _memory:
+                        _lengths.pop(name, None)
+        except OSError:
+            pass
+
+
+def put(text: str) -> str:
+    """Store ``text`` and return its handle."""
+    global _memory_bytes
+    ref = hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+    nbytes = _size(text)
+    account("stored_bytes", nbytes)
+    evicted = []
+    with _lock:
+        if ref in _memory:
+            _memory.move_to_end(ref)
+            return ref
+        _memory[ref] = text
+        _lengths[ref] = len(text)
+        _memory_bytes += nbytes
+        while _memory_bytes > BLOB_MEMORY_BYTES and len(_memory) > 1:
+            old_ref, old_text = _memory.popitem(last=False)
+            _memory_bytes -= _size(old_text)
+            evicted.append((old_ref, old_text))
+    for old_ref, old_text in evicted:
+        _spill(old_ref, old_text)
+    metrics.inc("blob_puts_total")
+    return ref
+
+
+def get(ref: str) -> str:
+    """Return the full blob for ``ref`` (raises ``KeyError`` if unknown)."""
+    if not is_ref(ref):
+        raise KeyError(ref)
+    with _lock:
+        text = _memory.get(ref)
+        if text is not None:
+            _memory.move_to_end(ref)
+    if text is None:
+        try:
+            with open(_path(ref), "r", encoding="utf-8") as f:
+                text = f.read()
+        except (OSError, ValueError):
+            raise KeyError(ref) from None
+        metrics.inc("blob_disk_reads_total")
+    account("read_bytes", _size(text))
+    return text
+
+
+def length(ref: str) -> int:
+    """Length in characters of the blob for ``ref``, without loading it when known."""
+    with _lock:
+        chars = _lengths.get(ref)
+    return chars if chars is not None else len(get(ref))
+
+
+def get_slice(ref: str, start: int = 0, end: Optional[int] = None) -> str:
+    """Return ``blob[start:end]``."""
+    return get(ref)[start:end]
+
+
+def get_sections(ref: str) -> Dict[str, str]:
+    """Return the ``{heading: body}`` sections of a ``financial_info`` blob."""
+    with _lock:
+        sections = _sections.get(ref)
+        if sections is not None:
+            _sections.move_to_end(ref)
+            return sections
+    sections = split_sections(get(ref))
+    with _lock:
+        _sections[ref] = sections
+        while len(_sections) > _SECTION_CACHE_SIZE:
+            _sections.popitem(last=False)
+    return sections
+
+
+def get_section(ref: str, name: str, default: str = "") -> str:
+    """Return one section of a ``financial_info`` blob."""
+    return get_sections(ref).get(name, default)
+
+
+def stats() -> dict:
+    """Resident size of the in-memory store."""
+    with _lock:
+        return {"blobs": len(_memory), "resident_bytes": _memory_bytes, "limit_bytes": BLOB_MEMORY_BYTES}
+
+
+@contextmanager
+def track_run() -> Iterator[dict]:
+    """Account blob bytes stored/read by the current request.
+
+    Yields the usage dict; on exit the totals are recorded as per-request
+    metrics.
+    """
+    usage: dict = {}
+    token = _run_usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _run_usage.reset(token)
+        for key in ("stored_bytes", "read_bytes"):
+            metrics.observe(f"request_{key}", usage.get(key, 0))
@@ -0,0 +1,201 @@
+"""Per-backend circuit breakers.
+
+Every external backend (each LLM model, yfinance, DuckDuckGo) gets a breaker
+that tracks call outcomes over a sliding time window. When the failure rate
+crosses the threshold the breaker opens and calls fail immediately with
+``CircuitOpenError`` instead of queueing up behind timeouts and retries.
+After a cool-down a few probe calls are let through (half-open); one success
+closes the breaker again, a failure re-opens it.
+"""
+
+import time
+import logging
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from app.config import (
+    BREAKER_ENABLED,
+    BREAKER_WINDOW_SECONDS,
+    BREAKER_MIN_CALLS,
+    BREAKER_FAILURE_RATE,
+    BREAKER_OPEN_SECONDS,
+    BREAKER_HALF_OPEN_PROBES,
+)
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling a backend whose breaker is open."""
+
+    def __init__(self, backend: str, retry_after: float) -> None:
+        super().__init__(f"{backend} is unavailable (circuit open, retry in {retry_after:.0f}s)")
+        self.backend = backend
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """Failure-rate breaker over a sliding window, with half-open probing."""
+
+    def __init__(
+        self,
+        name: str,
+        window: float = BREAKER_WINDOW_SECONDS,
+        min_calls: int = BREAKER_MIN_CALLS,
+        failure_rate: float = BREAKER_FAILURE_RATE,
+        open_seconds: float = BREAKER_OPEN_SECONDS,
+        half_open_probes: int = BREAKER_HALF_OPEN_PROBES,
+    ) -> None:
+        self.name = name
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._last_error: Optional[str] = None
+
+    def _transition(self, state: str) -> None:
+        """Switch state (called with the lock held)."""
+        if state == self._state:
+            return
+        logger.warning("Circuit %s: %s -> %s", self.name, self._state, state)
+        metrics.inc("breaker_transitions_total", backend=self.name, to=state)
+        self._state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        if state != HALF_OPEN:
+            self._probes_in_flight = 0
+        if state == CLOSED:
+            self._outcomes.clear()
+
+    def _refresh(self, now: float) -> None:
+        """Expire old outcomes and move open -> half-open after the cool-down."""
+        cutoff = now - self.window
+        while self._outcomes and self._outcomes[0][0] < cutoff:
+            self._outcomes.popleft()
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._transition(HALF_OPEN)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh(time.monotonic())
+            return self._state
+
+    def retry_after(self) -> float:
+        with self._lock:
+            if self._state != OPEN:
+                return 0.0
+            return max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+
+    def before_call(self) -> bool:
+        """Admit a call or raise ``CircuitOpenError``.
+
+        Returns True when the call is a half-open probe; pass it back to
+        ``record`` so the probe slot is released.
+        """
+        if not BREAKER_ENABLED:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            if self._state == CLOSED:
+                return False
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+            retry_after = max(1.0, self.open_seconds - (now - self._opened_at))
+        metrics.inc("breaker_rejections_total", backend=self.name)
+        raise CircuitOpenError(self.name, retry_after)
+
+    def record(self, ok: bool, probe: bool = False, error: Optional[BaseException] = None) -> None:
+        """Record the outcome of an admitted call."""
+        if not BREAKER_ENABLED:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            if error is not None:
+                self._last_error = f"{type(error).__name__}: {error}"[:200]
+            if probe:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+            if self._state == HALF_OPEN:
+                # Only probes decide; stragglers admitted while closed are ignored
+                if probe:
+                    self._transition(CLOSED if ok else OPEN)
+                return
+            if self._state == OPEN:
+                return
+            self._outcomes.append((now, ok))
+            failures = sum(1 for _, success in self._outcomes if not success)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+                self._transition(OPEN)
+
+    def release(self, probe: bool) -> None:
+        """Give back a probe slot without recording an outcome (e.g. cancelled call)."""
+        if probe:
+            with self._lock:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            failures = sum(1 for _, success in self._outcomes if not success)
+            return {
+                "state": self._state,
+                "calls_in_window": len(self._outcomes),
+                "failures_in_window": failures,
+                "retry_after_seconds": (
+                    round(max(0.0, self.open_seconds - (now - self._opened_at)), 1)
+                    if self._state == OPEN else 0.0
+                ),
+                "last_error": self._last_error,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """Shared breaker for backend ``name`` (created on first use)."""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = _breakers[name] = CircuitBreaker(name)
+        return breaker
+
+
+def llm_backend(model: str) -> str:
+    """Breaker name of an LLM model."""
+    return f"llm:{model}"
+
+
+def unavailable(*names: str) -> Optional[CircuitOpenError]:
+    """Error for the first of ``names`` whose breaker is open (None if all admit calls)."""
+    if not BREAKER_ENABLED:
+        return None
+    for name in names:
+        breaker = get_breaker(name)
+        if breaker.state == OPEN:
+            return CircuitOpenError(name, max(1.0, breaker.retry_after()))
+    return None
+
+
+def snapshot() -> Dict[str, dict]:
+    """State of every breaker, for the status endpoint."""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.snapshot() for b in breakers}
@@ -0,0 +1,221 @@
+"""Record/replay of backend traffic ("cassettes").
+
+With ``CASSETTE_MODE=record`` every LLM HTTP exchange and every yfinance /
+DuckDuckGo fetch is stored under ``CASSETTE_DIR`` keyed by a hash of the
+request, together with how long it took. With ``CASSETTE_MODE=replay`` the
+same calls are answered from the cassettes without touching any backend,
+optionally sleeping ``CASSETTE_REPLAY_LATENCY`` x the recorded duration, so
+graph overhead, serialization and SSE throughput can be measured with real
+payload sizes on a laptop. Replay misses fail loudly.
+
+- LLM calls: ``CassetteTransport`` sits under the httpx client of every
+  ``create_llm`` client and records the raw chat-completions exchange.
+- Data providers: ``boundary`` wraps ``_fetch_yfinance`` / ``_search_ddg``
+  (every ddgs engine included; ``app.providers`` does not hedge meanwhile).
+
+Throttled (429) and failed (5xx) responses are not recorded, nor are data
+fetches that degraded to a failure placeholder: a replay would reproduce
+the outage instead of the traffic.
+"""
+
+import os
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import logging
+import functools
+from typing import Any, Callable, Optional
+
+import httpx
+
+from app.config import CASSETTE_MODE, CASSETTE_DIR, CASSETTE_REPLAY_LATENCY
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+OFF = "off"
+RECORD = "record"
+REPLAY = "replay"
+
+# Hop-by-hop / encoding headers that no longer apply to a re-built response
+_DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+
+class CassetteMissError(LookupError):
+    """Replay mode got a request that was never recorded."""
+
+
+def enabled() -> bool:
+    return CASSETTE_MODE in (RECORD, REPLAY)
+
+
+def request_key(kind: str, payload: Any) -> str:
+    """Stable hash of a request (``payload`` must be JSON-serialisable)."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{kind}\n{canonical}".encode("utf-8")).hexdigest()[:32]
+
+
+def _path(kind: str, key: str) -> str:
+    return os.path.join(CASSETTE_DIR, kind, f"{key}.json")
+
+
+def _load(kind: str, key: str) -> dict:
+    try:
+        with open(_path(kind, key), "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        metrics.inc("cassette_misses_total", kind=kind)
+        raise CassetteMissError(f"No {kind} cassette for request {key}") from None
+    metrics.inc("cassette_hits_total", kind=kind)
+    return entry
+
+
+def _save(kind: str, key: str, entry: dict) -> None:
+    path = _path(kind, key)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        metrics.inc("cassette_recorded_total", kind=kind)
+    except OSError as exc:
+        logger.warning("Could not record %s cassette %s: %s", kind, key, exc)
+
+
+def _replay_delay(entry: dict) -> float:
+    return max(0.0, entry.get("seconds", 0.0) * CASSETTE_REPLAY_LATENCY)
+
+
+# ── Data providers ───────────────────────────────────────────────────────────
+
+def boundary(kind: str, record_if: Callable[[str], bool] = lambda result: True) -> Callable:
+    """Record / replay a blocking data fetch returning a string.
+
+    Only successful calls are recorded: exceptions pass through unrecorded,
+    as do results ``record_if`` rejects (failure placeholders).
+    """
+
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled():
+                return func(*args, **kwargs)
+            key = request_key(kind, {"args": args, "kwargs": kwargs})
+            if CASSETTE_MODE == REPLAY:
+                entry = _load(kind, key)
+                time.sleep(_replay_delay(entry))
+                return entry["result"]
+            started = time.perf_counter()
+            result = func(*args, **kwargs)
+            if not record_if(result):
+                return result
+            _save(kind, key, {
+                "request": {"args": args, "kwargs": kwargs},
+                "result": result,
+                "seconds": round(time.perf_counter() - started, 4),
+            })
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+# ── LLM HTTP traffic ─────────────────────────────────────────────────────────
+
+def _recordable(status: int) -> bool:
+    """Whether a response is worth replaying (not throttled, not a server error)."""
+    return status < 500 and status != 429
+
+
+def _http_key(request: httpx.Request) -> str:
+    body = request.content
+    try:
+        payload: Any = json.loads(body) if body else None
+    except ValueError:
+        payload = body.decode("utf-8", "replace")
+    return request_key("llm", {"method": request.method, "path": request.url.path, "body": payload})
+
+
+def _entry(request: httpx.Request, response: httpx.Response, content: bytes, seconds: float) -> dict:
+    try:
+        body, encoding = content.decode("utf-8"), "utf-8"
+    except UnicodeDecodeError:
+        body, encoding = base64.b64encode(content).decode("ascii"), "base64"
+    return {
+        "request": {"method": request.method, "path": request.url.path},
+        "status": response.status_code,
+        "headers": [(k, v) for k, v in response.headers.items() if k.lower() not in _DROP_HEADERS],
+        "body": body,
+        "encoding": encoding,
+        "seconds": round(seconds, 4),
+    }
+
+
+def _response(request: httpx.Request, entry: dict) -> httpx.Response:
+    body = entry["body"]
+    content = base64.b64decode(body) if entry.get("encoding") == "base64" else body.encode("utf-8")
+    return httpx.Response(entry["status"], headers=entry["headers"], content=content, request=request)
+
+
+def _miss_response(request: httpx.Request, key: str) -> httpx.Response:
+    # A 4xx surfaces as a clear, non-retried API error instead of a connection failure
+    return httpx.Response(
+        404,
+        json={"error": {"message": f"No llm cassette for request {key}", "type": "cassette_miss"}},
+        request=request,
+    )
+
+
+class CassetteTransport(httpx.AsyncBaseTransport, httpx.BaseTransport):
+    """httpx transport that records or replays the exchanges of ``inner``."""
+
+    def __init__(self, inner_async: Optional[httpx.AsyncBaseTransport] = None,
+                 inner_sync: Optional[httpx.BaseTransport] = None) -> None:
+        self._inner_async = inner_async or httpx.AsyncHTTPTransport()
+        self._inner_sync = inner_sync or httpx.HTTPTransport()
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = _http_key(request)
+        if CASSETTE_MODE == REPLAY:
+            try:
+                entry = _load("llm", key)
+            except CassetteMissError:
+                return _miss_response(request, key)
+            await asyncio.sleep(_replay_delay(entry))
+            return _response(request, entry)
+        started = time.perf_counter()
+        response = await self._inner_async.handle_async_request(request)
+        content = await response.aread()
+        await response.aclose()
+        entry = _entry(request, response, content, time.perf_counter() - started)
+        if CASSETTE_MODE == RECORD and _recordable(response.status_code):
+            await asyncio.to_thread(_save, "llm", key, entry)
+        return _response(request, entry)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = _http_key(request)
+        if CASSETTE_MODE == REPLAY:
+            try:
+                entry = _load("llm", key)
+            except CassetteMissError:
+                return _miss_response(request, key)
+            time.sleep(_replay_delay(entry))
+            return _response(request, entry)
+        started = time.perf_counter()
+        response = self._inner_sync.handle_request(request)
+        content = response.read()
+        response.close()
+        entry = _entry(request, response, content, time.perf_counter() - started)
+        if CASSETTE_MODE == RECORD and _recordable(response.status_code):
+            _save("llm", key, entry)
+        return _response(request, entry)
+
+    async def aclose(self) -> None:
+        await self._inner_async.aclose()
+
+    def close(self) -> None:
+        self._inner_sync.close()
@@ -6,6 +6,7 @@ and imported by any module that needs them.
 
 import os
 import logging
+from typing import Dict, List, Optional
 
 logger = logging.getLogger(__name__)
 
@@ -21,18 +22,353 @@ def _env_int(key: str, default: int) -> int:
         return default
 
 
+def _env_bool(key: str, default: bool) -> bool:
+    raw = os.getenv(key)
+    if raw is None or raw.strip() == "":
+        return default
+    return raw.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_float(key: str, default: float) -> float:
+    raw = os.getenv(key)
+    if raw is None:
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        logger.warning("Invalid number for %s=%r, using default %s", key, raw, default)
+        return default
+
+
+def _env_str(key: str, default: str) -> str:
+    raw = os.getenv(key)
+    return raw if raw else default
+
+
+def _env_optional_int(key: str, default: Optional[int]) -> Optional[int]:
+    raw = os.getenv(key)
+    if raw is None or raw.strip().lower() in ("", "none"):
+        return default
+    return _env_int(key, default or 0)
+
+
 # ── Logging ──────────────────────────────────────────────────────────────────
+# Records are written by a background thread (app/logs.py): "json" (one
+# object per line, with run ID and node) or "text"; unset, the API writes json
+# and the CLI text. Below WARNING, each call site of the API logs at most
+# LOG_SAMPLE_PER_SECOND records per second (0 = no sampling); DEBUG logging
+# and the CLI are never sampled.
 LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT: str = _env_str("LOG_FORMAT", "").lower()
+LOG_SAMPLE_PER_SECOND: int = _env_int("LOG_SAMPLE_PER_SECOND", 20)
 
 # ── LLM (OpenAI-compatible) ─────────────────────────────────────────────────
 LLM_TIMEOUT: int = _env_int("LLM_TIMEOUT_SECONDS", 60)
 LLM_MAX_RETRIES: int = _env_int("LLM_MAX_RETRIES", 5)
 
+# ── Per-node model routing ───────────────────────────────────────────────────
+# Short extraction-style calls go to a small fast model, long-form reasoning to
+# the big one. Both default to OPENAI_MODEL_NAME, so routing is opt-in: set
+# e.g. LLM_SMALL_MODEL=nemotron and LLM_LARGE_MODEL=qwen-30b (names must match
+# litellm_config.yml when going through the proxy).
+_DEFAULT_MODEL = _env_str("OPENAI_MODEL_NAME", "sonar")
+LLM_SMALL_MODEL: str = _env_str("LLM_SMALL_MODEL", _DEFAULT_MODEL)
+LLM_LARGE_MODEL: str = _env_str("LLM_LARGE_MODEL", _DEFAULT_MODEL)
+
+# route -> model / timeout (seconds) / max_tokens (None = backend default) /
+# cache (use the response cache when LLM_CACHE is on). Each field can be
+# overridden with LLM_ROUTE_<ROUTE>_MODEL|_TIMEOUT|_MAX_TOKENS|_CACHE.
+_ROUTE_DEFAULTS: Dict[str, dict] = {
+    "default": {"model": _DEFAULT_MODEL, "timeout": LLM_TIMEOUT, "max_tokens": None, "cache": True},
+    "planner": {"model": LLM_SMALL_MODEL, "timeout": 30, "max_tokens": 512, "cache": True},
+    "persona": {"model": LLM_SMALL_MODEL, "timeout": LLM_TIMEOUT, "max_tokens": 3000, "cache": True},
+    "dimension": {"model": LLM_SMALL_MODEL, "timeout": LLM_TIMEOUT, "max_tokens": 600, "cache": True},
+    "analysis": {"model": LLM_LARGE_MODEL, "timeout": 600, "max_tokens": 10000, "cache": True},
+    "report": {"model": LLM_LARGE_MODEL, "timeout": 1800, "max_tokens": None, "cache": True},
+}
+
+
+def _load_routes() -> Dict[str, dict]:
+    routes = {}
+    for route, defaults in _ROUTE_DEFAULTS.items():
+        prefix = f"LLM_ROUTE_{route.upper()}"
+        routes[route] = {
+            "model": _env_str(f"{prefix}_MODEL", defaults["model"]),
+            "timeout": _env_int(f"{prefix}_TIMEOUT", defaults["timeout"]),
+            "max_tokens": _env_optional_int(f"{prefix}_MAX_TOKENS", defaults["max_tokens"]),
+            "cache": _env_bool(f"{prefix}_CACHE", defaults["cache"]),
+        }
+    return routes
+
+
+LLM_ROUTES: Dict[str, dict] = _load_routes()
+
+# ── Adaptive timeouts ────────────────────────────────────────────────────────
+# Once LLM_TIMEOUT_MIN_SAMPLES calls of a (node, model, prompt size) have been
+# seen, their timeout becomes p99 x LLM_TIMEOUT_P99_FACTOR, clamped between
+# LLM_TIMEOUT_FLOOR_SECONDS and the route timeout above (the ceiling), and
+# retries are limited so that all attempts fit into the route timeout.
+ADAPTIVE_TIMEOUTS: bool = _env_bool("ADAPTIVE_TIMEOUTS", True)
+LLM_TIMEOUT_FLOOR: float = _env_float("LLM_TIMEOUT_FLOOR_SECONDS", 5.0)
+LLM_TIMEOUT_P99_FACTOR: float = _env_float("LLM_TIMEOUT_P99_FACTOR", 2.0)
+LLM_TIMEOUT_MIN_SAMPLES: int = _env_int("LLM_TIMEOUT_MIN_SAMPLES", 20)
+# Upper bound on the wait for the next event of a streamed run
+STREAM_IDLE_TIMEOUT: float = _env_float("STREAM_IDLE_TIMEOUT_SECONDS", 900.0)
+
+# ── Request deadlines ────────────────────────────────────────────────────────
+# An API run is cancelled once this many seconds have passed (a request may
+# ask for less with "deadline_seconds"); LLM timeouts and retries are clamped
+# to the time it has left.
+REQUEST_DEADLINE: float = _env_float("REQUEST_DEADLINE_SECONDS", 1800.0)
+
+# ── Structured output ────────────────────────────────────────────────────────
+# Malformed structured replies are repaired locally (truncated JSON closed,
+# enum spellings normalised) before the model is asked again; this bounds the
+# re-generations per call once repair has failed.
+STRUCTURED_OUTPUT_RETRIES: int = _env_int("STRUCTURED_OUTPUT_RETRIES", 1)
+
+# ── Analysis depth tiers ─────────────────────────────────────────────────────
+# tier -> searches (indices into SEARCH_QUERIES, None = all) / search_results
+# (DuckDuckGo results per search) / dimensions (company-profile dimensions,
+# None = all) / personas / analysis_max_tokens and report_max_tokens (None =
+# route default) / target_seconds (latency target of the whole run; optional
+# work still running at a stage's share of it is dropped, 0 = no target).
+# target_seconds and personas can be overridden with
+# DEPTH_<TIER>_TARGET_SECONDS|_PERSONAS.
+_DEPTH_DEFAULTS: Dict[str, dict] = {
+    "quick": {
+        "searches": (0, 1, 3),
+        "search_results": 3,
+        "dimensions": ("business_model", "how_they_make_money", "growth_drivers", "competitive_edge"),
+        "personas": 2,
+        "analysis_max_tokens": 1500,
+        "report_max_tokens": 1000,
+        "target_seconds": 15,
+    },
+    "standard": {
+        "searches": None,
+        "search_results": 5,
+        "dimensions": None,
+        "personas": 4,
+        "analysis_max_tokens": None,
+        "report_max_tokens": None,
+        "target_seconds": 180,
+    },
+    "deep": {
+        "searches": None,
+        "search_results": 10,
+        "dimensions": None,
+        "personas": 6,
+        "analysis_max_tokens": None,
+        "report_max_tokens": None,
+        "target_seconds": 600,
+    },
+}
+
+
+def _load_depths() -> Dict[str, dict]:
+    tiers = {}
+    for name, defaults in _DEPTH_DEFAULTS.items():
+        prefix = f"DEPTH_{name.upper()}"
+        tiers[name] = {
+            **defaults,
+            "personas": max(1, _env_int(f"{prefix}_PERSONAS", defaults["personas"])),
+            "target_seconds": _env_int(f"{prefix}_TARGET_SECONDS", defaults["target_seconds"]),
+        }
+    return tiers
+
+
+DEPTH_TIERS: Dict[str, dict] = _load_depths()
+DEFAULT_DEPTH: str = _env_str("DEFAULT_DEPTH", "standard")
+
+# ── Startup ──────────────────────────────────────────────────────────────────
+# Compile the graph, parse prompts and open LLM / data connections right after
+# startup (in the background) so the first request does not pay for it.
+WARMUP_ON_STARTUP: bool = _env_bool("WARMUP_ON_STARTUP", True)
+WARMUP_LLM_CONNECT_TIMEOUT: int = _env_int("WARMUP_LLM_CONNECT_TIMEOUT_SECONDS", 5)
+
+# ── Event-loop monitoring ────────────────────────────────────────────────────
+# Loop lag is sampled every LOOP_MONITOR_INTERVAL_MS. LOOP_BLOCK_DEBUG also logs
+# the stack (and graph node) of anything blocking the loop longer than
+# LOOP_BLOCK_THRESHOLD_MS.
+LOOP_MONITOR: bool = _env_bool("LOOP_MONITOR", True)
+LOOP_MONITOR_INTERVAL_MS: int = _env_int("LOOP_MONITOR_INTERVAL_MS", 250)
+LOOP_BLOCK_DEBUG: bool = _env_bool("LOOP_BLOCK_DEBUG", False)
+LOOP_BLOCK_THRESHOLD_MS: int = _env_int("LOOP_BLOCK_THRESHOLD_MS", 100)
+
+# ── Speculative data fetch ───────────────────────────────────────────────────
+# When a ticker is obvious from the user message, start the yfinance + search
+# stage while the planner LLM call is still running.
+SPECULATIVE_FETCH: bool = _env_bool("SPECULATIVE_FETCH", True)
+
 # ── External API calls (Perplexity, etc.) ────────────────────────────────────
 API_TIMEOUT: int = _env_int("API_TIMEOUT_SECONDS", 60)
 API_MAX_RETRIES: int = _env_int("API_MAX_RETRIES", 5)
+# Worker threads shared by all blocking data fetches (yfinance, DuckDuckGo)
+# across concurrent runs and the tickers of a comparison.
+DATA_POOL_WORKERS: int = _env_int("DATA_POOL_WORKERS", 32)
+
+# ── Circuit breakers ─────────────────────────────────────────────────────────
+# One breaker per backend (each LLM model, yfinance, DuckDuckGo). It opens when
+# at least BREAKER_MIN_CALLS calls in the last BREAKER_WINDOW_SECONDS failed at
+# BREAKER_FAILURE_RATE or more, rejects calls for BREAKER_OPEN_SECONDS, then
+# lets BREAKER_HALF_OPEN_PROBES trial calls through to decide whether to close.
+BREAKER_ENABLED: bool = _env_bool("BREAKER_ENABLED", True)
+BREAKER_WINDOW_SECONDS: float = _env_float("BREAKER_WINDOW_SECONDS", 30.0)
+BREAKER_MIN_CALLS: int = _env_int("BREAKER_MIN_CALLS", 5)
+BREAKER_FAILURE_RATE: float = _env_float("BREAKER_FAILURE_RATE", 0.5)
+BREAKER_OPEN_SECONDS: float = _env_float("BREAKER_OPEN_SECONDS", 10.0)
+BREAKER_HALF_OPEN_PROBES: int = _env_int("BREAKER_HALF_OPEN_PROBES", 1)
 
 # ── LangGraph recursion limit ────────────────────────────────────────────────
 # The ReAct agents loop between LLM → tool calls; each round is 2 steps.
 # Default 25 is too low when the model makes many search calls.
 RECURSION_LIMIT: int = _env_int("RECURSION_LIMIT", 100)
+
+# ── Local data directory ─────────────────────────────────────────────────────
+# Root for everything the backend persists between runs (run history, caches).
+DATA_DIR: str = os.getenv("DATA_DIR", ".data")
+
+# ── Data providers ───────────────────────────────────────────────────────────
+# Providers per data kind, in order of preference (comma-separated):
+# statements: yfinance, fixtures; search: duckduckgo, ddgs:<engine> (another
+# ddgs search engine, e.g. ddgs:bing), fixtures. "fixtures" reads files under
+# DATA_FIXTURES_DIR. A fetch goes to the first provider; the next one starts
+# when it fails or, with DATA_HEDGING, has not answered by its p90 latency
+# (known after DATA_HEDGE_MIN_SAMPLES calls). The first good answer wins.
+DATA_PROVIDERS_STATEMENTS: List[str] = [
+    p.strip() for p in os.getenv("DATA_PROVIDERS_STATEMENTS", "yfinance").split(",") if p.strip()
+]
+DATA_PROVIDERS_SEARCH: List[str] = [
+    p.strip() for p in os.getenv("DATA_PROVIDERS_SEARCH", "duckduckgo,ddgs:bing").split(",") if p.strip()
+]
+DATA_FIXTURES_DIR: str = os.getenv("DATA_FIXTURES_DIR", os.path.join(DATA_DIR, "fixtures"))
+DATA_HEDGING: bool = _env_bool("DATA_HEDGING", True)
+DATA_HEDGE_MIN_SAMPLES: int = _env_int("DATA_HEDGE_MIN_SAMPLES", 20)
+
+# ── Blob store for large state payloads ──────────────────────────────────────
+# financial_info travels through the graph as a handle; the text itself sits
+# in a bounded in-memory LRU that spills to disk.
+BLOB_DIR: str = os.getenv("BLOB_DIR", os.path.join(DATA_DIR, "blobs"))
+BLOB_MEMORY_BYTES: int = _env_int("BLOB_MEMORY_MB", 64) * 1024 * 1024
+BLOB_TTL_SECONDS: int = _env_int("BLOB_TTL_SECONDS", 86400)
+
+# ── Incremental re-analysis ──────────────────────────────────────────────────
+# The last completed run per ticker is stored here so a re-run can reuse the
+# profile dimensions, personas and analyses whose inputs did not change.
+RUN_STORE_DIR: str = os.getenv("RUN_STORE_DIR", os.path.join(DATA_DIR, "runs"))
+
+# ── Record / replay cassettes ────────────────────────────────────────────────
+# off | record | replay. record stores every LLM / yfinance / DuckDuckGo
+# exchange under CASSETTE_DIR; replay answers from there without any backend,
+# sleeping CASSETTE_REPLAY_LATENCY x the recorded duration (0 = no delay).
+CASSETTE_MODE: str = os.getenv("CASSETTE_MODE", "off").strip().lower() or "off"
+CASSETTE_DIR: str = os.getenv("CASSETTE_DIR", os.path.join(DATA_DIR, "cassettes"))
+CASSETTE_REPLAY_LATENCY: float = _env_float("CASSETTE_REPLAY_LATENCY", 0.0)
+
+# ── LLM response cache ───────────────────────────────────────────────────────
+# Opt-in exact-match cache of LLM responses (same model, parameters, messages
+# and output schema), persisted in SQLite. Entries expire after
+# LLM_CACHE_TTL_SECONDS; least recently used ones are evicted above
+# LLM_CACHE_MAX_MB. Per-route switch: LLM_ROUTE_<ROUTE>_CACHE.
+LLM_CACHE: bool = _env_bool("LLM_CACHE", False)
+LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", os.path.join(DATA_DIR, "llm_cache.sqlite3"))
+LLM_CACHE_TTL_SECONDS: int = _env_int("LLM_CACHE_TTL_SECONDS", 7 * 86400)
+LLM_CACHE_MAX_BYTES: int = _env_int("LLM_CACHE_MAX_MB", 256) * 1024 * 1024
+
+# ── Fundamentals store ───────────────────────────────────────────────────────
+# Company info and financial statements of the FUNDAMENTALS_UNIVERSE tickers
+# (comma-separated) are kept as memory-mapped columns under FUNDAMENTALS_DIR
+# and refreshed in the background: FUNDAMENTALS_BATCH_SIZE tickers (at most
+# FUNDAMENTALS_CONCURRENCY fetching at once) every FUNDAMENTALS_REFRESH_SECONDS.
+# A stored ticker younger than FUNDAMENTALS_MAX_AGE_HOURS is analysed without
+# calling Yahoo.
+FUNDAMENTALS_DIR: str = os.getenv("FUNDAMENTALS_DIR", os.path.join(DATA_DIR, "fundamentals"))
+FUNDAMENTALS_UNIVERSE: List[str] = [
+    t.strip().upper() for t in os.getenv("FUNDAMENTALS_UNIVERSE", "").split(",") if t.strip()
+]
+FUNDAMENTALS_MAX_AGE_SECONDS: float = _env_float("FUNDAMENTALS_MAX_AGE_HOURS", 24.0) * 3600
+FUNDAMENTALS_BATCH_SIZE: int = _env_int("FUNDAMENTALS_BATCH_SIZE", 20)
+FUNDAMENTALS_CONCURRENCY: int = _env_int("FUNDAMENTALS_CONCURRENCY", 4)
+FUNDAMENTALS_REFRESH_SECONDS: float = _env_float("FUNDAMENTALS_REFRESH_SECONDS", 60.0)
+
+# ── Price history ────────────────────────────────────────────────────────────
+# Daily closes (day, close) are cached per ticker under PRICES_DIR; a ticker
+# whose cache is older than PRICES_MAX_AGE_HOURS gets its new bars appended
+# (new tickers load PRICES_HISTORY_DAYS of history). Technical indicators are
+# computed against PRICES_BENCHMARK. PRICES_ENABLED=false skips the stage.
+PRICES_ENABLED: bool = _env_bool("PRICES_ENABLED", True)
+PRICES_DIR: str = os.getenv("PRICES_DIR", os.path.join(DATA_DIR, "prices"))
+PRICES_MAX_AGE_SECONDS: float = _env_float("PRICES_MAX_AGE_HOURS", 6.0) * 3600
+PRICES_HISTORY_DAYS: int = _env_int("PRICES_HISTORY_DAYS", 730)
+PRICES_BENCHMARK: str = _env_str("PRICES_BENCHMARK", "SPY").upper()
+
+# ── Search planning ──────────────────────────────────────────────────────────
+# Each search's marginal novelty (share of its results no higher-priority
+# search of the run returned) is tracked across runs in SEARCH_STATS_PATH as
+# a moving average (weight SEARCH_NOVELTY_ALPHA per run). Once a search has
+# been measured SEARCH_MIN_RUNS times, it is skipped while that average is
+# below SEARCH_MIN_NOVELTY, except in a SEARCH_EXPLORE_RATE share of runs
+# that keep its measurement current. Searches for facts the yfinance
+# statements already hold are skipped whenever those statements are present.
+SEARCH_PLANNING: bool = _env_bool("SEARCH_PLANNING", True)
+SEARCH_STATS_PATH: str = os.getenv("SEARCH_STATS_PATH", os.path.join(DATA_DIR, "search_stats.json"))
+SEARCH_MIN_NOVELTY: float = _env_float("SEARCH_MIN_NOVELTY", 0.15)
+SEARCH_MIN_RUNS: int = _env_int("SEARCH_MIN_RUNS", 5)
+SEARCH_EXPLORE_RATE: float = _env_float("SEARCH_EXPLORE_RATE", 0.1)
+SEARCH_NOVELTY_ALPHA: float = _env_float("SEARCH_NOVELTY_ALPHA", 0.2)
+
+# Repeated search results (same page, or near-identical snippet) are dropped
+# across the searches of a run. Each profile dimension then only gets the
+# SEARCH_FOCUS_RESULTS results most relevant to it (BM25), and each persona
+# analysis SEARCH_FOCUS_ANALYSIS_RESULTS (0 = all results).
+SEARCH_DEDUP: bool = _env_bool("SEARCH_DEDUP", True)
+SEARCH_FOCUS_RESULTS: int = _env_int("SEARCH_FOCUS_RESULTS", 15)
+SEARCH_FOCUS_ANALYSIS_RESULTS: int = _env_int("SEARCH_FOCUS_ANALYSIS_RESULTS", 30)
+
+# ── Admission control ────────────────────────────────────────────────────────
+# Per client (X-API-Key, else IP): a budget of ADMISSION_BURST_TOKENS estimated
+# LLM tokens, refilled at ADMISSION_TOKENS_PER_MINUTE. Requests the budget
+# cannot cover yet wait up to ADMISSION_MAX_QUEUE_SECONDS, else get a 429.
+# Only keys listed in ADMISSION_API_KEYS (comma-separated) get their own
+# budget; requests with any other key are budgeted by IP.
+ADMISSION_CONTROL: bool = _env_bool("ADMISSION_CONTROL", True)
+ADMISSION_API_KEYS: frozenset = frozenset(
+    k.strip() for k in os.getenv("ADMISSION_API_KEYS", "").split(",") if k.strip()
+)
+ADMISSION_TOKENS_PER_MINUTE: int = max(1, _env_int("ADMISSION_TOKENS_PER_MINUTE", 100_000))
+ADMISSION_BURST_TOKENS: int = max(1, _env_int("ADMISSION_BURST_TOKENS", 400_000))
+ADMISSION_MAX_QUEUE_SECONDS: float = _env_float("ADMISSION_MAX_QUEUE_SECONDS", 60.0)
+
+# ── Stream encoding ──────────────────────────────────────────────────────────
+# /api/analyze/stream is compressed (br if the brotli package is installed,
+# else gzip) for clients that accept it. With ?compact=1, values of at least
+# SSE_REF_MIN_BYTES that were already sent are sent again by reference.
+SSE_COMPRESSION: bool = _env_bool("SSE_COMPRESSION", True)
+SSE_REF_MIN_BYTES: int = _env_int("SSE_REF_MIN_BYTES", 256)
+
+# ── Report archive ───────────────────────────────────────────────────────────
+# Every finished report is archived with its company profile(s), personas and
+# analyses (gzipped JSON in SQLite at REPORT_ARCHIVE_PATH) and served by
+# /api/reports.
+REPORT_ARCHIVE: bool = _env_bool("REPORT_ARCHIVE", True)
+REPORT_ARCHIVE_PATH: str = os.getenv("REPORT_ARCHIVE_PATH", os.path.join(DATA_DIR, "reports.sqlite3"))
+
+# ── Screening ────────────────────────────────────────────────────────────────
+# /api/screen can hand its top tickers straight to the analysis pipeline: at
+# most SCREEN_ANALYZE_MAX of them, analysed SCREEN_ANALYZE_CONCURRENCY at a
+# time.
+SCREEN_ANALYZE_MAX: int = _env_int("SCREEN_ANALYZE_MAX", 10)
+SCREEN_ANALYZE_CONCURRENCY: int = _env_int("SCREEN_ANALYZE_CONCURRENCY", 2)
+
+# ── Profiling ────────────────────────────────────────────────────────────────
+# Runs requested with ?profile=1 (or an X-Profile: 1 header) are sampled every
+# PROFILE_INTERVAL_MS; collapsed-stack files land in PROFILE_DIR (newest
+# PROFILE_KEEP kept). /admin/profile samples the whole process for up to
+# PROFILE_MAX_SECONDS. Off by default: these endpoints are unauthenticated, so
+# only turn profiling on where the API is not reachable by untrusted clients.
+PROFILING_ENABLED: bool = _env_bool("PROFILING_ENABLED", False)
+PROFILE_INTERVAL_MS: int = _env_int("PROFILE_INTERVAL_MS", 10)
+PROFILE_MAX_SECONDS: int = _env_int("PROFILE_MAX_SECONDS", 60)
+PROFILE_KEEP: int = _env_int("PROFILE_KEEP", 100)
+PROFILE_DIR: str = os.getenv("PROFILE_DIR", os.path.join(DATA_DIR, "profiles"))
@@ -0,0 +1,116 @@
+"""Request-scoped deadlines.
+
+Every API run gets a ``Deadline`` (``REQUEST_DEADLINE_SECONDS``, or sooner if
+the request asks for it). It travels in the LangGraph config
+(``configurable["deadline"]``) and, while a node runs, in ``current`` (set
+by ``app.tracing.instrument``), so code deep inside a node sees it without
+passing it around:
+
+- LLM calls clamp their timeout to the remaining time and stop retrying
+  when the next attempt would not fit (``app.agents.llm``).
+- Data fetches are not started, and search retries not slept for, once it
+  has passed (``app.agents.stock_info_agent``).
+- The API cancels the whole run — every fan-out with it — when it passes
+  or the client disconnects, and ``cancel`` makes worker threads still
+  fetching for the run see it as expired too.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+from app import metrics
+
+# Key of the deadline in a LangGraph config's "configurable" section
+CONFIG_KEY = "deadline"
+
+# Why a run was cancelled before its deadline
+_REASONS = {"disconnect": "client disconnected", "idle": "stream stalled"}
+
+
+class Deadline:
+    """Point in time (monotonic) by which a run has to be done; can be cancelled early."""
+
+    __slots__ = ("seconds", "at", "reason")
+
+    def __init__(self, seconds: float) -> None:
+        self.seconds = seconds
+        self.at = time.monotonic() + seconds
+        self.reason: Optional[str] = None
+
+    def remaining(self) -> float:
+        if self.reason is not None:
+            return 0.0
+        return max(0.0, self.at - time.monotonic())
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0.0
+
+    def cancel(self, reason: str) -> None:
+        """Expire now: ``reason`` is "deadline", "disconnect" or "idle"."""
+        if self.reason is None:
+            self.reason = reason
+            metrics.inc("runs_cancelled_total", reason=reason)
+
+    def describe(self) -> str:
+        return _REASONS.get(self.reason, f"deadline of {self.seconds:g}s exceeded")
+
+
+class DeadlineExceeded(TimeoutError):
+    """The run's deadline passed (or the run was cancelled) before the work was done."""
+
+    def __init__(self, deadline: Deadline, where: str) -> None:
+        super().__init__(f"{where}: {deadline.describe()}")
+        self.where = where
+
+
+current: ContextVar[Optional[Deadline]] = ContextVar("current_deadline", default=None)
+
+
+def from_config(config: Optional[dict]) -> Optional[Deadline]:
+    return ((config or {}).get("configurable") or {}).get(CONFIG_KEY)
+
+
+@contextmanager
+def scope(deadline: Optional[Deadline]) -> Iterator[None]:
+    """Make ``deadline`` the current one while the block runs (no-op for None)."""
+    if deadline is None:
+        yield
+        return
+    token = current.set(deadline)
+    try:
+        yield
+    finally:
+        current.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current run (None without a deadline)."""
+    deadline = current.get()
+    return deadline.remaining() if deadline is not None else None
+
+
+def expired() -> bool:
+    deadline = current.get()
+    return deadline is not None and deadline.expired()
+
+
+def check(where: str) -> None:
+    """Raise ``DeadlineExceeded`` if the current run is out of time."""
+    deadline = current.get()
+    if deadline is not None and deadline.expired():
+        metrics.inc("deadline_exceeded_total", where=where)
+        raise DeadlineExceeded(deadline, where)
+
+
+def exceeded(where: str) -> DeadlineExceeded:
+    """The error for work at ``where`` cut short by the current deadline."""
+    metrics.inc("deadline_exceeded_total", where=where)
+    return DeadlineExceeded(current.get(), where)
+
+
+def clamp(timeout: float) -> float:
+    """``timeout`` limited to the time the current run has left."""
+    left = remaining()
+    return timeout if left is None else max(0.001, min(timeout, left))
@@ -0,0 +1,107 @@
+"""Analysis depth tiers and their latency targets.
+
+A run's tier (``quick`` / ``standard`` / ``deep``, see ``DEPTH_TIERS`` in
+``app.config``) decides how much work it does: which searches and profile
+dimensions run, how many personas analyse the stock and the token budgets of
+the analyses and the report. Each tier also carries a target latency. It is
+split into stage deadlines measured from the start of the run, and
+``gather_optional`` drops optional work (searches, profile dimensions,
+persona analyses) still running when its stage's deadline passes. Whatever
+was dropped is listed in the run's ``trimmed`` state.
+"""
+
+import time
+import asyncio
+import logging
+from typing import Any, Awaitable, Iterable, List, Optional, Sequence
+
+from app.config import DEPTH_TIERS, DEFAULT_DEPTH
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+# Share of the target latency, counted from the start of the run, by which
+# each stage's optional work has to be done; the report gets the rest
+STAGE_SHARES = {"data": 0.25, "profile": 0.5, "analysis": 0.85}
+
+
+def tier_name(state: dict) -> str:
+    name = state.get("depth") or DEFAULT_DEPTH
+    if name not in DEPTH_TIERS:
+        logger.warning("Unknown depth %r, using %r", name, DEFAULT_DEPTH)
+        return DEFAULT_DEPTH if DEFAULT_DEPTH in DEPTH_TIERS else "standard"
+    return name
+
+
+def tier(state: dict) -> dict:
+    """Settings of the run's depth tier."""
+    return DEPTH_TIERS[tier_name(state)]
+
+
+def deadline(state: dict, stage: str) -> Optional[float]:
+    """Wall-clock time by which ``stage``'s optional work must be done (None = no limit)."""
+    target = tier(state)["target_seconds"]
+    started = state.get("started_at")
+    if not target or started is None:
+        return None
+    return started + target * STAGE_SHARES[stage]
+
+
+def is_complete(state: dict) -> bool:
+    """Whether the run did all the work a full analysis does (and may be stored for reuse)."""
+    settings = tier(state)
+    return settings["searches"] is None and settings["dimensions"] is None and not state.get("trimmed")
+
+
+def record_trim(state: dict, stage: str, items: Iterable[str]) -> List[str]:
+    """Log dropped work; returns the run's updated ``trimmed`` list."""
+    items = list(items)
+    name = tier_name(state)
+    metrics.inc("depth_trimmed_total", len(items), depth=name, stage=stage)
+    logger.warning("Latency target of %s run: dropped %d %s item(s): %s", name, len(items), stage, items)
+    return list(state.get("trimmed", [])) + [f"{stage}: {item}" for item in items]
+
+
+def finish(state: dict) -> None:
+    """Record the run's latency against its tier's target."""
+    started = state.get("started_at")
+    if started is None:
+        return
+    name = tier_name(state)
+    elapsed = time.time() - started
+    target = DEPTH_TIERS[name]["target_seconds"]
+    metrics.observe("run_latency_seconds", elapsed, depth=name)
+    if target and elapsed > target:
+        metrics.inc("depth_target_missed_total", depth=name)
+        logger.info("%s run took %.1fs (target %ds)", name, elapsed, target)
+
+
+async def gather_optional(aws: Sequence[Awaitable], deadline: Optional[float], min_done: int = 0) -> List[Any]:
+    """Run ``aws`` concurrently like ``asyncio.gather``, but stop at ``deadline``.
+
+    Whatever is still running at the deadline is cancelled and returns None,
+    once at least ``min_done`` of them have finished. The first exception is
+    raised (and the rest cancelled) as soon as it happens.
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    pending = set(tasks)
+    try:
+        while pending:
+            late = deadline is not None and time.time() >= deadline
+            if late and len(tasks) - len(pending) >= min_done:
+                break
+            timeout = None if deadline is None or late else deadline - time.time()
+            done, pending = await asyncio.wait(
+                pending,
+                timeout=timeout,
+                return_when=asyncio.FIRST_COMPLETED if late else asyncio.FIRST_EXCEPTION,
+            )
+            for task in done:
+                if not task.cancelled() and task.exception() is not None:
+                    raise task.exception()
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+    return [None if task in pending else task.result() for task in tasks]
@@ -0,0 +1,292 @@
+"""Local fundamentals store for the ticker universe.
+
+Holds the yfinance info fields and financial statements of the
+``FUNDAMENTALS_UNIVERSE`` tickers so analyses of them need no network call
+(``stock_info_agent._load_yfinance`` reads from here while a ticker is
+younger than ``FUNDAMENTALS_MAX_AGE_HOURS``).
+
+Layout under ``FUNDAMENTALS_DIR``: every write produces a new generation
+directory and then atomically repoints ``CURRENT`` at it, so readers (also
+in other processes) never see a half-written store. A generation holds
+
+- ``rows.npy``: one row per statement value, as columns ``ticker`` /
+  ``statement`` / ``period`` / ``item`` (codes) and ``value`` (float64),
+  memory-mapped on read; each ticker's rows are contiguous.
+- ``index.json``: the code tables, each ticker's row range and fetch time,
+  and its info fields (few per ticker, mixed types, kept as JSON) along
+  with the list of fields kept.
+
+``run_refresher`` keeps the universe fresh in the background: every
+``FUNDAMENTALS_REFRESH_SECONDS`` it refetches the ``FUNDAMENTALS_BATCH_SIZE``
+stalest tickers and writes them as one generation. The store is bypassed
+while cassettes are on, so recordings stay reproducible.
+"""
+
+import os
+import json
+import time
+import shutil
+import asyncio
+import logging
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from app.config import (
+    FUNDAMENTALS_DIR,
+    FUNDAMENTALS_UNIVERSE,
+    FUNDAMENTALS_MAX_AGE_SECONDS,
+    FUNDAMENTALS_BATCH_SIZE,
+    FUNDAMENTALS_CONCURRENCY,
+    FUNDAMENTALS_REFRESH_SECONDS,
+)
+from app import metrics, cassette
+from app.breaker import CircuitOpenError
+
+logger = logging.getLogger(__name__)
+
+ROW_DTYPE = np.dtype([
+    ("ticker", "<u4"), ("statement", "u1"), ("period", "<u4"), ("item", "<u4"), ("value", "<f8"),
+])
+
+_CURRENT = "CURRENT"
+# Tickers are refetched once they are this share of the max age old, so
+# that they are refreshed before analyses would find them stale
+_REFRESH_AT = 0.5
+# Generations kept besides the current one (readers may still be on them)
+_KEEP_GENERATIONS = 1
+
+_write_lock = threading.Lock()
+_read_lock = threading.Lock()
+_generation: Optional["_Generation"] = None
+
+
+class _Generation:
+    """One immutable version of the store."""
+
+    def __init__(self, name: str) -> None:
+        path = os.path.join(FUNDAMENTALS_DIR, name)
+        self.name = name
+        with open(os.path.join(path, "index.json"), encoding="utf-8") as f:
+            self.index = json.load(f)
+        rows_path = os.path.join(path, "rows.npy")
+        # np.load cannot memory-map an empty array file
+        self.rows = np.load(rows_path, mmap_mode="r") if os.path.getsize(rows_path) > 128 else np.empty(0, ROW_DTYPE)
+
+    def entry(self, ticker: str) -> Optional[dict]:
+        return self.index["tickers"].get(ticker)
+
+    def rows_of(self, ticker: str) -> np.ndarray:
+        start, end = self.index["tickers"][ticker]["rows"]
+        return self.rows[start:end]
+
+    def load(self, ticker: str) -> dict:
+        """``{heading: data}`` of ``ticker``, as ``stock_info_agent.format_yfinance`` takes it."""
+        statements, periods, items = self.index["statements"], self.index["periods"], self.index["items"]
+        data = {self.index["info_heading"]: self.index["tickers"][ticker]["info"]}
+        data.update({heading: {} for heading in statements})
+        for row in self.rows_of(ticker):
+            heading = statements[row["statement"]]
+            period = data[heading].setdefault(periods[row["period"]], {})
+            period[items[row["item"]]] = float(row["value"])
+        return data
+
+
+def _current() -> Optional[_Generation]:
+    """The generation ``CURRENT`` points at (None while the store is empty)."""
+    global _generation
+    try:
+        with open(os.path.join(FUNDAMENTALS_DIR, _CURRENT), encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return None
+    with _read_lock:
+        if _generation is None or _generation.name != name:
+            _generation = _Generation(name)
+        return _generation
+
+
+def get(ticker: str, max_age: float = FUNDAMENTALS_MAX_AGE_SECONDS) -> Optional[dict]:
+    """Stored data of ``ticker`` if it is younger than ``max_age`` seconds (None otherwise)."""
+    if cassette.enabled():
+        return None
+    try:
+        generation = _current()
+    except (OSError, ValueError) as exc:
+        logger.warning("Fundamentals store unreadable: %s", exc)
+        return None
+    entry = generation.entry(ticker) if generation is not None else None
+    if entry is None:
+        metrics.inc("fundamentals_store_requests_total", result="miss")
+        return None
+    if time.time() - entry["fetched_at"] > max_age:
+        metrics.inc("fundamentals_store_requests_total", result="stale")
+        return None
+    metrics.inc("fundamentals_store_requests_total", result="hit")
+    return generation.load(ticker)
+
+
+def entries() -> Tuple[Optional[str], List[str], Dict[str, dict]]:
+    """Name of the current generation, the info fields kept and ``{ticker: {"fetched_at", "info", ...}}``."""
+    generation = _current()
+    if generation is None:
+        return None, [], {}
+    return generation.name, generation.index.get("info_keys", []), generation.index["tickers"]
+
+
+def fetched_at(tickers: Iterable[str]) -> Dict[str, Optional[float]]:
+    """When each ticker was last stored (None = never)."""
+    generation = _current()
+    return {
+        t: (generation.entry(t) or {}).get("fetched_at") if generation is not None else None
+        for t in tickers
+    }
+
+
+def put_many(fetched: Dict[str, dict]) -> None:
+    """Write freshly fetched ``{ticker: {heading: data}}`` as a new generation.
+
+    Tickers not in ``fetched`` are carried over unchanged.
+    """
+    from app.agents.stock_info_agent import YF_INFO, YF_STATEMENTS, _YF_INFO_KEYS
+
+    if not fetched:
+        return
+    with _write_lock:
+        old = _current()
+        index = {
+            "info_heading": YF_INFO,
+            "info_keys": list(_YF_INFO_KEYS),
+            "statements": list(YF_STATEMENTS),
+            "periods": list(old.index["periods"]) if old else [],
+            "items": list(old.index["items"]) if old else [],
+            "tickers": {},
+        }
+        codes = {key: {v: i for i, v in enumerate(index[key])} for key in ("periods", "items")}
+
+        def code(key: str, value: str) -> int:
+            table = codes[key]
+            if value not in table:
+                table[value] = len(index[key])
+                index[key].append(value)
+            return table[value]
+
+        parts: List[np.ndarray] = []
+        offset = 0
+        kept = [t for t in (old.index["tickers"] if old else {}) if t not in fetched]
+        for ticker in kept + list(fetched):
+            if ticker in fetched:
+                rows = []
+                for s, heading in enumerate(index["statements"]):
+                    for period, values in fetched[ticker].get(heading, {}).items():
+                        p = code("periods", str(period))
+                        for item, value in values.items():
+                            rows.append((0, s, p, code("items", str(item)), _number(value)))
+                part = np.array(rows, dtype=ROW_DTYPE)
+                entry = {"fetched_at": time.time(), "info": fetched[ticker].get(YF_INFO, {})}
+            else:
+                part = np.array(old.rows_of(ticker))
+                entry = dict(old.entry(ticker))
+            part["ticker"] = len(index["tickers"])
+            entry["rows"] = [offset, offset + len(part)]
+            index["tickers"][ticker] = entry
+            parts.append(part)
+            offset += len(part)
+
+        rows = np.concatenate(parts) if parts else np.empty(0, ROW_DTYPE)
+        _write_generation(index, rows)
+    metrics.inc("fundamentals_store_writes_total")
+    logger.info("Fundamentals store: wrote %d ticker(s), %d in store, %d rows",
+                len(fetched), len(index["tickers"]), len(rows))
+
+
+def _number(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return float("nan")
+
+
+def _write_generation(index: dict, rows: np.ndarray) -> None:
+    """Write a generation and point ``CURRENT`` at it (called with the write lock held)."""
+    name = f"gen-{time.time_ns()}"
+    path = os.path.join(FUNDAMENTALS_DIR, name)
+    os.makedirs(path)
+    np.save(os.path.join(path, "rows.npy"), rows)
+    with open(os.path.join(path, "index.json"), "w", encoding="utf-8") as f:
+        json.dump(index, f, default=str)
+    pointer = os.path.join(FUNDAMENTALS_DIR, _CURRENT)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(pointer + ".tmp", pointer)
+
+    generations = sorted(d for d in os.listdir(FUNDAMENTALS_DIR) if d.startswith("gen-") and d != name)
+    for stale in generations[:max(0, len(generations) - _KEEP_GENERATIONS)]:
+        shutil.rmtree(os.path.join(FUNDAMENTALS_DIR, stale), ignore_errors=True)
+
+
+def due(tickers: Iterable[str], limit: int) -> List[str]:
+    """Up to ``limit`` of ``tickers`` that need refreshing, never-fetched and stalest first."""
+    refresh_before = time.time() - FUNDAMENTALS_MAX_AGE_SECONDS * _REFRESH_AT
+    ages = fetched_at(tickers)
+    stale = [t for t, at in ages.items() if at is None or at < refresh_before]
+    return sorted(stale, key=lambda t: ages[t] or 0.0)[:limit]
+
+
+async def refresh(tickers: List[str]) -> int:
+    """Refetch ``tickers`` (at most ``FUNDAMENTALS_CONCURRENCY`` at once) and store them.
+
+    Returns how many were stored; tickers that failed keep their old data.
+    """
+    from app.agents.stock_info_agent import fetch_yfinance_data, run_blocking
+
+    semaphore = asyncio.Semaphore(FUNDAMENTALS_CONCURRENCY)
+
+    async def fetch(ticker: str) -> dict:
+        async with semaphore:
+            return await run_blocking(fetch_yfinance_data, ticker)
+
+    results = await asyncio.gather(*[fetch(t) for t in tickers], return_exceptions=True)
+    fetched = {}
+    for ticker, result in zip(tickers, results):
+        if isinstance(result, BaseException):
+            metrics.inc("fundamentals_refresh_failures_total")
+            logger.warning("Fundamentals refresh of %s failed: %s", ticker, result)
+        else:
+            fetched[ticker] = result
+    await asyncio.to_thread(put_many, fetched)
+    return len(fetched)
+
+
+async def run_refresher() -> None:
+    """Keep ``FUNDAMENTALS_UNIVERSE`` fresh, one batch per refresh window, until cancelled."""
+    logger.info("Fundamentals refresher: %d ticker(s), %d per %.0fs",
+                len(FUNDAMENTALS_UNIVERSE), FUNDAMENTALS_BATCH_SIZE, FUNDAMENTALS_REFRESH_SECONDS)
+    while True:
+        try:
+            batch = await asyncio.to_thread(due, FUNDAMENTALS_UNIVERSE, FUNDAMENTALS_BATCH_SIZE)
+            if batch:
+                stored = await refresh(batch)
+                logger.info("Fundamentals refresher: stored %d/%d", stored, len(batch))
+        except CircuitOpenError as exc:
+            logger.warning("Fundamentals refresh skipped: %s", exc)
+        except Exception:
+            logger.exception("Fundamentals refresh failed")
+        await asyncio.sleep(FUNDAMENTALS_REFRESH_SECONDS)
+
+
+def stats() -> dict:
+    """Tickers, freshness and size of the store, for ``/metrics``."""
+    generation = _current()
+    if generation is None:
+        return {"tickers": 0, "fresh": 0, "rows": 0, "universe": len(FUNDAMENTALS_UNIVERSE)}
+    now = time.time()
+    entries = generation.index["tickers"].values()
+    return {
+        "generation": generation.name,
+        "tickers": len(entries),
+        "fresh": sum(1 for e in entries if now - e["fetched_at"] <= FUNDAMENTALS_MAX_AGE_SECONDS),
+        "rows": len(generation.rows),
+        "universe": len(FUNDAMENTALS_UNIVERSE),
+    }
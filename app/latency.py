@@ -0,0 +1,129 @@
+"""Observed LLM latencies and the timeouts derived from them.
+
+Every LLM attempt is recorded per (route, model, prompt-size bucket), where
+the route is the node kind making the call (planner, dimension, report, ...;
+see ``LLM_ROUTES``). Once a key has enough samples its timeout becomes
+``p99 x LLM_TIMEOUT_P99_FACTOR`` clamped to ``[LLM_TIMEOUT_FLOOR, route
+timeout]``, and the number of retries is limited so that all attempts
+together fit into the route timeout. Keys without enough samples borrow from the next larger prompt bucket of the same
+route and model, or fall back to the static route configuration.
+"""
+
+import threading
+from collections import deque
+from typing import Deque, Dict, Optional, Tuple
+
+from app.config import (
+    ADAPTIVE_TIMEOUTS,
+    LLM_MAX_RETRIES,
+    LLM_ROUTES,
+    LLM_TIMEOUT_FLOOR,
+    LLM_TIMEOUT_P99_FACTOR,
+    LLM_TIMEOUT_MIN_SAMPLES,
+    STREAM_IDLE_TIMEOUT,
+)
+from app.metrics import percentile
+
+# Samples kept per key; small so the timeout follows the backend's current speed
+_WINDOW = 256
+
+Key = Tuple[str, str, int]
+
+_lock = threading.Lock()
+_samples: Dict[Key, Deque[float]] = {}
+
+
+def prompt_bucket(prompt_chars: int) -> int:
+    """Prompt-size bucket: upper bound in k-tokens (~4 chars each), powers of two."""
+    tokens = prompt_chars // 4
+    bucket = 1
+    while bucket * 1000 < tokens:
+        bucket *= 2
+    return bucket
+
+
+def observe(route: str, model: str, bucket: int, seconds: float) -> None:
+    """Record the duration of one attempt (timed-out attempts record the timeout)."""
+    with _lock:
+        samples = _samples.get((route, model, bucket))
+        if samples is None:
+            samples = _samples[(route, model, bucket)] = deque(maxlen=_WINDOW)
+        samples.append(seconds)
+
+
+def _p99(route: str, model: str, bucket: int) -> Optional[Tuple[float, int]]:
+    """p99 and sample count for the key, or the smallest larger bucket with enough samples."""
+    with _lock:
+        candidates = sorted(
+            (b, list(s)) for (r, m, b), s in _samples.items()
+            if r == route and m == model and b >= bucket and len(s) >= LLM_TIMEOUT_MIN_SAMPLES
+        )
+    if not candidates:
+        return None
+    _, samples = candidates[0]
+    return percentile(sorted(samples), 99), len(samples)
+
+
+def plan(route: str, model: str, bucket: int, ceiling: float) -> dict:
+    """Timeout and retry budget for a call.
+
+    Args:
+        route: LLM route making the call
+        model: Model name
+        bucket: ``prompt_bucket`` of the prompt
+        ceiling: Static route timeout; upper bound for the timeout and for
+            all attempts together once adaptive
+    """
+    observed = _p99(route, model, bucket) if ADAPTIVE_TIMEOUTS else None
+    if observed is None:
+        return {"timeout": ceiling, "max_retries": LLM_MAX_RETRIES, "source": "static"}
+    p99, count = observed
+    timeout = min(ceiling, max(LLM_TIMEOUT_FLOOR, p99 * LLM_TIMEOUT_P99_FACTOR))
+    attempts = max(1, int(ceiling // timeout))
+    return {
+        "timeout": round(timeout, 1),
+        "max_retries": min(LLM_MAX_RETRIES, attempts - 1),
+        "source": "p99",
+        "p99": round(p99, 3),
+        "samples": count,
+    }
+
+
+def stream_idle_timeout() -> float:
+    """How long a streamed run may go without an event before it is given up.
+
+    The slowest single LLM call (retries included) any route may currently
+    make, bounded by ``STREAM_IDLE_TIMEOUT``.
+    """
+    with _lock:
+        observed = {(r, m, b) for r, m, b in _samples}
+    budget = 0.0
+    for route, config in LLM_ROUTES.items():
+        buckets = [b for r, m, b in observed if r == route and m == config["model"]]
+        for bucket in buckets or [None]:
+            p = plan(route, config["model"], bucket, config["timeout"]) if bucket else None
+            # Unobserved routes count with one attempt at their static timeout
+            budget = max(budget, p["timeout"] * (p["max_retries"] + 1) if p else config["timeout"])
+    return min(STREAM_IDLE_TIMEOUT, max(LLM_TIMEOUT_FLOOR, budget))
+
+
+def snapshot() -> list:
+    """Observed latency and current timeout per key, for ``/metrics``."""
+    with _lock:
+        items = [(key, sorted(samples)) for key, samples in _samples.items()]
+    rows = []
+    for (route, model, bucket), ordered in sorted(items):
+        ceiling = LLM_ROUTES.get(route, LLM_ROUTES["default"])["timeout"]
+        current = plan(route, model, bucket, ceiling)
+        rows.append({
+            "route": route,
+            "model": model,
+            "prompt_ktokens": bucket,
+            "samples": len(ordered),
+            "p50": round(percentile(ordered, 50), 3),
+            "p99": round(percentile(ordered, 99), 3),
+            "timeout": current["timeout"],
+            "max_retries": current["max_retries"],
+            "source": current["source"],
+        })
+    return rows
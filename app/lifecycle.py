@@ -0,0 +1,133 @@
+"""Startup lifecycle: warm-up and readiness.
+
+Importing the app is kept cheap (heavy dependencies load lazily); the
+expensive one-time work happens here instead, right after startup:
+
+1. compile the LangGraph workflows
+2. parse every prompt template
+3. create the LLM client for every route and open a connection to the backend
+4. import yfinance, create the DuckDuckGo wrapper and start the data pool threads
+
+``/ready`` reports ``cold`` / ``warming`` / ``warm``, or ``degraded`` when a
+warm-up step failed, while ``/health`` keeps answering as soon as the process
+is up.
+"""
+
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional
+
+from app.config import LLM_ROUTES, DATA_POOL_WORKERS, WARMUP_LLM_CONNECT_TIMEOUT
+
+logger = logging.getLogger(__name__)
+
+_status = "cold"
+_steps: Dict[str, dict] = {}
+_started_at: Optional[float] = None
+_finished_at: Optional[float] = None
+
+
+async def _step(name: str, coro) -> None:
+    started = time.perf_counter()
+    try:
+        detail = await coro
+        _steps[name] = {"ok": True, "seconds": round(time.perf_counter() - started, 3), "detail": detail}
+    except Exception as exc:
+        logger.warning("Warm-up step %s failed: %s", name, exc)
+        _steps[name] = {"ok": False, "seconds": round(time.perf_counter() - started, 3), "error": str(exc)}
+
+
+async def _compile_graphs() -> str:
+    from app.agents.graph import get_decision_graph
+    from app.agents.comparison_agent import get_profile_subgraph
+
+    await asyncio.to_thread(get_decision_graph)
+    await asyncio.to_thread(get_profile_subgraph)
+    return "decision graph + comparison sub-graph"
+
+
+async def _load_prompts() -> str:
+    from app.agents.prompt_loader import preload_all
+
+    count = await asyncio.to_thread(preload_all)
+    return f"{count} prompt files"
+
+
+async def _warm_llm_clients() -> str:
+    from app.agents.llm import create_llm, is_backend_failure
+
+    clients = {}
+    for route in LLM_ROUTES:
+        clients.setdefault(LLM_ROUTES[route]["model"], create_llm(route))
+    # One cheap request per distinct model opens a pooled connection to the backend
+    results = await asyncio.gather(
+        *[asyncio.wait_for(c.root_async_client.models.list(), WARMUP_LLM_CONNECT_TIMEOUT)
+          for c in clients.values()],
+        return_exceptions=True,
+    )
+    # An error reply (e.g. 404 from a backend without /models) still proves it is reachable
+    failed = [m for m, r in zip(clients, results)
+              if isinstance(r, BaseException) and (isinstance(r, asyncio.TimeoutError) or is_backend_failure(r))]
+    if failed:
+        # Marks the step failed, so readiness reports the process degraded
+        raise ConnectionError(
+            f"LLM backend not reachable for {len(failed)}/{len(clients)} models: {', '.join(failed)}"
+        )
+    return f"{len(LLM_ROUTES)} routes, {len(clients)} models connected"
+
+
+async def _warm_data_sources() -> str:
+    from app.agents import stock_info_agent
+
+    def _load():
+        import yfinance  # noqa: F401  (pulls in pandas)
+
+        stock_info_agent.get_ddg()
+
+    # Runs on the shared data pool, which also starts its first worker thread
+    await stock_info_agent.run_blocking(_load)
+    return f"yfinance + DuckDuckGo, data pool of {DATA_POOL_WORKERS} workers"
+
+
+async def warm_up() -> None:
+    """Run every warm-up step; failures are logged and reported, not raised."""
+    global _status, _started_at, _finished_at
+    if _status != "cold":
+        return
+    _status = "warming"
+    _started_at = time.time()
+    logger.info("Warm-up started")
+    await _step("graph", _compile_graphs())
+    await asyncio.gather(
+        _step("prompts", _load_prompts()),
+        _step("llm", _warm_llm_clients()),
+        _step("data", _warm_data_sources()),
+    )
+    _finished_at = time.time()
+    failed = _failed_steps()
+    _status = "degraded" if failed else "warm"
+    if failed:
+        logger.error("Warm-up finished in %.2fs with failed steps: %s",
+                     _finished_at - _started_at, ", ".join(failed))
+    else:
+        logger.info("Warm-up finished in %.2fs", _finished_at - _started_at)
+
+
+def _failed_steps() -> List[str]:
+    return [name for name, step in _steps.items() if not step["ok"]]
+
+
+def is_ready() -> bool:
+    return _status == "warm"
+
+
+def readiness() -> dict:
+    """Current warm-up state for the ``/ready`` endpoint."""
+    return {
+        "status": _status,
+        "ready": is_ready(),
+        "failed_steps": _failed_steps(),
+        "warmup_seconds": round(_finished_at - _started_at, 3) if _finished_at and _started_at else None,
+        "steps": _steps,
+    }
@@ -0,0 +1,243 @@
+"""Exact-match LLM response cache.
+
+``CachingTransport`` sits under the httpx client of every ``create_llm``
+client whose route has caching on. A chat-completions request is keyed by a
+hash of its JSON body, which holds the model, all parameters, the messages
+and the output schema (``response_format`` / tools), so only byte-identical
+requests hit. Responses are stored raw in SQLite and replayed through the
+normal OpenAI/LangChain parsing. Entries expire after
+``LLM_CACHE_TTL_SECONDS``; the least recently used ones are evicted once the
+cache grows beyond ``LLM_CACHE_MAX_MB``. Streaming and sampled
+(``temperature > 0``) requests are never cached.
+"""
+
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, Optional
+
+import httpx
+
+from app.config import LLM_CACHE_PATH, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_BYTES
+from app.cassette import request_key
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_conn: Optional[sqlite3.Connection] = None
+_total_bytes: Optional[int] = None
+
+# Set by the caller around a request; the transport flags cache hits in it
+_hit_flag: ContextVar[Optional[dict]] = ContextVar("llm_cache_hit", default=None)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    route TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    created REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+"""
+
+_KEEP_HEADERS = ("content-type",)
+
+
+def _db() -> sqlite3.Connection:
+    """Shared connection (called with the lock held)."""
+    global _conn, _total_bytes
+    if _conn is None:
+        os.makedirs(os.path.dirname(LLM_CACHE_PATH) or ".", exist_ok=True)
+        _conn = sqlite3.connect(LLM_CACHE_PATH, check_same_thread=False, isolation_level=None)
+        _conn.execute("PRAGMA journal_mode=WAL")
+        _conn.executescript(_SCHEMA)
+        _total_bytes = _conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+    return _conn
+
+
+def lookup(key: str) -> Optional[dict]:
+    """Fresh entry for ``key`` (None if missing or expired)."""
+    now = time.time()
+    with _lock:
+        db = _db()
+        row = db.execute(
+            "SELECT status, headers, body, created FROM responses WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        status, headers, body, created = row
+        if now - created > LLM_CACHE_TTL_SECONDS:
+            _delete(db, key)
+            return None
+        db.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+    return {"status": status, "headers": json.loads(headers), "body": body}
+
+
+def _delete(db: sqlite3.Connection, key: str) -> None:
+    global _total_bytes
+    row = db.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+    if row is not None:
+        db.execute("DELETE FROM responses WHERE key = ?", (key,))
+        _total_bytes -= row[0]
+
+
+def store(key: str, route: str, status: int, headers: dict, body: bytes) -> None:
+    """Insert or replace an entry, then evict LRU entries above the size bound."""
+    global _total_bytes
+    now = time.time()
+    with _lock:
+        db = _db()
+        _delete(db, key)
+        db.execute(
+            "INSERT INTO responses (key, route, status, headers, body, size, created, last_used)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (key, route, status, json.dumps(headers), body, len(body), now, now),
+        )
+        _total_bytes += len(body)
+        evicted = 0
+        while _total_bytes > LLM_CACHE_MAX_BYTES:
+            oldest = db.execute(
+                "SELECT key FROM responses ORDER BY last_used LIMIT 1"
+            ).fetchone()
+            if oldest is None or oldest[0] == key:
+                break
+            _delete(db, oldest[0])
+            evicted += 1
+    if evicted:
+        metrics.inc("llm_cache_evictions_total", evicted)
+
+
+def stats() -> dict:
+    """Entries, size and hit ratio per route, for ``/metrics``."""
+    with _lock:
+        if _conn is None and not os.path.exists(LLM_CACHE_PATH):
+            entries, size = 0, 0
+        else:
+            entries, size = _db().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+    routes = {}
+    for series in metrics.snapshot()["counters"].get("llm_cache_requests_total", []):
+        route = series["labels"]["route"]
+        counts = routes.setdefault(route, {"hit": 0, "miss": 0})
+        counts[series["labels"]["result"]] += series["value"]
+    for counts in routes.values():
+        total = counts["hit"] + counts["miss"]
+        counts["hit_ratio"] = round(counts["hit"] / total, 3) if total else 0.0
+    return {"entries": entries, "bytes": size, "limit_bytes": LLM_CACHE_MAX_BYTES, "routes": routes}
+
+
+@contextmanager
+def watch_hits() -> Iterator[dict]:
+    """Yields a dict whose ``"hit"`` is True if a request inside was served from cache."""
+    flag = {"hit": False}
+    token = _hit_flag.set(flag)
+    try:
+        yield flag
+    finally:
+        _hit_flag.reset(token)
+
+
+def _cache_key(request: httpx.Request) -> Optional[str]:
+    """Key of a cacheable request (None for anything else)."""
+    if request.method != "POST" or not request.url.path.endswith("/chat/completions"):
+        return None
+    try:
+        body = json.loads(request.content)
+    except ValueError:
+        return None
+    if body.get("stream") or (body.get("temperature") or 0) > 0:
+        return None
+    return request_key("llm-cache", {"path": request.url.path, "body": body})
+
+
+def _response(request: httpx.Request, entry: dict) -> httpx.Response:
+    return httpx.Response(entry["status"], headers=entry["headers"], content=entry["body"], request=request)
+
+
+class CachingTransport(httpx.AsyncBaseTransport, httpx.BaseTransport):
+    """httpx transport answering repeated chat-completions requests from the cache."""
+
+    def __init__(self, route: str, inner_async: Optional[httpx.AsyncBaseTransport] = None,
+                 inner_sync: Optional[httpx.BaseTransport] = None) -> None:
+        self.route = route
+        self._inner_async = inner_async or httpx.AsyncHTTPTransport()
+        self._inner_sync = inner_sync or httpx.HTTPTransport()
+
+    def _hit(self, key: str) -> None:
+        metrics.inc("llm_cache_requests_total", route=self.route, result="hit")
+        flag = _hit_flag.get()
+        if flag is not None:
+            flag["hit"] = True
+        logger.debug("LLM cache hit: route=%s key=%s", self.route, key)
+
+    def _entry(self, response: httpx.Response, body: bytes) -> dict:
+        headers = {k: v for k, v in response.headers.items() if k.lower() in _KEEP_HEADERS}
+        return {"status": response.status_code, "headers": headers, "body": body}
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        key = _cache_key(request)
+        if key is None:
+            return await self._inner_async.handle_async_request(request)
+        try:
+            entry = await asyncio.to_thread(lookup, key)
+        except sqlite3.Error as exc:
+            logger.warning("LLM cache lookup failed: %s", exc)
+            entry = None
+        if entry is not None:
+            self._hit(key)
+            return _response(request, entry)
+        metrics.inc("llm_cache_requests_total", route=self.route, result="miss")
+        response = await self._inner_async.handle_async_request(request)
+        if response.status_code != 200:
+            return response
+        body = await response.aread()
+        await response.aclose()
+        entry = self._entry(response, body)
+        try:
+            await asyncio.to_thread(store, key, self.route, entry["status"], entry["headers"], body)
+        except sqlite3.Error as exc:
+            logger.warning("Could not store LLM cache entry: %s", exc)
+        return _response(request, entry)
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        key = _cache_key(request)
+        if key is None:
+            return self._inner_sync.handle_request(request)
+        try:
+            entry = lookup(key)
+        except sqlite3.Error as exc:
+            logger.warning("LLM cache lookup failed: %s", exc)
+            entry = None
+        if entry is not None:
+            self._hit(key)
+            return _response(request, entry)
+        metrics.inc("llm_cache_requests_total", route=self.route, result="miss")
+        response = self._inner_sync.handle_request(request)
+        if response.status_code != 200:
+            return response
+        body = response.read()
+        response.close()
+        entry = self._entry(response, body)
+        try:
+            store(key, self.route, entry["status"], entry["headers"], body)
+        except sqlite3.Error as exc:
+            logger.warning("Could not store LLM cache entry: %s", exc)
+        return _response(request, entry)
+
+    async def aclose(self) -> None:
+        await self._inner_async.aclose()
+
+    def close(self) -> None:
+        self._inner_sync.close()
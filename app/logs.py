@@ -0,0 +1,194 @@
+"""Logging setup shared by the API and the CLI.
+
+Logging must not block the event loop. A record is only put on a queue by
+the thread that logs it. A listener thread formats and writes it. The
+message is rendered on the logging thread when its arguments could change
+before the listener gets to them; arguments that are immutable scalars, or
+wrapped in ``Lazy``, are rendered by the listener. Each record carries the
+run ID and graph node of the code that logged it (``app.tracing``),
+including blocking work in worker threads. ``LOG_FORMAT=json`` writes one
+JSON object per line. ``text`` writes the classic format, with the run ID
+after the logger name.
+
+High-volume per-call logs of the API are sampled: below WARNING, each call
+site may log ``LOG_SAMPLE_PER_SECOND`` records per second. Later ones in the
+same second are dropped and counted, and the next record that call site
+writes reports them as ``sampled_out``. Warnings and errors are never
+sampled, nor is anything at DEBUG level or in the CLI.
+"""
+
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+import logging.handlers
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.config import LOG_FORMAT, LOG_SAMPLE_PER_SECOND
+from app import metrics, tracing
+
+# Libraries that log every request at INFO
+NOISY_LOGGERS = ("httpx", "httpcore", "openai", "urllib3", "langchain")
+# uvicorn's loggers write to stderr themselves; they go through the queue too
+SERVER_LOGGERS = ("uvicorn", "uvicorn.error", "uvicorn.access")
+
+_TEXT_FORMAT = "%(asctime)s %(levelname)-8s [%(name)s]%(run)s %(message)s"
+
+# Arguments the caller cannot change after logging: rendered by the listener
+_IMMUTABLE = (str, int, float, bool, bytes, type(None))
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class Lazy:
+    """A log argument computed by the listener thread: ``Lazy(func, *args)``.
+
+    For expensive renderings of values that no longer change once logged.
+    """
+
+    __slots__ = ("func", "args")
+
+    def __init__(self, func: Callable[..., Any], *args: Any) -> None:
+        self.func = func
+        self.args = args
+
+    def __str__(self) -> str:
+        return str(self.func(*self.args))
+
+
+class _ContextFilter(logging.Filter):
+    """Tag records with the run and node of the code logging them."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        run, node = tracing.current_run.get(), tracing.current_node.get()
+        if run is None and node is None:
+            run, node = tracing.thread_tags(threading.get_ident()) or (None, None)
+        record.run_id = run
+        record.node = node
+        return True
+
+
+class _Sampler(logging.Filter):
+    """Let each call site log at most ``per_second`` records per second below WARNING."""
+
+    def __init__(self, per_second: int) -> None:
+        super().__init__()
+        self.per_second = per_second
+        self._lock = threading.Lock()
+        # call site -> [second, records logged in it, records dropped since the last one logged]
+        self._sites: Dict[Tuple[str, int], List[int]] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING or self.per_second <= 0:
+            return True
+        second = int(record.created)
+        with self._lock:
+            site = self._sites.setdefault((record.pathname, record.lineno), [second, 0, 0])
+            if site[0] != second:
+                site[0], site[1] = second, 0
+            if site[1] >= self.per_second:
+                site[2] += 1
+                metrics.inc("log_records_sampled_out_total", logger=record.name)
+                return False
+            site[1] += 1
+            dropped, site[2] = site[2], 0
+        if dropped:
+            record.sampled_out = dropped
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Enqueue records, rendering their message now only if its arguments could change.
+
+    The stdlib handler always renders the message on the logging thread;
+    records stay in this process, so immutable arguments can be carried
+    across to the listener as they are.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        args = record.args
+        # A single mapping argument is the mapping itself (``%(name)s`` or a dict logged with ``%s``)
+        if args and (isinstance(args, dict) or not all(isinstance(arg, _IMMUTABLE + (Lazy,)) for arg in args)):
+            record.msg = record.getMessage()
+            record.args = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key in ("run_id", "node", "sampled_out"):
+            value = getattr(record, key, None)
+            if value is not None:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """The classic one-line format, with the run ID after the logger name."""
+
+    def __init__(self) -> None:
+        super().__init__(_TEXT_FORMAT, datefmt="%Y-%m-%d %H:%M:%S")
+
+    def format(self, record: logging.LogRecord) -> str:
+        run_id = getattr(record, "run_id", None)
+        record.run = f" [{run_id}]" if run_id else ""
+        text = super().format(record)
+        sampled_out = getattr(record, "sampled_out", None)
+        return f"{text} (+{sampled_out} similar dropped)" if sampled_out else text
+
+
+def setup(level: str, stream=None, default_format: str = "json", sampling: bool = True) -> None:
+    """Route all logging through a queue to ``stream`` (stderr); idempotent.
+
+    ``default_format`` applies unless ``LOG_FORMAT`` is set. With
+    ``sampling`` (and a level above DEBUG), high-volume call sites are sampled.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    output = logging.StreamHandler(stream or sys.stderr)
+    output.setFormatter(JsonFormatter() if (LOG_FORMAT or default_format) == "json" else TextFormatter())
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    handler = _QueueHandler(records)
+    handler.addFilter(_ContextFilter())
+    if sampling and level != "DEBUG":
+        handler.addFilter(_Sampler(LOG_SAMPLE_PER_SECOND))
+
+    root = logging.getLogger()
+    for existing in root.handlers[:]:
+        root.removeHandler(existing)
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, level, logging.INFO))
+    if level != "DEBUG":
+        for name in NOISY_LOGGERS:
+            logging.getLogger(name).setLevel(logging.WARNING)
+    for name in SERVER_LOGGERS:
+        server_logger = logging.getLogger(name)
+        for existing in server_logger.handlers[:]:
+            server_logger.removeHandler(existing)
+        server_logger.propagate = True
+
+    _listener = logging.handlers.QueueListener(records, output, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown)
+
+
+def shutdown() -> None:
+    """Write out queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
@@ -0,0 +1,86 @@
+"""Event-loop lag monitor and blocking-call detector.
+
+A task on the event loop sleeps for a fixed interval and records how late it
+wakes up as ``event_loop_lag_seconds`` (on ``/metrics``). Any synchronous
+work in a coroutine — file I/O, a big ``json.dumps``, a blocking HTTP call —
+shows up there because it delays every other task.
+
+With ``LOOP_BLOCK_DEBUG`` a watchdog thread also notices when the loop has
+not ticked for longer than ``LOOP_BLOCK_THRESHOLD_MS``, grabs the loop
+thread's stack while it is still blocked, and logs it together with the
+graph node that was running (see ``app.tracing``) once the loop is back.
+"""
+
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from typing import Dict, Optional
+
+from app.config import LOOP_MONITOR_INTERVAL_MS, LOOP_BLOCK_DEBUG, LOOP_BLOCK_THRESHOLD_MS
+from app import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+_interval = LOOP_MONITOR_INTERVAL_MS / 1000
+_threshold = LOOP_BLOCK_THRESHOLD_MS / 1000
+
+# Last tick of the sampler (monotonic), read by the watchdog thread
+_last_tick = 0.0
+# Stacks captured by the watchdog, keyed by the tick they stalled after
+_captured: Dict[float, dict] = {}
+
+
+def _watchdog(loop: asyncio.AbstractEventLoop, loop_thread_id: int, stop: threading.Event) -> None:
+    while not stop.wait(_threshold / 2):
+        tick = _last_tick
+        if not tick or tick in _captured:
+            continue
+        if time.monotonic() - tick < _interval + _threshold:
+            continue
+        frame = sys._current_frames().get(loop_thread_id)
+        _captured[tick] = {
+            "node": tracing.running_node(loop),
+            "stack": "".join(traceback.format_stack(frame)) if frame is not None else "",
+        }
+
+
+def _report(tick: float, lag: float) -> None:
+    """Log a blocked loop once it is running again."""
+    captured: Optional[dict] = _captured.pop(tick, None)
+    _captured.clear()
+    node = captured["node"] if captured else None
+    metrics.inc("event_loop_blocked_total", node=node or "unknown")
+    if captured and captured["stack"]:
+        logger.warning(
+            "Event loop blocked for %.0fms (node: %s); stack while blocked:\n%s",
+            lag * 1000, node or "unknown", captured["stack"],
+        )
+    else:
+        logger.warning("Event loop blocked for %.0fms (node: %s)", lag * 1000, node or "unknown")
+
+
+async def run() -> None:
+    """Sample loop lag forever (start with ``asyncio.create_task``)."""
+    global _last_tick
+    loop = asyncio.get_running_loop()
+    stop = threading.Event()
+    if LOOP_BLOCK_DEBUG:
+        tracing.install(loop)
+        threading.Thread(
+            target=_watchdog, args=(loop, threading.get_ident(), stop),
+            name="loop-watchdog", daemon=True,
+        ).start()
+        logger.info("Blocking-call detector on (threshold %dms)", LOOP_BLOCK_THRESHOLD_MS)
+    try:
+        while True:
+            _last_tick = time.monotonic()
+            await asyncio.sleep(_interval)
+            lag = max(0.0, time.monotonic() - _last_tick - _interval)
+            metrics.observe("event_loop_lag_seconds", lag)
+            if LOOP_BLOCK_DEBUG and lag >= _threshold:
+                _report(_last_tick, lag)
+    finally:
+        stop.set()
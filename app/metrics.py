@@ -0,0 +1,97 @@
+"""In-process metrics registry.
+
+Counters and latency summaries keyed by a metric name plus a small set of
+labels. Summaries keep a bounded window of recent samples so percentiles
+reflect current behaviour. Everything is exposed as JSON on ``/metrics``.
+"""
+
+import math
+import threading
+from collections import deque
+from typing import Deque, Dict, Tuple
+
+# Samples kept per summary for percentile estimates
+_WINDOW = 1024
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+_counters: Dict[str, Dict[LabelKey, float]] = {}
+_summaries: Dict[str, Dict[LabelKey, "_Summary"]] = {}
+
+
+class _Summary:
+    """Running count/sum/max plus a window of recent samples."""
+
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: Deque[float] = deque(maxlen=_WINDOW)
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        self.samples.append(value)
+
+    def snapshot(self) -> dict:
+        ordered = sorted(self.samples)
+        return {
+            "count": self.count,
+            "sum": round(self.total, 6),
+            "avg": round(self.total / self.count, 6) if self.count else 0.0,
+            "max": round(self.max, 6),
+            "p50": round(percentile(ordered, 50), 6),
+            "p90": round(percentile(ordered, 90), 6),
+            "p99": round(percentile(ordered, 99), 6),
+        }
+
+
+def percentile(ordered: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list (0.0 when empty)."""
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, math.ceil(pct / 100.0 * len(ordered)) - 1))
+    return float(ordered[rank])
+
+
+def _key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    """Add ``value`` to the counter ``name`` for the given labels."""
+    key = _key(labels)
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[key] = series.get(key, 0) + value
+
+
+def observe(name: str, value: float, **labels) -> None:
+    """Record one sample (e.g. a latency in seconds) in the summary ``name``."""
+    key = _key(labels)
+    with _lock:
+        _summaries.setdefault(name, {}).setdefault(key, _Summary()).add(value)
+
+
+def counter_value(name: str, **labels) -> float:
+    """Current value of a counter (0 if never incremented)."""
+    with _lock:
+        return _counters.get(name, {}).get(_key(labels), 0)
+
+
+def snapshot() -> dict:
+    """JSON-safe view of every counter and summary."""
+    with _lock:
+        counters = {
+            name: [{"labels": dict(k), "value": v} for k, v in series.items()]
+            for name, series in _counters.items()
+        }
+        summaries = {
+            name: [{"labels": dict(k), **s.snapshot()} for k, s in series.items()]
+            for name, series in _summaries.items()
+        }
+    return {"counters": counters, "summaries": summaries}
@@ -0,0 +1,332 @@
+"""Daily price history and technical indicators.
+
+``history`` keeps each ticker's daily closes under ``PRICES_DIR`` as a
+compact numpy array (``<TICKER>.npy``: day number since 1970-01-01, adjusted
+close). Tickers whose file is older than ``PRICES_MAX_AGE_HOURS`` are
+brought up to date with one bulk yfinance request for all of them, which
+only asks for the bars since the last cached ones. If Yahoo's adjusted
+history no longer matches the cache (a split or dividend re-adjusted it),
+the ticker's full history is loaded again.
+
+``indicators`` computes returns, volatility, drawdowns, moving averages and
+strength relative to the benchmark for all tickers at once, as vectorized
+numpy operations on one (ticker x day) matrix of closes.
+"""
+
+import os
+import time
+import logging
+import threading
+import warnings
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+from app.config import PRICES_DIR, PRICES_MAX_AGE_SECONDS, PRICES_HISTORY_DAYS, PRICES_BENCHMARK
+from app import metrics
+from app import deadline as run_deadline
+from app.breaker import get_breaker
+
+logger = logging.getLogger(__name__)
+
+BAR_DTYPE = np.dtype([("day", "<i4"), ("close", "<f8")])
+
+TRADING_DAYS = 252
+# Bars per period of the return columns
+PERIODS = {"1m": 21, "3m": 63, "6m": 126, "1y": TRADING_DAYS}
+
+# Indicator -> (table heading, format)
+COLUMNS = {
+    "close": ("Close", "price"),
+    "return_1m": ("1M", "pct"),
+    "return_3m": ("3M", "pct"),
+    "return_6m": ("6M", "pct"),
+    "return_1y": ("1Y", "pct"),
+    "volatility_3m": ("Vol 3M", "pct"),
+    "max_drawdown_1y": ("Max DD 1Y", "pct"),
+    "from_high_1y": ("From 1Y high", "pct"),
+    "vs_sma50": ("vs SMA50", "pct"),
+    "vs_sma200": ("vs SMA200", "pct"),
+    "rs_3m": ("RS 3M", "pct"),
+    "rs_6m": ("RS 6M", "pct"),
+    "rs_1y": ("RS 1Y", "pct"),
+}
+
+# Relative difference of a re-fetched close from the cached one beyond which
+# the cached history is considered stale (re-adjusted for a split or dividend)
+_ADJUSTMENT_TOLERANCE = 1e-3
+# Largest change of a fractional indicator (0.05 = 5 points) for which a
+# stored report still counts as current (see ``similar``)
+SIMILAR_TOLERANCE = 0.05
+
+
+def _path(ticker: str) -> str:
+    return os.path.join(PRICES_DIR, f"{ticker}.npy")
+
+
+def _read(ticker: str) -> Optional[np.ndarray]:
+    try:
+        bars = np.load(_path(ticker))
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        logger.warning("Price cache of %s unreadable, reloading it: %s", ticker, exc)
+        return None
+    return bars if bars.dtype == BAR_DTYPE and len(bars) else None
+
+
+def _write(ticker: str, bars: np.ndarray) -> None:
+    path = _path(ticker)
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, bars)
+    os.replace(tmp, path)
+
+
+def _is_fresh(ticker: str) -> bool:
+    try:
+        return os.path.getmtime(_path(ticker)) > time.time() - PRICES_MAX_AGE_SECONDS
+    except OSError:
+        return False
+
+
+def _day(d: date) -> int:
+    return (d - date(1970, 1, 1)).days
+
+
+def _date(day: int) -> date:
+    return date(1970, 1, 1) + timedelta(days=int(day))
+
+
+def _download(tickers: List[str], start: date) -> Dict[str, np.ndarray]:
+    """Daily bars of ``tickers`` from ``start`` on, in one yfinance request.
+
+    Tickers Yahoo has no data for are left out. Guarded by the yfinance
+    breaker and the run's deadline like the other yfinance fetches.
+    """
+    import yfinance as yf  # heavy (pandas); imported on first fetch
+    from app.agents.stock_info_agent import YFINANCE_BACKEND
+
+    run_deadline.check("prices")
+    breaker = get_breaker(YFINANCE_BACKEND)
+    probe = breaker.before_call()
+    try:
+        frame = yf.download(
+            tickers, start=start.isoformat(), auto_adjust=True, group_by="ticker",
+            progress=False, multi_level_index=True,
+        )
+    except Exception as exc:
+        breaker.record(False, probe, exc)
+        raise
+
+    fetched: Dict[str, np.ndarray] = {}
+    present = set(frame.columns.get_level_values(0)) if frame is not None and not frame.empty else set()
+    for ticker in tickers:
+        if ticker not in present:
+            continue
+        closes = frame[ticker]["Close"].dropna()
+        index = closes.index.tz_localize(None) if closes.index.tz is not None else closes.index
+        bars = np.empty(len(closes), BAR_DTYPE)
+        bars["day"] = index.values.astype("datetime64[D]").astype("<i4")
+        bars["close"] = closes.to_numpy(dtype=float)
+        fetched[ticker] = bars
+    if fetched:
+        breaker.record(True, probe)
+    else:
+        breaker.record(False, probe, RuntimeError(f"no price data for {tickers}"))
+    metrics.inc("prices_bars_fetched_total", sum(len(b) for b in fetched.values()))
+    return fetched
+
+
+def _merge(cached: np.ndarray, fetched: np.ndarray) -> Optional[np.ndarray]:
+    """``cached`` continued with the newer bars of ``fetched`` (None if the two disagree).
+
+    The cache's last bar may have been taken mid-session, so the bar before
+    it is the one both have to agree on; everything after it is replaced.
+    """
+    anchor = cached[-2] if len(cached) > 1 else cached[-1]
+    at = int(np.searchsorted(fetched["day"], anchor["day"]))
+    if at == len(fetched) or fetched["day"][at] != anchor["day"]:
+        return None
+    if abs(fetched["close"][at] / anchor["close"] - 1) > _ADJUSTMENT_TOLERANCE:
+        return None
+    return np.concatenate([cached[cached["day"] <= anchor["day"]], fetched[at + 1:]])
+
+
+def history(tickers: Iterable[str]) -> Dict[str, np.ndarray]:
+    """Daily bars of ``tickers``, bringing stale caches up to date first.
+
+    Tickers without any price data are left out. Raises like ``_download``
+    (``CircuitOpenError``, ``DeadlineExceeded``, network errors) only when a
+    stale ticker has to be fetched.
+    """
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    cached = {t: _read(t) for t in tickers}
+    stale = [t for t in tickers if cached[t] is None or not _is_fresh(t)]
+    bars = {t: b for t, b in cached.items() if b is not None}
+    metrics.inc("prices_cache_requests_total", len(tickers) - len(stale), result="hit")
+    if not stale:
+        return bars
+
+    os.makedirs(PRICES_DIR, exist_ok=True)
+    full_start = date.today() - timedelta(days=PRICES_HISTORY_DAYS)
+    # Refetch from the second-to-last cached bar on, see _merge
+    starts = [full_start if cached[t] is None else _date(cached[t]["day"][-2 if len(cached[t]) > 1 else -1])
+              for t in stale]
+    fetched = _download(stale, min(starts))
+
+    reload, updated = [], []
+    for ticker in stale:
+        new = fetched.get(ticker)
+        if new is None:
+            logger.warning("No price data for %s", ticker)
+            continue
+        if cached[ticker] is None:
+            bars[ticker] = new
+            updated.append(ticker)
+            metrics.inc("prices_cache_requests_total", result="miss")
+        else:
+            merged = _merge(cached[ticker], new)
+            if merged is None:
+                reload.append(ticker)
+                continue
+            bars[ticker] = merged
+            updated.append(ticker)
+            metrics.inc("prices_cache_requests_total", result="append")
+    if reload:
+        logger.info("Price history of %s was re-adjusted, reloading it", reload)
+        fetched = _download(reload, full_start)
+        for ticker in reload:
+            if ticker in fetched:
+                bars[ticker] = fetched[ticker]
+                updated.append(ticker)
+                metrics.inc("prices_cache_requests_total", result="reload")
+
+    oldest = _day(full_start)
+    for ticker in updated:
+        bars[ticker] = bars[ticker][bars[ticker]["day"] >= oldest]
+        _write(ticker, bars[ticker])
+    return {t: bars[t] for t in tickers if t in bars}
+
+
+def _closes(histories: List[np.ndarray], days: np.ndarray) -> np.ndarray:
+    """Closes of each history on ``days`` as a (ticker x day) matrix.
+
+    A day without a bar takes the last close before it; days before a
+    ticker's first bar are NaN.
+    """
+    matrix = np.full((len(histories), len(days)), np.nan)
+    for i, bars in enumerate(histories):
+        last = np.searchsorted(bars["day"], days, side="right") - 1
+        known = last >= 0
+        matrix[i, known] = bars["close"][last[known]]
+    return matrix
+
+
+def indicators(
+    histories: Dict[str, np.ndarray],
+    benchmark: Optional[str] = PRICES_BENCHMARK,
+) -> Dict[str, Dict[str, Optional[float]]]:
+    """Technical indicators (``COLUMNS``) of every history, keyed by ticker.
+
+    Returns and distances are fractions (0.05 = 5%); volatility is the
+    annualized standard deviation of daily log returns. Days are the
+    benchmark's trading days when it is among ``histories``; the ``rs_``
+    columns (return relative to the benchmark) are None without it.
+    """
+    tickers = list(histories)
+    if not tickers:
+        return {}
+    if benchmark in histories:
+        days = histories[benchmark]["day"]
+    else:
+        days = np.unique(np.concatenate([histories[t]["day"] for t in tickers]))
+    days = days[-(TRADING_DAYS + 1):]
+    close = _closes([histories[t] for t in tickers], days)
+    last = close[:, -1]
+    n = close.shape[1]
+
+    with np.errstate(all="ignore"), warnings.catch_warnings():
+        # All-NaN rows (tickers without enough history) just yield NaN
+        warnings.simplefilter("ignore", RuntimeWarning)
+        columns: Dict[str, np.ndarray] = {"close": last}
+        for name, bars in PERIODS.items():
+            columns[f"return_{name}"] = last / close[:, -1 - bars] - 1 if n > bars else np.full(len(tickers), np.nan)
+
+        log_returns = np.diff(np.log(close), axis=1)
+        columns["volatility_3m"] = np.nanstd(log_returns[:, -PERIODS["3m"]:], axis=1, ddof=1) * np.sqrt(TRADING_DAYS)
+
+        drawdown = close / np.fmax.accumulate(close, axis=1) - 1
+        columns["max_drawdown_1y"] = np.nanmin(drawdown, axis=1)
+        columns["from_high_1y"] = last / np.nanmax(close, axis=1) - 1
+
+        for window in (50, 200):
+            recent = close[:, -window:]
+            sma = np.nanmean(recent, axis=1)
+            # Not enough history for the full window
+            sma[np.count_nonzero(~np.isnan(recent), axis=1) < window] = np.nan
+            columns[f"vs_sma{window}"] = last / sma - 1
+
+        for name in ("3m", "6m", "1y"):
+            returns = columns[f"return_{name}"]
+            if benchmark in histories:
+                columns[f"rs_{name}"] = (1 + returns) / (1 + returns[tickers.index(benchmark)]) - 1
+            else:
+                columns[f"rs_{name}"] = np.full(len(tickers), np.nan)
+
+    return {
+        ticker: {
+            key: None if np.isnan(columns[key][i]) else round(float(columns[key][i]), 4)
+            for key in COLUMNS
+        }
+        for i, ticker in enumerate(tickers)
+    }
+
+
+def similar(
+    before: Dict[str, Dict[str, Optional[float]]],
+    after: Dict[str, Dict[str, Optional[float]]],
+    tolerance: float = SIMILAR_TOLERANCE,
+) -> bool:
+    """Whether two ``indicators`` outputs tell the same story.
+
+    Same tickers, and every fractional indicator within ``tolerance`` (the
+    close itself is left out): the day-to-day drift of the indicators does
+    not make a stored report stale.
+    """
+    if before.keys() != after.keys():
+        return False
+    for ticker, values in after.items():
+        for key, (_, kind) in COLUMNS.items():
+            if kind == "price":
+                continue
+            old, new = before[ticker].get(key), values.get(key)
+            if (old is None) != (new is None) or (old is not None and abs(new - old) > tolerance):
+                return False
+    return True
+
+
+def _cell(value: Optional[float], kind: str) -> str:
+    if value is None:
+        return "n/a"
+    return f"{value:,.2f}" if kind == "price" else f"{value * 100:+.1f}%"
+
+
+def format_table(technicals: Dict[str, Dict[str, Optional[float]]], benchmark: str = PRICES_BENCHMARK) -> str:
+    """Markdown table of ``indicators`` output for prompts."""
+    if not technicals:
+        return "Price history unavailable."
+    lines = [
+        "| Ticker | " + " | ".join(label for label, _ in COLUMNS.values()) + " |",
+        "|---" * (len(COLUMNS) + 1) + "|",
+    ]
+    for ticker, values in technicals.items():
+        name = f"{ticker} (benchmark)" if ticker == benchmark else ticker
+        cells = [_cell(values.get(key), kind) for key, (_, kind) in COLUMNS.items()]
+        lines.append(f"| {name} | " + " | ".join(cells) + " |")
+    lines.append(
+        f"\nReturns over 1 month to 1 year; Vol 3M = annualized 3-month volatility; DD = drawdown; "
+        f"SMA = simple moving average of the close; RS = return relative to {benchmark}."
+    )
+    return "\n".join(lines)
@@ -0,0 +1,178 @@
+"""In-process sampling profiler.
+
+A background thread samples the Python stacks of every thread (via
+``sys._current_frames``) while at least one profile is being recorded:
+
+- **Run profiles** keep only the samples doing work for one run — the event
+  loop while one of its tasks is running, and data-pool threads fetching for
+  it (see ``app.tracing``). Each stack is rooted at the graph node it ran in.
+- **Process profiles** keep every thread's stack, rooted at the thread name.
+
+Profiles are written in collapsed-stack format (``frame;frame;frame count``
+per line), which flamegraph.pl and speedscope read directly.
+"""
+
+import os
+import re
+import sys
+import time
+import asyncio
+import logging
+import threading
+from collections import Counter
+from typing import Dict, Optional
+
+from app.config import PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_KEEP
+from app import metrics, tracing
+
+logger = logging.getLogger(__name__)
+
+_PROFILE_ID_RE = re.compile(r"^[A-Za-z0-9_-]{1,64}$")
+
+_lock = threading.Lock()
+# profile ID -> stack counts; run profiles are keyed by run ID
+_run_profiles: Dict[str, Counter] = {}
+_process_profiles: Dict[str, Counter] = {}
+_sampler: Optional[threading.Thread] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread_id: Optional[int] = None
+_frame_names: Dict[object, str] = {}
+
+
+def _frame_name(code) -> str:
+    name = _frame_names.get(code)
+    if name is None:
+        filename = os.path.basename(code.co_filename)
+        name = f"{code.co_name} ({filename}:{code.co_firstlineno})".replace(";", ":")
+        _frame_names[code] = name
+    return name
+
+
+def _collapse(frame) -> str:
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame.f_code))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _sample_once(own_ident: int) -> None:
+    thread_names = {t.ident: t.name for t in threading.enumerate()}
+    for ident, frame in sys._current_frames().items():
+        if ident == own_ident:
+            continue
+        if ident == _loop_thread_id and _loop is not None:
+            tags = tracing.running_tags(_loop)
+        else:
+            tags = tracing.thread_tags(ident)
+        with _lock:
+            if tags and tags[0] in _run_profiles:
+                _run_profiles[tags[0]][f"{tags[1] or '(graph)'};{_collapse(frame)}"] += 1
+            if _process_profiles:
+                node = f";[{tags[1]}]" if tags and tags[1] else ""
+                stack = f"{thread_names.get(ident, ident)}{node};{_collapse(frame)}"
+                for counts in _process_profiles.values():
+                    counts[stack] += 1
+
+
+def _run_sampler() -> None:
+    global _sampler
+    own_ident = threading.get_ident()
+    interval = PROFILE_INTERVAL_MS / 1000
+    while True:
+        with _lock:
+            if not _run_profiles and not _process_profiles:
+                _sampler = None
+                return
+        _sample_once(own_ident)
+        time.sleep(interval)
+
+
+def _ensure_sampler() -> None:
+    """Start the sampler thread if needed (called with the lock held)."""
+    global _sampler
+    if _sampler is None:
+        _sampler = threading.Thread(target=_run_sampler, name="profiler", daemon=True)
+        _sampler.start()
+
+
+def _bind_loop() -> None:
+    global _loop, _loop_thread_id
+    loop = asyncio.get_running_loop()
+    if _loop is not loop:
+        tracing.install(loop)
+        _loop, _loop_thread_id = loop, threading.get_ident()
+
+
+def _write(profile_id: str, counts: Counter) -> str:
+    """Write collapsed stacks to ``PROFILE_DIR/<id>.collapsed`` and prune old files."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.collapsed")
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        for stack, count in sorted(counts.items()):
+            f.write(f"{stack} {count}\n")
+    os.replace(tmp, path)
+    files = sorted(
+        (os.path.join(PROFILE_DIR, n) for n in os.listdir(PROFILE_DIR) if n.endswith(".collapsed")),
+        key=os.path.getmtime,
+    )
+    for old in files[:-PROFILE_KEEP]:
+        try:
+            os.remove(old)
+        except OSError:
+            pass
+    return path
+
+
+def start_run(run_id: str) -> None:
+    """Start recording a profile for ``run_id`` (call from the event loop)."""
+    _bind_loop()
+    with _lock:
+        _run_profiles[run_id] = Counter()
+        _ensure_sampler()
+    metrics.inc("profiles_total", kind="run")
+
+
+def stop_run(run_id: str) -> Optional[str]:
+    """Stop recording ``run_id`` and write its profile; returns the file path."""
+    with _lock:
+        counts = _run_profiles.pop(run_id, None)
+    if counts is None:
+        return None
+    try:
+        path = _write(run_id, counts)
+    except OSError as exc:
+        logger.warning("Could not write profile %s: %s", run_id, exc)
+        return None
+    logger.info("Profile of run %s: %d samples -> %s", run_id, sum(counts.values()), path)
+    return path
+
+
+async def profile_process(seconds: float) -> str:
+    """Sample every thread of the process for ``seconds``; returns the profile ID."""
+    _bind_loop()
+    profile_id = f"process-{time.strftime('%Y%m%d-%H%M%S')}-{tracing.new_run_id()[:6]}"
+    counts: Counter = Counter()
+    with _lock:
+        _process_profiles[profile_id] = counts
+        _ensure_sampler()
+    metrics.inc("profiles_total", kind="process")
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        with _lock:
+            _process_profiles.pop(profile_id, None)
+    await asyncio.to_thread(_write, profile_id, counts)
+    return profile_id
+
+
+def load(profile_id: str) -> Optional[str]:
+    """Collapsed stacks of a stored profile (None if unknown)."""
+    if not _PROFILE_ID_RE.match(profile_id):
+        return None
+    try:
+        with open(os.path.join(PROFILE_DIR, f"{profile_id}.collapsed"), "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
@@ -0,0 +1,188 @@
+"""Hedged requests across the data providers of one data kind.
+
+Each kind of data (``statements``, ``search``) can be served by several
+registered providers, tried in the order configured for the kind. ``race``
+sends a fetch to the first provider and starts the next one:
+
+- at once, when a provider fails or gives an unusable answer
+- with ``DATA_HEDGING``, when the latest provider has not answered by its
+  recent p90 latency (once ``DATA_HEDGE_MIN_SAMPLES`` calls are measured)
+
+The first good answer wins and the fetches still in flight are cancelled.
+Blocking fetches that have already started in a worker thread run to the end,
+but their answer is discarded. Only the slowest tenth of calls is hedged, so
+the extra load is about 10% while the tail latency becomes that of the
+fastest provider. Hedging is off while cassettes are on, so replays make the
+recorded calls.
+
+Latency (every completed call, winners and losers), wins, errors and hedges
+are tracked per provider and reported under ``providers`` on ``/metrics``.
+"""
+
+import time
+import asyncio
+import logging
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+from app.config import DATA_HEDGING, DATA_HEDGE_MIN_SAMPLES
+from app import metrics, cassette, deadline
+from app.deadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+# Recent latencies kept per provider for its p90
+_WINDOW = 200
+# Shortest hedge delay: below it a second request is not worth its load
+_MIN_HEDGE_SECONDS = 0.05
+
+
+@dataclass(frozen=True)
+class Provider:
+    name: str
+    fetch: Callable[..., Any]  # blocking
+
+
+_registry: Dict[str, Dict[str, Provider]] = {}
+_lock = threading.Lock()
+_latencies: Dict[Tuple[str, str], Deque[float]] = {}
+_counts: Dict[Tuple[str, str], Dict[str, int]] = {}
+
+
+def register(kind: str, name: str, fetch: Callable[..., Any]) -> None:
+    """Make ``fetch`` (blocking) available as provider ``name`` of ``kind``."""
+    _registry.setdefault(kind, {})[name] = Provider(name, fetch)
+
+
+def chain(kind: str, names: List[str]) -> List[Provider]:
+    """The registered providers among ``names``, in that order (unknown names are skipped)."""
+    known = _registry.get(kind, {})
+    for name in names:
+        if name not in known:
+            logger.warning("Unknown %s provider %r (registered: %s)", kind, name, ", ".join(known))
+    return [known[name] for name in names if name in known]
+
+
+def _count(kind: str, name: str, outcome: str) -> None:
+    with _lock:
+        counts = _counts.setdefault((kind, name), {})
+        counts[outcome] = counts.get(outcome, 0) + 1
+    metrics.inc("provider_requests_total", kind=kind, provider=name, outcome=outcome)
+
+
+def _timed(kind: str, provider: Provider, args: tuple) -> Any:
+    """Run a provider's fetch, recording its latency when it answers."""
+    started = time.perf_counter()
+    result = provider.fetch(*args)
+    elapsed = time.perf_counter() - started
+    with _lock:
+        _latencies.setdefault((kind, provider.name), deque(maxlen=_WINDOW)).append(elapsed)
+    metrics.observe("provider_latency_seconds", elapsed, kind=kind, provider=provider.name)
+    return result
+
+
+def hedge_delay(kind: str, name: str) -> Optional[float]:
+    """Recent p90 latency of a provider (None until enough calls are measured)."""
+    with _lock:
+        samples = sorted(_latencies.get((kind, name), ()))
+    if len(samples) < DATA_HEDGE_MIN_SAMPLES:
+        return None
+    return max(_MIN_HEDGE_SECONDS, metrics.percentile(samples, 90))
+
+
+async def race(
+    kind: str,
+    providers: List[Provider],
+    args: tuple,
+    run: Callable[..., Awaitable],
+    good: Callable[[Any], bool] = lambda result: True,
+) -> Any:
+    """First good answer of ``providers`` for ``fetch(*args)``.
+
+    ``run(func, *args)`` runs a blocking call off the event loop. If no
+    provider gives a good answer, the last answer is returned, or the last
+    error is raised when none answered. ``DeadlineExceeded`` (from a
+    provider, or before starting one) is raised at once: no other provider
+    would answer in time either.
+    """
+    if not providers:
+        raise LookupError(f"No {kind} provider configured")
+    hedging = DATA_HEDGING and not cassette.enabled()
+    pending: Dict[asyncio.Future, Provider] = {}
+    launched = 0
+    last_launch = 0.0
+    answer: Tuple[bool, Any] = (False, None)
+    error: Optional[BaseException] = None
+
+    def launch() -> None:
+        nonlocal launched, last_launch
+        # No provider could answer in time any more
+        deadline.check(kind)
+        provider = providers[launched]
+        launched += 1
+        last_launch = time.monotonic()
+        pending[asyncio.ensure_future(run(_timed, kind, provider, args))] = provider
+
+    launch()
+    try:
+        while pending:
+            timeout = None
+            if hedging and launched < len(providers):
+                delay = hedge_delay(kind, providers[launched - 1].name)
+                if delay is not None:
+                    timeout = max(0.0, last_launch + delay - time.monotonic())
+            done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                metrics.inc("provider_hedges_total", kind=kind, provider=providers[launched].name)
+                logger.info("Hedging %s fetch: %s has not answered, starting %s",
+                            kind, providers[launched - 1].name, providers[launched].name)
+                launch()
+                continue
+            failed = False
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    result = future.result()
+                except DeadlineExceeded:
+                    raise
+                except Exception as exc:
+                    _count(kind, provider.name, "error")
+                    logger.warning("%s provider %s failed: %s", kind, provider.name, exc)
+                    error = exc
+                    failed = True
+                    continue
+                if good(result):
+                    _count(kind, provider.name, "win")
+                    return result
+                _count(kind, provider.name, "unusable")
+                answer = (True, result)
+                failed = True
+            if (failed or not pending) and launched < len(providers):
+                launch()
+    finally:
+        for future, provider in pending.items():
+            future.cancel()
+            _count(kind, provider.name, "lost")
+    if answer[0]:
+        return answer[1]
+    raise error
+
+
+def stats() -> Dict[str, Dict[str, dict]]:
+    """Calls, outcomes, win rate and latency per provider, for ``/metrics``."""
+    out: Dict[str, Dict[str, dict]] = {}
+    with _lock:
+        keys = set(_counts) | set(_latencies)
+        snapshot = {key: (dict(_counts.get(key, {})), sorted(_latencies.get(key, ()))) for key in keys}
+    for (kind, name), (counts, samples) in sorted(snapshot.items()):
+        calls = sum(counts.values())
+        out.setdefault(kind, {})[name] = {
+            **counts,
+            "calls": calls,
+            "win_rate": round(counts.get("win", 0) / calls, 3) if calls else 0.0,
+            "p50_seconds": round(metrics.percentile(samples, 50), 3),
+            "p90_seconds": round(metrics.percentile(samples, 90), 3),
+        }
+    return out
@@ -0,0 +1,161 @@
+"""Persistent record of the last completed run per ticker.
+
+Used by incremental re-analysis: ``financial_info`` is split into its
+sections (each yfinance block and each DuckDuckGo search), every section is
+fingerprinted, and a re-run compares those fingerprints against the stored
+run so nodes can reuse outputs whose inputs did not change.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Optional
+
+from app.config import RUN_STORE_DIR
+
+logger = logging.getLogger(__name__)
+
+# Pseudo-section derived from the identity fields of the yfinance info block.
+# Persona generation only needs to know *what* the company is, not today's quote.
+COMPANY_IDENTITY_SECTION = "company identity"
+_IDENTITY_KEYS = ("shortName", "sector", "industry")
+_INFO_SECTION = "yfinance Company Info"
+
+# Stored outputs computed from a run's company profile
+_PROFILE_DEPENDENT = ("personas", "persona_analyses", "technicals", "report")
+
+_lock = threading.Lock()
+_cache: Dict[str, dict] = {}
+
+
+def split_sections(financial_info: str) -> Dict[str, str]:
+    """Split ``financial_info`` into ``{heading: body}`` on its ``### `` headings."""
+    sections: Dict[str, str] = {}
+    name: Optional[str] = None
+    body: List[str] = []
+    for line in financial_info.splitlines():
+        if line.startswith("### "):
+            if name is not None:
+                sections[name] = "\n".join(body).strip()
+            name, body = line[4:].strip(), []
+        elif line.startswith("## "):
+            # Part headings close the current section without opening a new one
+            if name is not None:
+                sections[name] = "\n".join(body).strip()
+            name, body = None, []
+        elif name is not None:
+            body.append(line)
+    if name is not None:
+        sections[name] = "\n".join(body).strip()
+    return sections
+
+
+def _digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def section_fingerprints(financial_info: str) -> Dict[str, str]:
+    """Return a content hash for every section of ``financial_info``."""
+    sections = split_sections(financial_info)
+    fingerprints = {name: _digest(body) for name, body in sections.items()}
+
+    info_body = sections.get(_INFO_SECTION)
+    if info_body is not None:
+        try:
+            info = json.loads(info_body)
+            identity = {k: info.get(k) for k in _IDENTITY_KEYS}
+        except ValueError:
+            identity = {"raw": info_body}
+        fingerprints[COMPANY_IDENTITY_SECTION] = _digest(json.dumps(identity, sort_keys=True))
+    return fingerprints
+
+
+def section_name(input_key: str, ticker: str) -> str:
+    """Map a declared node input to its section heading.
+
+    Search inputs are declared as ``SEARCH_QUERIES`` templates; everything
+    else is already a literal heading.
+    """
+    if "{ticker}" in input_key:
+        return f"Search: {input_key.format(ticker=ticker)}"
+    return input_key
+
+
+def diff_sections(previous: Dict[str, str], current: Dict[str, str]) -> List[str]:
+    """Names of sections present in ``current`` whose content differs from ``previous``."""
+    return sorted(name for name, fp in current.items() if previous.get(name) != fp)
+
+
+def inputs_changed(changed: Iterable[str], inputs: Iterable[str], ticker: str) -> bool:
+    """True if any declared input of a node is among the changed sections."""
+    changed_set = set(changed)
+    return any(section_name(key, ticker) in changed_set for key in inputs)
+
+
+def _path(ticker: str) -> str:
+    return os.path.join(RUN_STORE_DIR, f"{ticker.upper()}.json")
+
+
+def load_run(ticker: str) -> Optional[dict]:
+    """Load the last stored run for ``ticker``, or ``None`` if there is none."""
+    key = ticker.upper()
+    with _lock:
+        if key in _cache:
+            return _cache[key]
+    path = _path(key)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            record = json.load(f)
+    except (OSError, ValueError) as exc:
+        logger.warning("Could not read stored run for %s: %s", key, exc)
+        return None
+    with _lock:
+        _cache[key] = record
+    return record
+
+
+def save_run(ticker: str, record: dict) -> None:
+    """Persist ``record`` as the latest run for ``ticker`` (atomic replace)."""
+    key = ticker.upper()
+    record = {**record, "ticker": key, "saved_at": datetime.now(timezone.utc).isoformat()}
+    os.makedirs(RUN_STORE_DIR, exist_ok=True)
+    path = _path(key)
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(record, f, default=str)
+    os.replace(tmp, path)
+    with _lock:
+        _cache[key] = record
+    logger.info("Stored run for %s (%d sections)", key, len(record.get("sections", {})))
+
+
+def previous_run(state: dict) -> Optional[dict]:
+    """Return the stored run to reuse from, if the state is in incremental mode.
+
+    ``changed_sections`` is only set by ``stock_info`` when incremental mode
+    is on and a previous run exists, so its presence gates all reuse.
+    """
+    if not state.get("incremental") or state.get("changed_sections") is None:
+        return None
+    return load_run(state["ticker"])
+
+
+def update_profile(ticker: str, sections: Dict[str, str], company_profile: dict) -> None:
+    """Merge a fresh company profile into the stored run for ``ticker``.
+
+    Used by comparison runs, which only produce a profile per ticker. When
+    the sections or the profile changed, the personas, analyses, technicals
+    and report stored with the old profile are dropped: the next incremental
+    run compares against the new sections and would otherwise reuse them.
+    """
+    previous = load_run(ticker) or {}
+    record = {**previous, "sections": sections, "company_profile": company_profile}
+    if previous.get("sections") != sections or previous.get("company_profile") != company_profile:
+        for key in _PROFILE_DEPENDENT:
+            record.pop(key, None)
+    save_run(ticker, record)
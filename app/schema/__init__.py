@@ -1,5 +1,6 @@
 from .models import (
     DecisionRequest,
+    ScreenRequest,
     PersonaPerspective,
     Persona,
     PersonaCollection,
@@ -21,6 +22,7 @@ from .state import AgentState
 
 __all__ = [
     "DecisionRequest",
+    "ScreenRequest",
     "PersonaPerspective",
     "Persona",
     "PersonaCollection",
@@ -1,15 +1,58 @@
 from pydantic import BaseModel, Field
-from typing import List, Literal
+from typing import List, Literal, Optional
 
 
 class DecisionRequest(BaseModel):
     user_message: str
+    incremental: bool = Field(
+        default=False,
+        description="Reuse outputs of the last stored run for this ticker whose inputs did not change",
+    )
+    depth: Optional[Literal["quick", "standard", "deep"]] = Field(
+        default=None,
+        description="Analysis depth tier (default DEFAULT_DEPTH): quick trades coverage for latency",
+    )
+    deadline_seconds: Optional[float] = Field(
+        default=None,
+        gt=0,
+        description="Give up on the run after this many seconds (at most REQUEST_DEADLINE_SECONDS)",
+    )
+
+
+class ScreenRequest(BaseModel):
+    filter: Optional[str] = Field(
+        default=None,
+        description='Filter expression over the screening table, e.g. "trailingPE < 20 and debtToEquity < 100"',
+    )
+    rank_by: Optional[str] = Field(
+        default=None,
+        description='Expression to rank the matches by (highest first), e.g. "fcfYield_sector_pct"',
+    )
+    ascending: bool = Field(default=False, description="Rank lowest first")
+    limit: int = Field(default=20, ge=1, le=500, description="Number of tickers returned")
+    analyze: bool = Field(
+        default=False,
+        description="Run the analysis pipeline on the returned tickers (at most SCREEN_ANALYZE_MAX)",
+    )
+    depth: Optional[Literal["quick", "standard", "deep"]] = Field(
+        default=None,
+        description="Depth tier of the analyses (default DEFAULT_DEPTH)",
+    )
+    deadline_seconds: Optional[float] = Field(
+        default=None,
+        gt=0,
+        description="Give up on the analyses after this many seconds (at most REQUEST_DEADLINE_SECONDS)",
+    )
 
 
 class PlannerOutput(BaseModel):
     """Structured output from the planner: extracted intent and ticker."""
     intent: str = Field(description="The user's intent, e.g. 'stock_analysis', 'comparison', 'general_question'")
     ticker: str = Field(description="The stock ticker symbol extracted from the user message, e.g. 'AAPL', 'MSFT'")
+    tickers: List[str] = Field(
+        default_factory=list,
+        description="All ticker symbols mentioned in the message, primary first, e.g. ['GOOG', 'AMZN'] for a comparison",
+    )
     reasoning: str = Field(description="Brief reasoning about how the intent and ticker were identified")
 
 
@@ -1,4 +1,4 @@
-from typing import List
+from typing import Dict, List, Optional
 from typing_extensions import TypedDict
 
 from app.schema.models import Persona, PersonaAnalysis, CompanyProfile
@@ -8,18 +8,33 @@ class AgentState(TypedDict, total=False):
     """Shared state for the LangGraph stock-analysis workflow.
 
     Flow: planner -> stock_info -> financial_reporter -> persona_generator -> analysis (loop) -> report
+          (price_history runs alongside stock_info -> financial_reporter)
+    Comparison flow: planner -> compare (per-ticker stock_info -> financial_reporter) -> comparison report
     """
 
     # Input
     user_message: str
+    incremental: bool  # reuse outputs of the last stored run whose inputs did not change
+    depth: str  # analysis depth tier (app.config.DEPTH_TIERS)
+    # tickers may also be given up front (screening, CLI): the planner then skips its LLM call
+
+    # Run clock (set by the planner) and optional work dropped to meet the tier's latency target
+    started_at: float
+    trimmed: List[str]
 
     # Planner output
     intent: str
     ticker: str
+    tickers: List[str]  # all tickers for a comparison, primary first
     reasoning: str
 
-    # Stock info agent output
-    financial_info: str
+    # Stock info agent output (the text itself lives in app.blobs)
+    financial_info_ref: str  # blob handle of the combined financial_info text
+    financial_sections: Dict[str, str]  # section heading -> content fingerprint
+    changed_sections: List[str]  # only set in incremental mode when a previous run exists
+
+    # Price history output: ticker (and benchmark) -> indicator -> value (app.prices.COLUMNS)
+    technicals: Dict[str, Dict[str, Optional[float]]]
 
     # Financial reporter output
     company_profile: CompanyProfile
@@ -30,5 +45,10 @@ class AgentState(TypedDict, total=False):
     # Analysis agent output (one per persona)
     persona_analyses: List[PersonaAnalysis]
 
-    # Final report
+    # Comparison output (one entry per ticker)
+    comparison_profiles: Dict[str, CompanyProfile]
+    comparison_info_refs: Dict[str, str]  # ticker -> financial_info blob handle
+
+    # Final report and its ID in the report archive (app.archive)
     report: str
+    report_id: str
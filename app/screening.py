@@ -0,0 +1,158 @@
+"""Screening of the fundamentals store before spending LLM calls.
+
+``screen`` evaluates a filter and a ranking expression over the info fields
+of every ticker in the fundamentals store (``app.fundamentals``), as
+vectorized pandas operations on one table. Besides the yfinance fields
+(``trailingPE``, ``debtToEquity``, ...) the table has
+
+- derived ratios: ``fcfYield``, ``ocfYield``, ``earningsYield``, ``netMargin``
+- cross-sectional ranks of every numeric column, as percentiles in (0, 1]:
+  ``<field>_pct`` over the whole universe and ``<field>_sector_pct`` within
+  the ticker's sector
+
+Expressions use pandas ``query`` / ``eval`` syntax restricted to column
+names, literals, arithmetic (no powers), comparisons, ``and`` / ``or`` / ``not`` / ``in``
+and a few math functions, e.g.
+``trailingPE < 25 and fcfYield_sector_pct > 0.7 and sector != "Utilities"``.
+"""
+
+import ast
+import time
+import logging
+import threading
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app import fundamentals, metrics
+
+logger = logging.getLogger(__name__)
+
+TEXT_FIELDS = ("shortName", "sector", "industry")
+
+DERIVED = {
+    "fcfYield": lambda f: f["freeCashflow"] / f["marketCap"],
+    "ocfYield": lambda f: f["operatingCashflow"] / f["marketCap"],
+    "earningsYield": lambda f: 1 / f["trailingPE"],
+    "netMargin": lambda f: f["netIncomeToCommon"] / f["totalRevenue"],
+}
+
+_FUNCTIONS = {"abs", "log", "log10", "exp", "sqrt"}
+# No ** (or bit operators): a power of big literals is computed as a Python
+# int while holding the GIL, which would freeze the server
+_NODES = (
+    ast.Expression, ast.BoolOp, ast.BinOp, ast.UnaryOp, ast.Compare, ast.Name, ast.Constant,
+    ast.List, ast.Tuple, ast.Load, ast.boolop, ast.Add, ast.Sub, ast.Mult, ast.Div, ast.Mod,
+    ast.unaryop, ast.cmpop, ast.Call,
+)
+# Expressions longer or larger than this are rejected before parsing / evaluation
+_MAX_EXPRESSION_CHARS = 500
+_MAX_EXPRESSION_NODES = 200
+# Largest numeric literal accepted
+_MAX_CONSTANT = 1e15
+
+_lock = threading.Lock()
+_table: Optional[Tuple[str, pd.DataFrame]] = None
+
+
+class ScreenError(ValueError):
+    """Invalid filter or ranking expression."""
+
+
+def _validate(expr: str) -> None:
+    if len(expr) > _MAX_EXPRESSION_CHARS:
+        raise ScreenError(f"Expression longer than {_MAX_EXPRESSION_CHARS} characters")
+    try:
+        tree = ast.parse(expr, mode="eval")
+    except SyntaxError as exc:
+        raise ScreenError(f"Invalid expression {expr!r}: {exc.msg}") from exc
+    nodes = list(ast.walk(tree))
+    if len(nodes) > _MAX_EXPRESSION_NODES:
+        raise ScreenError(f"Expression {expr!r} has more than {_MAX_EXPRESSION_NODES} terms")
+    for node in nodes:
+        if not isinstance(node, _NODES):
+            raise ScreenError(f"Unsupported syntax in {expr!r}: {type(node).__name__}")
+        if (
+            isinstance(node, ast.Constant)
+            and isinstance(node.value, (int, float, complex))
+            and not isinstance(node.value, bool)
+            and abs(node.value) > _MAX_CONSTANT
+        ):
+            raise ScreenError(f"Number out of range in {expr!r}: {node.value!r}")
+        if isinstance(node, ast.Call) and not (isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS):
+            raise ScreenError(f"Only {sorted(_FUNCTIONS)} may be called in {expr!r}")
+
+
+def _build(info_keys: List[str], stored: dict) -> pd.DataFrame:
+    frame = pd.DataFrame.from_dict({ticker: entry["info"] for ticker, entry in stored.items()}, orient="index")
+    if info_keys:
+        # Fields no stored ticker has still exist (all NaN) so expressions can name them
+        frame = frame.reindex(columns=info_keys)
+    numeric = [k for k in frame.columns if k not in TEXT_FIELDS]
+    frame[numeric] = frame[numeric].apply(pd.to_numeric, errors="coerce")
+    for name, derive in DERIVED.items():
+        frame[name] = derive(frame)
+    numeric += list(DERIVED)
+    frame[numeric] = frame[numeric].replace([np.inf, -np.inf], np.nan)
+
+    ranks = frame[numeric].rank(pct=True).add_suffix("_pct")
+    sector_ranks = frame[numeric].groupby(frame["sector"]).rank(pct=True).add_suffix("_sector_pct")
+    frame = pd.concat([frame, ranks, sector_ranks], axis=1)
+    frame["fetched_at"] = [stored[t]["fetched_at"] for t in frame.index]
+    frame.index.name = "ticker"
+    return frame
+
+
+def table() -> pd.DataFrame:
+    """The screening table of the current store generation (built once per generation)."""
+    global _table
+    name, info_keys, stored = fundamentals.entries()
+    with _lock:
+        if _table is None or _table[0] != name:
+            _table = (name, _build(info_keys, stored) if stored else pd.DataFrame())
+        return _table[1]
+
+
+def screen(
+    filter: Optional[str] = None,
+    rank_by: Optional[str] = None,
+    ascending: bool = False,
+    limit: int = 20,
+) -> dict:
+    """Tickers passing ``filter``, ranked by ``rank_by`` (both expressions, see module docstring).
+
+    Returns ``{"universe", "matched", "rows", "elapsed_ms"}``; rows carry the
+    info fields, derived ratios and the ``score`` they were ranked by.
+    Raises ``ScreenError`` for an invalid expression.
+    """
+    started = time.perf_counter()
+    frame = table()
+    universe = len(frame)
+    if universe and filter:
+        _validate(filter)
+        try:
+            frame = frame.query(filter, local_dict={}, global_dict={})
+        except Exception as exc:
+            raise ScreenError(f"Cannot apply filter {filter!r}: {exc}") from exc
+    frame = frame.copy()
+    if universe and rank_by:
+        _validate(rank_by)
+        try:
+            frame["score"] = pd.to_numeric(frame.eval(rank_by, local_dict={}, global_dict={}), errors="coerce")
+        except Exception as exc:
+            raise ScreenError(f"Cannot rank by {rank_by!r}: {exc}") from exc
+        frame = frame.sort_values("score", ascending=ascending, na_position="last")
+    matched = len(frame)
+
+    columns = [c for c in frame.columns if not c.endswith("_pct")]
+    top = frame[columns].head(limit).astype(object)
+    rows = top.where(top.notna(), None).reset_index().to_dict(orient="records")
+    elapsed_ms = (time.perf_counter() - started) * 1000
+    metrics.observe("screen_latency_ms", elapsed_ms)
+    logger.info("Screen %r by %r: %d/%d tickers in %.1fms", filter, rank_by, matched, universe, elapsed_ms)
+    return {"universe": universe, "matched": matched, "rows": rows, "elapsed_ms": round(elapsed_ms, 2)}
+
+
+def tickers(result: dict) -> List[str]:
+    return [row["ticker"] for row in result["rows"]]
@@ -0,0 +1,160 @@
+"""Adaptive planning of the DuckDuckGo searches of a run.
+
+Many ``SEARCH_QUERIES`` return largely the same pages. ``plan`` picks the
+searches a run can skip:
+
+- searches for facts the yfinance statements already hold
+  (``stock_info_agent.STRUCTURED_COVERAGE``), whenever those are present
+- searches whose marginal novelty has stayed below ``SEARCH_MIN_NOVELTY``,
+  except in a ``SEARCH_EXPLORE_RATE`` share of runs that keep measuring it
+
+``record`` measures marginal novelty once the searches ran: the share of a
+search's results that no search before it (in ``SEARCH_QUERIES`` order)
+returned, neither as the same page (normalized URL) nor as a near-identical
+snippet (word-shingle Jaccard similarity). It is kept per query template as
+a moving average in ``SEARCH_STATS_PATH``, so all tickers' runs pool into
+one measurement, and reported under ``search_plan`` on ``/metrics``.
+Planning is off while cassettes are on, so replays issue the recorded
+searches.
+"""
+
+import os
+import json
+import random
+import logging
+import threading
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from app.config import (
+    SEARCH_PLANNING,
+    SEARCH_STATS_PATH,
+    SEARCH_MIN_NOVELTY,
+    SEARCH_MIN_RUNS,
+    SEARCH_EXPLORE_RATE,
+    SEARCH_NOVELTY_ALPHA,
+)
+from app import metrics, cassette
+from app.snippets import SIMILAR_SNIPPETS, jaccard, normalize_url, parse_results, shingles
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_stats: Optional[Dict[str, dict]] = None
+
+
+def enabled() -> bool:
+    return SEARCH_PLANNING and not cassette.enabled()
+
+
+def _load() -> Dict[str, dict]:
+    """Stats per template (called with the lock held)."""
+    global _stats
+    if _stats is None:
+        try:
+            with open(SEARCH_STATS_PATH, encoding="utf-8") as f:
+                _stats = json.load(f)
+        except FileNotFoundError:
+            _stats = {}
+        except (OSError, ValueError) as exc:
+            logger.warning("Search stats unreadable, starting over: %s", exc)
+            _stats = {}
+    return _stats
+
+
+def _save(stats: Dict[str, dict]) -> None:
+    os.makedirs(os.path.dirname(SEARCH_STATS_PATH) or ".", exist_ok=True)
+    tmp = f"{SEARCH_STATS_PATH}.{os.getpid()}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(stats, f, indent=1)
+    os.replace(tmp, SEARCH_STATS_PATH)
+
+
+def plan(templates: List[str], covered: Dict[str, str]) -> Dict[str, str]:
+    """Which of ``templates`` to skip this run, with the reason.
+
+    ``covered`` maps the templates whose facts structured data already holds
+    to that data. At least one search always runs.
+    """
+    if not enabled() or not templates:
+        return {}
+    skipped = {t: f"covered by {covered[t]}" for t in templates if t in covered}
+    if skipped:
+        metrics.inc("search_queries_total", len(skipped), outcome="skipped_structured")
+    with _lock:
+        stats = _load()
+        for template in templates:
+            entry = stats.get(template)
+            if (template in skipped or entry is None or entry["runs"] < SEARCH_MIN_RUNS
+                    or entry["novelty"] >= SEARCH_MIN_NOVELTY):
+                continue
+            if random.random() < SEARCH_EXPLORE_RATE:
+                metrics.inc("search_queries_total", outcome="explored")
+                continue
+            skipped[template] = f"redundant with earlier searches (novelty {entry['novelty']:.0%})"
+            metrics.inc("search_queries_total", outcome="skipped_redundant")
+        if len(skipped) == len(templates):
+            keep = max(templates, key=lambda t: stats.get(t, {}).get("novelty", 1.0))
+            del skipped[keep]
+        for template in skipped:
+            stats.setdefault(template, {"novelty": 1.0, "runs": 0, "skipped": 0})["skipped"] += 1
+    metrics.inc("search_queries_total", len(templates) - len(skipped), outcome="run")
+    if skipped:
+        logger.info("Search plan: skipping %d/%d searches: %s", len(skipped), len(templates), skipped)
+    return skipped
+
+
+def novelty(ran: List[Tuple[str, str]]) -> Dict[str, float]:
+    """Marginal novelty of each ``(template, result text)`` in priority order.
+
+    Searches without results (failed or empty) are left out: they say
+    nothing about overlap.
+    """
+    seen_urls: set = set()
+    seen_snippets: List[FrozenSet] = []
+    scores: Dict[str, float] = {}
+    for template, text in ran:
+        results = [(normalize_url(r.url), shingles(r.snippet)) for r in parse_results(text)]
+        if not results:
+            continue
+        novel = sum(
+            1 for url, snippet in results
+            if url not in seen_urls and all(jaccard(snippet, s) < SIMILAR_SNIPPETS for s in seen_snippets)
+        )
+        scores[template] = novel / len(results)
+        seen_urls.update(url for url, _ in results)
+        seen_snippets.extend(snippet for _, snippet in results)
+    return scores
+
+
+def record(ran: List[Tuple[str, str]]) -> Dict[str, float]:
+    """Fold this run's marginal novelty into the stats; returns it per template."""
+    if not enabled():
+        return {}
+    scores = novelty(ran)
+    if not scores:
+        return scores
+    with _lock:
+        stats = _load()
+        for template, score in scores.items():
+            entry = stats.setdefault(template, {"novelty": score, "runs": 0, "skipped": 0})
+            if entry["runs"]:
+                entry["novelty"] = (1 - SEARCH_NOVELTY_ALPHA) * entry["novelty"] + SEARCH_NOVELTY_ALPHA * score
+            else:
+                entry["novelty"] = score
+            entry["runs"] += 1
+            metrics.observe("search_novelty", score)
+        try:
+            _save(stats)
+        except OSError as exc:
+            logger.warning("Could not store search stats: %s", exc)
+    logger.info("Search novelty: %s", {t: round(s, 2) for t, s in scores.items()})
+    return scores
+
+
+def stats() -> Dict[str, dict]:
+    """Average marginal novelty, runs measured and times skipped per template, for ``/metrics``."""
+    with _lock:
+        return {
+            template: {**entry, "novelty": round(entry["novelty"], 3)}
+            for template, entry in _load().items()
+        }
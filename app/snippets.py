@@ -0,0 +1,230 @@
+"""Near-duplicate removal and per-consumer ranking of search results.
+
+The DuckDuckGo searches of a run often return the same page, or the same
+syndicated article under different URLs. ``dedupe`` keeps the first copy of
+each result, in ``SEARCH_QUERIES`` order, and drops later ones that are the
+same page (``normalize_url``) or a near-duplicate snippet. Near-duplicates
+are found with MinHash signatures of word shingles, banded for
+locality-sensitive hashing, so each result is only compared with the
+candidates it shares a band with.
+
+``focus`` narrows ``financial_info`` for one downstream consumer: the
+surviving results are ranked against the consumer's query with a BM25 index
+built for the run, and only the best ones are kept. The yfinance part stays
+whole.
+"""
+
+import re
+import math
+import hashlib
+import logging
+from collections import Counter
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, FrozenSet, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import numpy as np
+
+from app import metrics
+
+logger = logging.getLogger(__name__)
+
+SEARCH_PART = "## Part B: DuckDuckGo Search Results"
+SEARCH_SECTION = "### Search: "
+RESULT_SEPARATOR = "\n\n---\n\n"
+ALL_DUPLICATES = "All results duplicate earlier searches."
+
+# Jaccard similarity of two snippets' word shingles from which they count as the same text
+SIMILAR_SNIPPETS = 0.6
+SHINGLE_WORDS = 3
+
+# MinHash: NUM_PERM hash functions, split into BANDS bands for LSH
+NUM_PERM = 64
+BANDS = 16
+_ROWS = NUM_PERM // BANDS
+_PRIME = (1 << 31) - 1
+_rng = np.random.default_rng(20240229)
+_PERM_A = _rng.integers(1, _PRIME, NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _PRIME, NUM_PERM, dtype=np.uint64)
+
+# BM25 parameters
+_K1 = 1.5
+_B = 0.75
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it its of on or that the this to vs was were will with".split()
+)
+
+_TRACKING_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|mc_cid|mc_eid|ref|src|cmpid)$", re.IGNORECASE)
+
+
+@dataclass(frozen=True)
+class Result:
+    title: str
+    url: str
+    snippet: str
+
+    def format(self) -> str:
+        """Back to the ``_search_ddg`` result format."""
+        return f"**{self.title}**\n{self.url}\n{self.snippet}"
+
+
+def normalize_url(url: str) -> str:
+    """``url`` reduced to what identifies the page: host without ``www.``, path, non-tracking query."""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    query = sorted((k, v) for k, v in parse_qsl(parts.query) if not _TRACKING_PARAMS.match(k))
+    normalized = f"{host}{parts.path.rstrip('/')}"
+    return f"{normalized}?{urlencode(query)}" if query else normalized
+
+
+def _words(text: str) -> List[str]:
+    return re.findall(r"\w+", text.lower())
+
+
+def shingles(text: str) -> FrozenSet[Tuple[str, ...]]:
+    words = _words(text)
+    if len(words) < SHINGLE_WORDS:
+        return frozenset([tuple(words)]) if words else frozenset()
+    return frozenset(tuple(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1))
+
+
+def jaccard(a: FrozenSet, b: FrozenSet) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def parse_results(text: str) -> List[Result]:
+    """Results of a ``_search_ddg`` output (none for failed or skipped searches)."""
+    results = []
+    for part in text.split(RESULT_SEPARATOR):
+        lines = part.strip().split("\n", 2)
+        if len(lines) < 2 or not lines[0].startswith("**"):
+            continue
+        title = lines[0].strip("*")
+        results.append(Result(title, lines[1].strip(), lines[2].strip() if len(lines) > 2 else title))
+    return results
+
+
+def signature(items: FrozenSet[Tuple[str, ...]]) -> np.ndarray:
+    """MinHash signature (NUM_PERM values) of a shingle set."""
+    if not items:
+        return np.full(NUM_PERM, _PRIME, dtype=np.uint64)
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(" ".join(s).encode(), digest_size=4).digest(), "little") for s in items),
+        dtype=np.uint64, count=len(items),
+    )
+    return ((_PERM_A[:, None] * hashes[None, :] + _PERM_B[:, None]) % _PRIME).min(axis=1)
+
+
+def dedupe(texts: Dict[str, str]) -> Dict[str, str]:
+    """``texts`` (search -> ``_search_ddg`` output, in priority order) without repeated results.
+
+    A search left without results says so (``ALL_DUPLICATES``); failed
+    searches pass through unchanged.
+    """
+    seen_urls: set = set()
+    buckets: Dict[Tuple[int, bytes], List[int]] = {}
+    kept_signatures: List[np.ndarray] = []
+    out: Dict[str, str] = {}
+    total = removed = 0
+    for key, text in texts.items():
+        results = parse_results(text)
+        if not results:
+            out[key] = text
+            continue
+        kept = []
+        for result in results:
+            total += 1
+            url = normalize_url(result.url)
+            sig = signature(shingles(f"{result.title} {result.snippet}"))
+            bands = [(b, sig[b * _ROWS:(b + 1) * _ROWS].tobytes()) for b in range(BANDS)]
+            candidates = {i for band in bands for i in buckets.get(band, ())}
+            if url in seen_urls or any(
+                np.mean(kept_signatures[i] == sig) >= SIMILAR_SNIPPETS for i in candidates
+            ):
+                removed += 1
+                continue
+            seen_urls.add(url)
+            for band in bands:
+                buckets.setdefault(band, []).append(len(kept_signatures))
+            kept_signatures.append(sig)
+            kept.append(result)
+        out[key] = RESULT_SEPARATOR.join(r.format() for r in kept) if kept else ALL_DUPLICATES
+    if total:
+        metrics.inc("search_results_total", total - removed, outcome="kept")
+        if removed:
+            metrics.inc("search_results_total", removed, outcome="duplicate")
+        metrics.observe("search_duplicate_ratio", removed / total)
+        logger.info("Search results: removed %d/%d duplicates (%.0f%%)", removed, total, 100 * removed / total)
+    return out
+
+
+class BM25:
+    """Okapi BM25 over a fixed list of documents."""
+
+    def __init__(self, documents: List[str]) -> None:
+        self.docs = [Counter(w for w in _words(d) if w not in _STOPWORDS) for d in documents]
+        self.lengths = np.array([sum(d.values()) for d in self.docs], dtype=float)
+        self.avg_length = float(self.lengths.mean()) if len(self.docs) else 0.0
+        frequency = Counter(w for d in self.docs for w in d)
+        n = len(self.docs)
+        self.idf = {w: math.log(1 + (n - f + 0.5) / (f + 0.5)) for w, f in frequency.items()}
+
+    def scores(self, query: str) -> np.ndarray:
+        terms = [w for w in set(_words(query)) if w in self.idf]
+        scores = np.zeros(len(self.docs))
+        if not terms or not self.avg_length:
+            return scores
+        norm = _K1 * (1 - _B + _B * self.lengths / self.avg_length)
+        for term in terms:
+            tf = np.array([d.get(term, 0) for d in self.docs], dtype=float)
+            scores += self.idf[term] * tf * (_K1 + 1) / (tf + norm)
+        return scores
+
+
+class _SearchPart:
+    """Search results of one ``financial_info`` text with their BM25 index."""
+
+    def __init__(self, structured: str, searches: str) -> None:
+        self.structured = structured
+        self.sections: List[Tuple[str, List[Result]]] = []
+        for block in searches.split(SEARCH_SECTION)[1:]:
+            heading, _, body = block.partition("\n")
+            self.sections.append((heading.strip(), parse_results(body.strip())))
+        self.results = [(s, r) for s, (_, results) in enumerate(self.sections) for r in results]
+        self.index = BM25([f"{r.title} {r.snippet}" for _, r in self.results])
+
+
+@lru_cache(maxsize=8)
+def _search_part(financial_info: str) -> Optional[_SearchPart]:
+    structured, marker, searches = financial_info.partition(SEARCH_PART)
+    return _SearchPart(structured, searches) if marker else None
+
+
+def focus(financial_info: str, query: str, limit: int) -> str:
+    """``financial_info`` with only the ``limit`` search results most relevant to ``query``.
+
+    Kept results stay under their search's heading, in their original order;
+    searches with none left are left out. ``limit`` <= 0 keeps everything.
+    """
+    part = _search_part(financial_info) if limit > 0 else None
+    if part is None or len(part.results) <= limit:
+        return financial_info
+    scores = part.index.scores(query)
+    # Stable: equally relevant results keep their search order
+    best = set(np.argsort(-scores, kind="stable")[:limit].tolist())
+    chosen: Dict[int, List[Result]] = {}
+    for i, (section, result) in enumerate(part.results):
+        if i in best:
+            chosen.setdefault(section, []).append(result)
+    blocks = [
+        f"{SEARCH_SECTION}{part.sections[s][0]}\n" + RESULT_SEPARATOR.join(r.format() for r in results)
+        for s, results in sorted(chosen.items())
+    ]
+    metrics.inc("focus_results_dropped_total", len(part.results) - limit)
+    return f"{part.structured}{SEARCH_PART}\n" + "\n\n".join(blocks)
@@ -0,0 +1,139 @@
+"""Encoding of the analysis stream's SSE events.
+
+Every event goes through a per-stream ``StreamEncoder``:
+
+- JSON is encoded with orjson when it is installed (the stdlib encoder
+  otherwise), one field at a time, so no field is encoded twice.
+- With the compact protocol (``?compact=1``), an event leaves out the
+  fields whose value is unchanged since the stream last sent them (``trimmed``
+  and ``tickers``, for instance): a missing field keeps its last value. A
+  large value already sent under another field is replaced by
+  ``{"$ref": "<event id>/<field>"}``, pointing at the event (SSE ``id:``) that
+  carried it. Events are numbered from 1.
+- The stream is compressed with br (when the brotli package is installed) or
+  gzip if the client accepts it. Each event is flushed on its own, so the
+  client can decode it as soon as it arrives, while the compression context
+  spans the whole stream and repeated keys and values cost a few bytes.
+"""
+
+import json
+import zlib
+import logging
+from typing import Dict, Optional, Tuple
+
+from app.config import SSE_COMPRESSION, SSE_REF_MIN_BYTES
+from app import metrics
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speed-up
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - optional encoding
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Fields every event carries, even when unchanged
+_ALWAYS_SENT = frozenset(("type", "node", "label", "message"))
+
+_GZIP_LEVEL = 6
+_BROTLI_QUALITY = 5
+
+
+def dumps(value) -> bytes:
+    """Compact JSON of ``value`` (values JSON does not know become strings)."""
+    if orjson is not None:
+        return orjson.dumps(value, default=str)
+    return json.dumps(value, default=str, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def negotiate(accept_encoding: Optional[str]) -> Optional[str]:
+    """Content coding for the stream: "br", "gzip" or None (identity)."""
+    if not SSE_COMPRESSION or not accept_encoding:
+        return None
+    accepted = set()
+    for coding in accept_encoding.split(","):
+        name, _, params = coding.strip().partition(";")
+        q = params.replace(" ", "")
+        if q.startswith("q=") and _quality(q[2:]) == 0:
+            continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and ("br" in accepted or "*" in accepted):
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def _quality(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+class StreamEncoder:
+    """Turns the events of one stream into the bytes to send."""
+
+    def __init__(self, compact: bool = False, encoding: Optional[str] = None) -> None:
+        self.compact = compact
+        self.encoding = encoding
+        self._event_id = 0
+        self._last: Dict[str, bytes] = {}
+        self._refs: Dict[bytes, str] = {}
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=_BROTLI_QUALITY)
+        elif encoding == "gzip":
+            self._compressor = zlib.compressobj(_GZIP_LEVEL, zlib.DEFLATED, 31)
+        else:
+            self._compressor = None
+        self.encoded_bytes = 0
+        self.sent_bytes = 0
+
+    def _fields(self, event: dict) -> Tuple[bytes, ...]:
+        fields = []
+        for key, value in event.items():
+            data = dumps(value)
+            if self.compact and key not in _ALWAYS_SENT:
+                if self._last.get(key) == data:
+                    metrics.inc("sse_fields_total", outcome="unchanged")
+                    continue
+                self._last[key] = data
+                if len(data) >= SSE_REF_MIN_BYTES:
+                    ref = self._refs.get(data)
+                    if ref is not None:
+                        metrics.inc("sse_fields_total", outcome="reference")
+                        data = dumps({"$ref": ref})
+                    else:
+                        self._refs[data] = f"{self._event_id}/{key}"
+            fields.append(dumps(key) + b":" + data)
+        return tuple(fields)
+
+    def encode(self, event: dict) -> bytes:
+        self._event_id += 1
+        chunk = b"data: {" + b",".join(self._fields(event)) + b"}\n\n"
+        if self.compact:
+            chunk = b"id: %d\n" % self._event_id + chunk
+        self.encoded_bytes += len(chunk)
+        if self.encoding == "br":
+            chunk = self._compressor.process(chunk) + self._compressor.flush()
+        elif self.encoding == "gzip":
+            chunk = self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        self.sent_bytes += len(chunk)
+        return chunk
+
+    def close(self) -> bytes:
+        """Trailing bytes that end the compressed stream (none for identity)."""
+        if self.encoding == "br":
+            tail = self._compressor.finish()
+        elif self.encoding == "gzip":
+            tail = self._compressor.flush(zlib.Z_FINISH)
+        else:
+            tail = b""
+        self.sent_bytes += len(tail)
+        if self.encoding and self.encoded_bytes:
+            metrics.observe("sse_compression_ratio", self.sent_bytes / self.encoded_bytes)
+        return tail
@@ -0,0 +1,121 @@
+"""Which run and graph node is executing: for diagnostics that look from outside.
+
+Each API request gets a run ID (``current_run``) and graph nodes are wrapped
+with ``instrument`` so the current node is known both to code running inside
+the node (``current_node``) and to monitoring threads that only see the event
+loop or a worker thread (``running_tags`` / ``thread_tags``). Tasks created
+inside a node (``asyncio.gather``, speculative prefetches, ...) inherit its
+tags through a task factory installed with ``install``; blocking work run via
+``tag_thread`` carries them into worker threads. ``instrument`` also makes
+the run's deadline from the LangGraph config current (see ``app.deadline``).
+"""
+
+import uuid
+import asyncio
+import inspect
+import functools
+import threading
+import weakref
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, Optional, Tuple
+
+from app import deadline
+
+if TYPE_CHECKING:
+    # Importing langchain_core costs ~0.3s of startup; LangGraph only needs the
+    # parameter's name (and accepts the annotation as a string)
+    from langchain_core.runnables import RunnableConfig
+
+current_run: ContextVar[Optional[str]] = ContextVar("current_run", default=None)
+current_node: ContextVar[Optional[str]] = ContextVar("current_node", default=None)
+
+# (run ID, node)
+Tags = Tuple[Optional[str], Optional[str]]
+
+# Task / worker thread -> tags it runs under; read by monitoring threads
+_task_tags: "weakref.WeakKeyDictionary[asyncio.Task, Tags]" = weakref.WeakKeyDictionary()
+_thread_tags: Dict[int, Tags] = {}
+
+
+def new_run_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+def _current_tags() -> Tags:
+    return current_run.get(), current_node.get()
+
+
+def instrument(node_name: str, func: Callable) -> Callable:
+    """Wrap an async graph node so it is attributed to ``node_name``."""
+
+    @functools.wraps(func)
+    async def node(state, config: "RunnableConfig"):
+        token = current_node.set(node_name)
+        task = asyncio.current_task()
+        previous = _task_tags.get(task) if task is not None else None
+        if task is not None:
+            _task_tags[task] = _current_tags()
+        try:
+            with deadline.scope(deadline.from_config(config)):
+                return await func(state)
+        finally:
+            current_node.reset(token)
+            if task is not None:
+                if previous is None:
+                    _task_tags.pop(task, None)
+                else:
+                    _task_tags[task] = previous
+
+    # LangGraph passes the config only if the signature asks for it; don't
+    # let it see func's through __wrapped__
+    node.__signature__ = inspect.signature(node, follow_wrapped=False)
+    return node
+
+
+def _task_factory(loop: asyncio.AbstractEventLoop, coro, **kwargs) -> asyncio.Task:
+    task = asyncio.Task(coro, loop=loop, **kwargs)
+    # create_task runs in the creating task's context
+    tags = _current_tags()
+    if tags != (None, None):
+        _task_tags[task] = tags
+    return task
+
+
+def install(loop: asyncio.AbstractEventLoop) -> None:
+    """Let tasks created inside a node inherit its tags (no-op if a factory is set)."""
+    if loop.get_task_factory() is None:
+        loop.set_task_factory(_task_factory)
+
+
+@contextmanager
+def tag_thread() -> Iterator[None]:
+    """Publish the current run/node for the calling worker thread while the block runs."""
+    ident = threading.get_ident()
+    _thread_tags[ident] = _current_tags()
+    try:
+        yield
+    finally:
+        _thread_tags.pop(ident, None)
+
+
+def running_tags(loop: asyncio.AbstractEventLoop) -> Optional[Tags]:
+    """Tags of the task currently running on ``loop``; safe to call from another thread."""
+    task = asyncio.current_task(loop)
+    if task is None:
+        return None
+    try:
+        return _task_tags.get(task)
+    except RuntimeError:  # dict changed size while being read from this thread
+        return None
+
+
+def running_node(loop: asyncio.AbstractEventLoop) -> Optional[str]:
+    """Node of the task currently running on ``loop``; safe to call from another thread."""
+    tags = running_tags(loop)
+    return tags[1] if tags else None
+
+
+def thread_tags(ident: int) -> Optional[Tags]:
+    """Tags published by worker thread ``ident`` via ``tag_thread``."""
+    return _thread_tags.get(ident)
@@ -124,8 +124,10 @@ export default function Home() {
             ]);
 
             if (data.ticker) streamState.current.ticker = data.ticker as string;
-            if (data.financial_info)
-              streamState.current.financialInfo = data.financial_info as string;
+            // The full financial_info is available lazily at data.financial_info_url;
+            // the metrics rail only needs the company info preview.
+            if (data.financial_info_preview)
+              streamState.current.financialInfo = data.financial_info_preview as string;
             if (data.company_profile)
               streamState.current.companyProfile =
                 data.company_profile as CompanyProfile;